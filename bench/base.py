@@ -0,0 +1,74 @@
+"""Shared plumbing for the benchmark scripts in this directory. Each script
+   runs against a throwaway SQLite database, so nothing here should ever be
+   pointed at a real deployment."""
+from contextlib import contextmanager
+import os
+from tempfile import mkstemp
+import time
+
+from sqlalchemy import event
+
+from kickoff import app, db
+from kickoff.log import cef_config
+
+
+@contextmanager
+def benchApp():
+    """Sets up the application against a fresh SQLite database and yields
+       a request context for it. The database is removed afterwards."""
+    db_fd, db_file = mkstemp()
+    cef_fd, cef_file = mkstemp()
+    app.config['CSRF_ENABLED'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///%s' % db_file
+    app.config.update(cef_config(cef_file))
+    try:
+        with app.test_request_context():
+            db.init_app(app)
+            db.create_all()
+            QueryCounter.listen(db.engine)
+            yield
+    finally:
+        os.close(db_fd)
+        os.remove(db_file)
+        os.close(cef_fd)
+        os.remove(cef_file)
+
+
+class QueryCounter(object):
+    """Counts the SQL statements sent to the database while it is active."""
+    # SQLAlchemy 0.7 can't remove engine listeners, so each engine gets a
+    # single listener that feeds whichever counters are currently active.
+    # benchApp() installs it before anything touches the database, for the
+    # reason given where kickoff.metrics installs its own.
+    _listening = set()
+    _active = []
+
+    def __init__(self):
+        self.count = 0
+
+    @classmethod
+    def listen(cls, engine):
+        if engine not in cls._listening:
+            event.listen(engine, 'before_cursor_execute', cls._dispatch)
+            cls._listening.add(engine)
+
+    @classmethod
+    def _dispatch(cls, *args, **kwargs):
+        for counter in cls._active:
+            counter.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        self._active.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        self._active.remove(self)
+
+
+def timeit(func, repeat):
+    """Returns the average wall clock time of 'func', in milliseconds."""
+    start = time.time()
+    for _ in xrange(repeat):
+        func()
+    return (time.time() - start) * 1000 / repeat
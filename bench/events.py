@@ -0,0 +1,116 @@
+"""Shows how the status of a single release holds up as release_events
+   grows to a million events from other releases. The per-step status
+   queries go through release_events; getStatus goes through
+   release_progress. At the end the (name, group, platform) index is
+   dropped, to show what the per-step queries cost without it.
+
+   $ python bench/events.py --events 1000000
+"""
+from datetime import datetime
+from os import path
+import site
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+import simplejson as json
+
+from kickoff import db
+from kickoff.model import FirefoxRelease, ReleaseEvents, ReleaseProgress
+
+from bench.base import benchApp, QueryCounter, timeit
+from bench.status import perStepStatus
+
+PLATFORMS = ['platform%d' % n for n in xrange(10)]
+CHUNKS = 49
+# The tag, and a build and every repack and update_verify chunk for each
+# platform.
+EVENTS_PER_RELEASE = 1 + len(PLATFORMS) * (1 + 2 * CHUNKS)
+BATCH_SIZE = 10000
+
+
+def releaseEvents(name, sent):
+    yield (name, 'tag', None, 'tag', 1, 1)
+    for platform in PLATFORMS:
+        yield (name, '%s_build' % platform, platform, 'build', 1, 1)
+        for group in ('repack', 'update_verify'):
+            for n in xrange(1, CHUNKS + 1):
+                yield (name, '%s_%s_%d/%d' % (platform, group, n, CHUNKS),
+                       platform, group, n, CHUNKS)
+
+
+def addEvents(first, count):
+    """Adds the events of 'count' releases numbered from 'first', without
+       release rows or progress, which only the measured release needs."""
+    sent = datetime.utcnow()
+    insert = ReleaseEvents.__table__.insert()
+    rows = []
+    for n in xrange(first, first + count):
+        for name, event_name, platform, group, chunkNum, chunkTotal in \
+                releaseEvents('Firefox-%d.0-build1' % n, sent):
+            rows.append({'name': name, 'sent': sent,
+                         'event_name': '%s_%s' % (name, event_name),
+                         'platform': platform, 'results': 0,
+                         'chunkNum': chunkNum, 'chunkTotal': chunkTotal,
+                         'group': group})
+            if len(rows) == BATCH_SIZE:
+                db.session.execute(insert, rows)
+                rows = []
+    if rows:
+        db.session.execute(insert, rows)
+    db.session.commit()
+
+
+def addRelease(name):
+    version = name.split('-')[1]
+    release = FirefoxRelease(partials='1.0build1', promptWaitTime=None,
+                             submitter='bench', version=version, buildNumber=1,
+                             branch='releases/mozilla-release',
+                             mozillaRevision='abcdef', l10nChangesets='af abc',
+                             dashboardCheck=True, mozillaRelbranch=None,
+                             enUSPlatforms=json.dumps(PLATFORMS))
+    db.session.add(release)
+    db.session.commit()
+    ReleaseProgress.rebuild([name])
+
+
+def measure(label, name, repeat):
+    for case, func in (('per-step', perStepStatus),
+                       ('getStatus', ReleaseEvents.getStatus)):
+        with QueryCounter() as counter:
+            func(name)
+        elapsed = timeit(lambda: func(name), repeat)
+        print '%-24s %-10s %3d queries %8.2f ms' % (label, case, counter.count,
+                                                    elapsed)
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--events", dest="events", type="int", default=1000000)
+    parser.add_option("--repeat", dest="repeat", type="int", default=20)
+    options, args = parser.parse_args()
+
+    releases = max(options.events / EVENTS_PER_RELEASE, 1)
+    checkpoints = sorted(set([r for r in (10, 100) if r < releases] +
+                             [releases]))
+    with benchApp():
+        # The measured release is the first one, so it has nothing to do
+        # with how recently the others were added.
+        addEvents(0, 1)
+        addRelease('Firefox-0.0-build1')
+        added = 1
+        for checkpoint in checkpoints:
+            addEvents(added, checkpoint - added)
+            added = checkpoint
+            label = '%d events' % (added * EVENTS_PER_RELEASE)
+            measure(label, 'Firefox-0.0-build1', options.repeat)
+
+        db.session.execute('DROP INDEX release_events_name_group_platform')
+        measure('%s, no index' % label, 'Firefox-0.0-build1', options.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Generators of synthetic releases and release events for the benchmarks.
+
+   Versions follow each other the way real ones do, by picking among what
+   getPossibleNextVersions() allows, and every release gets events for all
+   of the steps that status reports on. Everything is derived from a seed,
+   so the same arguments always give the same data.
+"""
+from datetime import datetime, timedelta
+import random
+
+import simplejson as json
+
+from mozilla.build.versions import getPossibleNextVersions
+
+from kickoff import db
+from kickoff.model import FennecRelease, FirefoxRelease, ReleaseEvents, \
+    ReleaseProgress, ResourceVersion, ThunderbirdRelease
+from kickoff.views.status import freezeStatus
+
+# The first version of each product, and the platforms its releases are
+# built for.
+PRODUCTS = (
+    (FirefoxRelease, '30.0b1',
+     ['linux', 'linux64', 'macosx64', 'win32', 'win64']),
+    (FennecRelease, '30.0', ['android', 'android-api-9', 'android-x86']),
+    (ThunderbirdRelease, '24.0esr', ['linux', 'linux64', 'macosx64', 'win32']),
+)
+LOCALES = 90
+# Steps that take a single event.
+FLAG_GROUPS = ('tag', 'update', 'releasetest', 'release', 'postrelease')
+INSERT_BATCH_SIZE = 10000
+
+
+def generateVersions(first, count, rand):
+    """Yields 'count' distinct versions, starting with 'first', each of
+       which is a possible next version of the one before it."""
+    seen = set()
+    version = first
+    while len(seen) < count:
+        seen.add(version)
+        yield version
+        candidates = sorted(getPossibleNextVersions(version))
+        unseen = [v for v in candidates if v not in seen]
+        version = rand.choice(unseen or candidates[-1:])
+
+
+def makeChangesets(version, locales):
+    """Returns changesets for 'locales' locales, which stay the same for
+       all the builds of a version."""
+    seed = sum(ord(c) for c in version)
+    return '\n'.join('locale%d %012x' % (n, n * 7919 + seed)
+                     for n in xrange(locales))
+
+
+def generateReleases(perProduct, seed=0):
+    """Yields unsaved releases, 'perProduct' of each product, submitted an
+       hour apart. About one in five versions gets a second build. Apart
+       from the newest few of each product, they are ready and complete.
+       There's at least one complete release of each product as long as
+       'perProduct' is at least 2."""
+    rand = random.Random(seed)
+    start = datetime(2014, 1, 1)
+    # Always leave a few in flight, but never all of them.
+    pending = max(min(5, perProduct / 2), 1)
+    for table, first, platforms in PRODUCTS:
+        n = 0
+        for version in generateVersions(first, perProduct, rand):
+            builds = 2 if rand.random() < 0.2 else 1
+            for buildNumber in xrange(1, builds + 1):
+                if n == perProduct:
+                    break
+                kwargs = dict(submitter='bench', version=version,
+                              buildNumber=buildNumber,
+                              branch='releases/mozilla-%s' % table.product,
+                              mozillaRevision='%012x' % rand.getrandbits(48),
+                              l10nChangesets=makeChangesets(version, LOCALES),
+                              dashboardCheck=True, mozillaRelbranch=None,
+                              enUSPlatforms=json.dumps(platforms),
+                              submittedAt=start + timedelta(hours=n))
+                if table is FennecRelease:
+                    release = table(**kwargs)
+                elif table is FirefoxRelease:
+                    release = table('29.0build1', None, **kwargs)
+                else:
+                    release = table('%012x' % rand.getrandbits(48), None,
+                                    '23.0esrbuild1', None, **kwargs)
+                release.ready = n < perProduct - pending / 2
+                release.complete = n < perProduct - pending
+                yield release
+                n += 1
+
+
+def generateEvents(platforms, count):
+    """Yields about 'count' (event_name, platform, group, chunkNum,
+       chunkTotal) for a release built for 'platforms': one for each
+       single-event step, a build for every platform and the rest split
+       into repack and update_verify chunks. Event names still need the
+       release name in front of them."""
+    chunks = max((count - len(FLAG_GROUPS) - len(platforms)) /
+                 (2 * len(platforms)), 1)
+    for group in FLAG_GROUPS:
+        yield (group, None, group, 1, 1)
+    for platform in platforms:
+        yield ('%s_build' % platform, platform, 'build', 1, 1)
+        for group in ('repack', 'update_verify'):
+            for n in xrange(1, chunks + 1):
+                yield ('%s_%s_%d/%d' % (platform, group, n, chunks), platform,
+                       group, n, chunks)
+
+
+def populate(perProduct, eventsPerRelease, seed=0):
+    """Adds 'perProduct' releases of each product with about
+       'eventsPerRelease' events each, their progress, and the status
+       snapshots of the complete ones. Returns the names of the
+       releases."""
+    names = []
+    complete = []
+    platformsByName = {}
+    for release in generateReleases(perProduct, seed):
+        db.session.add(release)
+        names.append(release.name)
+        if release.complete:
+            complete.append(release.name)
+        platformsByName[release.name] = json.loads(release.enUSPlatforms)
+    db.session.commit()
+
+    insert = ReleaseEvents.__table__.insert()
+    sent = datetime(2014, 1, 1)
+    rows = []
+    for name in names:
+        for event_name, platform, group, chunkNum, chunkTotal in \
+                generateEvents(platformsByName[name], eventsPerRelease):
+            rows.append({'name': name, 'sent': sent,
+                         'event_name': '%s_%s' % (name, event_name),
+                         'platform': platform, 'results': 0,
+                         'chunkNum': chunkNum, 'chunkTotal': chunkTotal,
+                         'group': group})
+            if len(rows) == INSERT_BATCH_SIZE:
+                db.session.execute(insert, rows)
+                rows = []
+    if rows:
+        db.session.execute(insert, rows)
+    # Inserting events this way skips the mapper, which would have stamped
+    # the status of their releases.
+    ResourceVersion.bump(db.session.connection(),
+                         *[ResourceVersion.statusKey(n) for n in names])
+    db.session.commit()
+    ReleaseProgress.rebuild()
+    for name in complete:
+        freezeStatus(name)
+    db.session.commit()
+    return names
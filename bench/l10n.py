@@ -0,0 +1,89 @@
+"""Measures how much space l10n changesets take in l10n_blobs, compared to
+   keeping a copy of them in every release row like they used to be, and
+   what serving them to repack jobs costs with and without gzip and the
+   body cache.
+
+   $ python bench/l10n.py --versions 100 --builds 3 --locales 90
+"""
+from datetime import datetime
+from os import path
+import site
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+from sqlalchemy import func
+
+from kickoff import app, db
+from kickoff.cache import l10nBodyCache
+from kickoff.model import FirefoxRelease, L10nBlob
+
+from bench.base import benchApp, timeit
+
+
+def makeChangesets(version, locales):
+    """Returns changesets like those of a real desktop release: a revision
+       for every locale, most of which stay the same between versions."""
+    lines = []
+    for n in xrange(locales):
+        revision = '%012x' % (n * 7919 + (version if n % 10 == 0 else 0))
+        lines.append('locale%d %s' % (n, revision))
+    return '\n'.join(lines)
+
+
+def populate(versions, builds, locales):
+    """Adds 'builds' respins of 'versions' versions, each of which keeps
+       the changesets of its version. Returns their total size."""
+    total = 0
+    for v in xrange(versions):
+        changesets = makeChangesets(v, locales)
+        for b in xrange(1, builds + 1):
+            db.session.add(FirefoxRelease(
+                partials='1.0build1', promptWaitTime=None, submitter='bench',
+                version='%d.0' % (v + 1), buildNumber=b,
+                branch='releases/mozilla-release', mozillaRevision='abcdef',
+                l10nChangesets=changesets, dashboardCheck=True,
+                mozillaRelbranch=None, submittedAt=datetime(2010, 1, 1)))
+            total += len(changesets)
+    db.session.commit()
+    return total
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--versions", dest="versions", type="int", default=100)
+    parser.add_option("--builds", dest="builds", type="int", default=3)
+    parser.add_option("--locales", dest="locales", type="int", default=90)
+    parser.add_option("--repeat", dest="repeat", type="int", default=50)
+    options, args = parser.parse_args()
+
+    with benchApp():
+        perRow = populate(options.versions, options.builds, options.locales)
+        blobs, stored = db.session.query(
+            func.count(L10nBlob.hash), func.sum(func.length(L10nBlob.data))).one()
+        print 'per row  %6d copies %9d KiB' % (
+            options.versions * options.builds, perRow / 1024)
+        print 'blobs    %6d copies %9d KiB' % (blobs, stored / 1024)
+
+        client = app.test_client()
+        url = '/releases/Firefox-1.0-build1/l10n'
+        environ = {'REMOTE_USER': 'bench'}
+        for label, headers, cached in (
+                ('plain, uncached', {}, False),
+                ('plain, cached', {}, True),
+                ('gzip, uncached', {'Accept-Encoding': 'gzip'}, False),
+                ('gzip, cached', {'Accept-Encoding': 'gzip'}, True)):
+            def fetch():
+                if not cached:
+                    l10nBodyCache.clear()
+                return client.get(url, headers=headers, environ_base=environ)
+            size = len(fetch().data)
+            elapsed = timeit(fetch, options.repeat)
+            print '%-16s %6d bytes %8.2f ms' % (label, size, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Compares routing and validating release names through parseReleaseName
+   and the product registries against the string handling they replaced:
+   lower-casing and prefix matching every name, and validating it with a
+   regex match followed by a comparison of the matched span.
+
+   $ python bench/names.py --repeat 100000
+"""
+from os import path
+import re
+import site
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+from mozilla.build.versions import ANY_VERSION_REGEX
+
+from kickoff.model import FennecRelease, FirefoxRelease, ThunderbirdRelease, \
+    getReleaseTable, parseReleaseName
+from kickoff.views.forms import FennecReleaseForm, FirefoxReleaseForm, \
+    ThunderbirdReleaseForm, getReleaseForm
+
+from bench.base import timeit
+
+NAMES = ['Firefox-38.0.5b3-build2', 'Fennec-38.0-build1',
+         'Thunderbird-31.7.0esr-build1', 'Firefox-38.0.1esr-build10']
+NAME_REGEX = re.compile('\w{0,100}-%s-build\d+' % ANY_VERSION_REGEX)
+
+
+def prefixTable(release):
+    release = release.lower()
+    if release.startswith('fennec'):
+        return FennecRelease
+    elif release.startswith('firefox'):
+        return FirefoxRelease
+    elif release.startswith('thunderbird'):
+        return ThunderbirdRelease
+    raise ValueError(release)
+
+
+def prefixForm(release):
+    release = release.lower()
+    if release.startswith('fennec'):
+        return FennecReleaseForm
+    elif release.startswith('firefox'):
+        return FirefoxReleaseForm
+    elif release.startswith('thunderbird'):
+        return ThunderbirdReleaseForm
+    raise ValueError(release)
+
+
+def spanValid(name):
+    match = NAME_REGEX.match(name)
+    if not match:
+        return False
+    start, end = match.span()
+    return name[start:end] == name
+
+
+def platformsTable(name):
+    return prefixTable(name.split('-')[0].title())
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--repeat", dest="repeat", type="int", default=100000)
+    options, args = parser.parse_args()
+
+    cases = (
+        ('table, prefix', prefixTable),
+        ('table, registry', getReleaseTable),
+        ('form, prefix', prefixForm),
+        ('form, registry', getReleaseForm),
+        ('platforms, split', platformsTable),
+        ('platforms, registry', getReleaseTable),
+        ('validate, span', spanValid),
+        ('validate, parsed', lambda name: parseReleaseName(name) is not None),
+    )
+    for name in NAMES:
+        assert prefixTable(name) is getReleaseTable(name)
+        assert prefixForm(name) is getReleaseForm(name)
+        assert spanValid(name) == (parseReleaseName(name) is not None)
+    for label, func in cases:
+        def run():
+            for name in NAMES:
+                func(name)
+        # Microseconds per name.
+        elapsed = timeit(run, options.repeat) * 1000 / len(NAMES)
+        print '%-20s %6.2f us' % (label, elapsed)
+
+
+if __name__ == '__main__':
+    main()
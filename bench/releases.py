@@ -0,0 +1,141 @@
+"""Compares listing releases through release_index against scanning each
+   product's table for full rows and sorting them in Python, which is how
+   releases used to be listed. The "first page" case is what the releases
+   dashboard renders for each of its Reviewed and Complete tables.
+
+   $ python bench/releases.py --releases 4000
+"""
+from datetime import datetime, timedelta
+from os import path
+import site
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+from kickoff import db
+from kickoff.model import FennecRelease, FirefoxRelease, ThunderbirdRelease, \
+    L10nBlob, ReleaseIndex, getReleaseNames, getReleases
+
+from kickoff.views.releases import tablePage
+
+from bench.base import benchApp, QueryCounter, timeit
+
+TABLES = (FennecRelease, FirefoxRelease, ThunderbirdRelease)
+# About the size of a real desktop release's changesets.
+L10N_CHANGESETS = '\n'.join('locale%d %s' % (n, 'a' * 12) for n in xrange(90))
+
+
+def scanReleases(ready=None, complete=None):
+    filters = {}
+    if ready is not None:
+        filters['ready'] = ready
+    if complete is not None:
+        filters['complete'] = complete
+    releases = []
+    for table in TABLES:
+        releases.extend(table.fullQuery().filter_by(**filters))
+    return releases
+
+
+def scanSortedReleases():
+    def cmpReleases(x, y):
+        if x.ready != y.ready:
+            return cmp(x.ready, y.ready)
+        if x.complete != y.complete:
+            return cmp(x.complete, y.complete)
+        return cmp(y._submittedAt, x._submittedAt)
+    return sorted(scanReleases(), cmp=cmpReleases)
+
+
+def loadedBytes(releases):
+    """Returns the total size of the string values loaded into 'releases',
+       which roughly tracks what was pulled from the database for them."""
+    total = 0
+    for r in releases:
+        for value in r.__dict__.itervalues():
+            if isinstance(value, basestring):
+                total += len(value)
+    return total
+
+
+def fresh(func):
+    def wrapper():
+        db.session.expunge_all()
+        return func()
+    return wrapper
+
+
+def populate(perProduct):
+    """Inserts 'perProduct' releases for each product. Nearly all of them
+       are complete, like in a long-lived production database."""
+    start = datetime(2010, 1, 1)
+    blob = L10nBlob.getValues(L10N_CHANGESETS)
+    db.session.execute(L10nBlob.__table__.insert(), blob)
+    index = []
+    for table in TABLES:
+        rows = []
+        for n in xrange(perProduct):
+            version = '%d.%d' % (n / 10, n % 10)
+            row = {
+                'name': '%s-%s-build1' % (table.product.title(), version),
+                'submitter': 'bench', 'version': version, 'buildNumber': 1,
+                'branch': 'releases/mozilla-release',
+                'mozillaRevision': 'abcdef', 'l10nHash': blob['hash'],
+                'dashboardCheck': True,
+                'ready': n < perProduct - 5,
+                'complete': n < perProduct - 10,
+                'submittedAt': start + timedelta(hours=n),
+            }
+            if table is not FennecRelease:
+                row['partials'] = '1.0build1'
+            if table is ThunderbirdRelease:
+                row['commRevision'] = 'abcdef'
+            rows.append(row)
+            index.append({'name': row['name'], 'product': table.product,
+                          'ready': row['ready'], 'complete': row['complete'],
+                          'submittedAt': row['submittedAt'],
+                          'submitter': row['submitter'],
+                          'branch': row['branch'], 'status': ''})
+        db.session.execute(table.__table__.insert(), rows)
+    db.session.execute(ReleaseIndex.__table__.insert(), index)
+    db.session.commit()
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--releases", dest="releases", type="int", default=4000,
+                      help="Releases per product")
+    parser.add_option("--repeat", dest="repeat", type="int", default=5)
+    options, args = parser.parse_args()
+
+    with benchApp():
+        populate(options.releases)
+        assert [r.name for r in scanSortedReleases()] == \
+            [r.name for r in getReleases(dashboardOrder=True)]
+        cases = (
+            ('names, scan', lambda: [r.name for r in scanReleases(True, False)]),
+            ('names, index', lambda: getReleaseNames(True, False)),
+            ('pending, scan', lambda: scanReleases(True, False)),
+            ('pending, index', lambda: getReleases(True, False)),
+            ('sorted, scan', scanSortedReleases),
+            ('sorted, index', lambda: getReleases(dashboardOrder=True)),
+            ('first page', lambda: tablePage(True)),
+        )
+        for label, func in cases:
+            # Every case starts without any releases loaded in the session.
+            func = fresh(func)
+            with QueryCounter() as counter:
+                result = func()
+            elapsed = timeit(func, options.repeat)
+            size = ''
+            if label.startswith('sorted'):
+                size = '%9d KiB' % (loadedBytes(result) / 1024)
+            print '%-14s %3d queries %9.2f ms%s' % (label, counter.count,
+                                                     elapsed, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compares how long StatusAPI.post takes to record a repack chunk event
+   when it commits it to the database itself, and when it only appends it
+   to the event spool. The flush that later records the spooled events is
+   timed separately.
+
+   $ python bench/spool.py --events 500
+"""
+import os
+from os import path
+import site
+from tempfile import mkstemp
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+import simplejson as json
+
+from kickoff import app, db
+from kickoff.model import FirefoxRelease, ReleaseEvents
+from kickoff.spool import closeSpools, getSpool
+
+from bench.base import benchApp, QueryCounter, timeit
+
+RELEASE_NAME = 'Firefox-30.0-build1'
+
+
+def populate():
+    release = FirefoxRelease(partials='29.0build1', promptWaitTime=None,
+                             submitter='bench', version='30.0', buildNumber=1,
+                             branch='releases/mozilla-release',
+                             mozillaRevision='abcdef', l10nChangesets='af abc',
+                             dashboardCheck=True, mozillaRelbranch=None,
+                             enUSPlatforms=json.dumps(['linux']))
+    db.session.add(release)
+    db.session.commit()
+
+
+def poster(client, prefix):
+    counter = iter(xrange(1, 10 ** 9))
+
+    def post():
+        n = next(counter)
+        ret = client.post('/releases/%s/status' % RELEASE_NAME,
+                          environ_base={'REMOTE_USER': 'bench'},
+                          data={'sent': '2005-01-01 01:01:01',
+                                'event_name': '%s_linux_repack_%d' % (prefix, n),
+                                'platform': 'linux', 'chunkNum': n,
+                                'chunkTotal': 10 ** 9, 'results': 0,
+                                'group': 'repack'})
+        assert ret.status_code == 200, ret.data
+    return post
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--events", dest="events", type="int", default=500)
+    options, args = parser.parse_args()
+
+    spool_fd, spool_file = mkstemp()
+    with benchApp():
+        populate()
+        client = app.test_client()
+        post = poster(client, 'direct')
+        with QueryCounter() as counter:
+            post()
+        elapsed = timeit(post, options.events)
+        print '%-8s %3d queries %8.2f ms' % ('direct', counter.count, elapsed)
+
+        app.config['EVENT_SPOOL'] = spool_file
+        app.config['EVENT_SPOOL_INTERVAL'] = 0
+        try:
+            post = poster(client, 'spooled')
+            with QueryCounter() as counter:
+                post()
+            elapsed = timeit(post, options.events)
+            print '%-8s %3d queries %8.2f ms' % ('spooled', counter.count,
+                                                 elapsed)
+            with QueryCounter() as counter:
+                elapsed = timeit(getSpool(app).flushAll, 1)
+            print '%-8s %3d queries %8.2f ms for %d events' % (
+                'flush', counter.count, elapsed, options.events + 1)
+            assert ReleaseEvents.query.count() == 2 * (options.events + 1)
+        finally:
+            closeSpools()
+            del app.config['EVENT_SPOOL']
+            os.close(spool_fd)
+            for suffix in ('', '-wal', '-shm'):
+                if path.exists(spool_file + suffix):
+                    os.remove(spool_file + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Compares ReleaseEvents.getStatus against running each of the per-step
+   status classmethods on their own, which is how status used to be built.
+   Also compares ReleaseEvents.getStatuses against calling getStatus for
+   every release, which is how the dashboard used to get all of them, and
+   adding up the repack and update_verify events of a release in Python
+   (fold) against letting the database group and sum them (aggregate).
+
+   getStatuses makes a fixed number of queries where loop makes several
+   per release, but SQLite has no round trips to save, so the two come
+   out about even here; the difference only shows on a networked
+   database.
+
+   $ python bench/status.py --platforms 12 --chunks 50 --releases 20
+"""
+from datetime import datetime
+from os import path
+import site
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+import simplejson as json
+
+from kickoff import db
+from kickoff.model import FirefoxRelease, ReleaseEvents, ReleaseIndex, \
+    ReleaseProgress
+
+from bench.base import benchApp, QueryCounter, timeit
+
+RELEASE_NAME = 'Firefox-30.0-build1'
+
+
+def perStepStatus(name):
+    if not ReleaseEvents.query.filter_by(name=name).first():
+        return None
+    status = {'tag': ReleaseEvents.tagStatus,
+              'build': ReleaseEvents.buildStatus,
+              'repack': ReleaseEvents.repackStatus,
+              'update': ReleaseEvents.updateStatus,
+              'releasetest': ReleaseEvents.releasetestStatus,
+              'readyforrelease': ReleaseEvents.readyForReleaseStatus,
+              'postrelease': ReleaseEvents.postreleaseStatus}
+    for step in status:
+        status[step] = status[step](name)
+    status['name'] = name
+    return status
+
+
+def loopStatuses():
+    return [(name, ReleaseEvents.getStatus(name))
+            for name in ReleaseIndex.getNames(True, False, dashboardOrder=True)]
+
+
+def chunkEvents(name):
+    return ReleaseEvents.query.filter_by(name=name) \
+        .filter(ReleaseEvents.group.in_(['repack', 'update_verify']))
+
+
+def foldChunks(name):
+    return ReleaseProgress.fold(name, chunkEvents(name))
+
+
+def aggregateChunks(name):
+    return ReleaseProgress.aggregate(name, chunkEvents(name))
+
+
+def populate(platforms, chunks, releases):
+    """Adds 'releases' ready releases with every event of every step,
+       the first of which is RELEASE_NAME."""
+    platforms = ['platform%d' % n for n in xrange(platforms)]
+    sent = datetime.utcnow()
+    for buildNumber in xrange(1, releases + 1):
+        release = FirefoxRelease(partials='29.0build1', promptWaitTime=None,
+                                 submitter='bench', version='30.0',
+                                 buildNumber=buildNumber,
+                                 branch='releases/mozilla-release',
+                                 mozillaRevision='abcdef',
+                                 l10nChangesets='af abc', dashboardCheck=True,
+                                 mozillaRelbranch=None,
+                                 enUSPlatforms=json.dumps(platforms))
+        release.ready = True
+        db.session.add(release)
+
+        def add(event_name, platform, group, chunkNum=1, chunkTotal=1):
+            db.session.add(ReleaseEvents(release.name, sent, event_name,
+                                         platform, 0, chunkNum, chunkTotal,
+                                         group))
+
+        add('tag', None, 'tag')
+        for platform in platforms:
+            add('%s_build' % platform, platform, 'build')
+            for group in ('repack', 'update_verify'):
+                for n in xrange(1, chunks + 1):
+                    add('%s_%s_%d/%d' % (platform, group, n, chunks), platform,
+                        group, n, chunks)
+    db.session.commit()
+    ReleaseProgress.rebuild()
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--platforms", dest="platforms", type="int", default=12)
+    parser.add_option("--chunks", dest="chunks", type="int", default=50)
+    parser.add_option("--releases", dest="releases", type="int", default=20)
+    parser.add_option("--repeat", dest="repeat", type="int", default=50)
+    options, args = parser.parse_args()
+
+    with benchApp():
+        populate(options.platforms, options.chunks, options.releases)
+        assert perStepStatus(RELEASE_NAME) == ReleaseEvents.getStatus(RELEASE_NAME)
+        assert loopStatuses() == ReleaseEvents.getStatuses(True, False)
+        progress = lambda rows: sorted((r.group, r.platform, r.events,
+                                        r.progress) for r in rows)
+        assert progress(foldChunks(RELEASE_NAME)) == \
+            progress(aggregateChunks(RELEASE_NAME))
+        cases = (
+            ('per-step', lambda: perStepStatus(RELEASE_NAME)),
+            ('getStatus', lambda: ReleaseEvents.getStatus(RELEASE_NAME)),
+            ('loop', loopStatuses),
+            ('getStatuses', lambda: ReleaseEvents.getStatuses(True, False)),
+            ('fold', lambda: foldChunks(RELEASE_NAME)),
+            ('aggregate', lambda: aggregateChunks(RELEASE_NAME)),
+        )
+        for label, func in cases:
+            with QueryCounter() as counter:
+                func()
+            elapsed = timeit(func, options.repeat)
+            print '%-11s %3d queries %8.2f ms' % (label, counter.count, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compares building the three release submission forms with an empty
+   suggestion cache, which is what every form construction used to cost,
+   against building them from the cache.
+
+   $ python bench/suggestions.py --releases 200
+"""
+from datetime import datetime, timedelta
+from os import path
+import site
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+from kickoff import db
+from kickoff.cache import suggestionCache
+from kickoff.model import FennecRelease, FirefoxRelease, ThunderbirdRelease
+from kickoff.views.forms import FennecReleaseForm, FirefoxReleaseForm, \
+    ThunderbirdReleaseForm
+
+from bench.base import benchApp, QueryCounter, timeit
+
+
+def populate(perProduct):
+    """Adds 'perProduct' recent releases of each product, spread over a few
+       branches and build numbers."""
+    start = datetime.utcnow() - timedelta(weeks=6)
+    for n in xrange(perProduct):
+        version = '%d.0' % (20 + n / 3)
+        kwargs = dict(submitter='bench', version=version,
+                      buildNumber=n % 3 + 1, branch='branch%d' % (n % 4),
+                      mozillaRevision='abcdef', l10nChangesets='af abc',
+                      dashboardCheck=True, mozillaRelbranch=None,
+                      submittedAt=start + timedelta(hours=n))
+        db.session.add(FennecRelease(**kwargs))
+        db.session.add(FirefoxRelease('19.0build1', None, **kwargs))
+        db.session.add(ThunderbirdRelease('abcdef', None, '19.0build1', None,
+                                          **kwargs))
+    db.session.commit()
+
+
+def buildForms():
+    return FennecReleaseForm(), FirefoxReleaseForm(), ThunderbirdReleaseForm()
+
+
+def uncached():
+    suggestionCache.clear()
+    return buildForms()
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--releases", dest="releases", type="int", default=200,
+                      help="Releases per product")
+    parser.add_option("--repeat", dest="repeat", type="int", default=20)
+    options, args = parser.parse_args()
+
+    with benchApp():
+        populate(options.releases)
+        for label, func in (('uncached', uncached), ('cached', buildForms)):
+            with QueryCounter() as counter:
+                func()
+            elapsed = timeit(func, options.repeat)
+            print '%-10s %4d queries %8.2f ms' % (label, counter.count, elapsed)
+
+
+if __name__ == '__main__':
+    main()
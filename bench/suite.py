@@ -0,0 +1,157 @@
+"""Times every page and API endpoint against synthetic databases of several
+   sizes, and writes the results as JSON so that runs from different
+   commits can be compared.
+
+   Each size is a fresh SQLite database with that many releases of every
+   product, made by bench.generate. Endpoints are requested through the
+   test client, so the timings cover the whole of Flask and the views but
+   no web server.
+
+   $ python bench/suite.py --sizes 10,100,500 --output before.json
+   $ python bench/suite.py --sizes 10,100,500 --compare before.json
+"""
+from os import path
+import site
+import subprocess
+import sys
+import time
+
+mydir = path.dirname(path.dirname(path.abspath(__file__)))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+import simplejson as json
+
+from kickoff import app
+from kickoff.cache import l10nBodyCache, platformCache, suggestionCache
+from kickoff.model import ReleaseIndex
+
+from bench.base import benchApp, QueryCounter
+from bench.generate import populate
+
+# The releases whose own endpoints are requested: an in-flight one and a
+# complete one, which is served from its status snapshot.
+ENDPOINTS = (
+    ('releases', lambda inflight, complete: '/releases'),
+    ('releases pending', lambda inflight, complete: '/releases?ready=1&complete=0'),
+    ('releases.html', lambda inflight, complete: '/releases.html'),
+    ('submit_release.html', lambda inflight, complete: '/submit_release.html'),
+    ('statuses', lambda inflight, complete: '/releases/status?complete=0'),
+    ('status', lambda inflight, complete: '/releases/%s/status' % inflight),
+    ('status complete', lambda inflight, complete: '/releases/%s/status' % complete),
+    ('status events', lambda inflight, complete: '/releases/%s/status?events=1' % inflight),
+    ('release', lambda inflight, complete: '/releases/%s' % inflight),
+    ('l10n', lambda inflight, complete: '/releases/%s/l10n' % inflight),
+)
+
+
+def getCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=mydir).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(client, url, repeat):
+    """Requests 'url' once to warm up, then 'repeat' more times. Returns
+       the timings in milliseconds along with what the first request
+       returned and how many queries it took."""
+    environ = {'REMOTE_USER': 'bench'}
+    with QueryCounter() as counter:
+        response = client.get(url, environ_base=environ)
+    if response.status_code != 200:
+        raise Exception('%s returned %s' % (url, response.status_code))
+    timings = []
+    for _ in xrange(repeat):
+        start = time.time()
+        client.get(url, environ_base=environ)
+        timings.append((time.time() - start) * 1000)
+    timings.sort()
+    return {
+        'url': url,
+        'queries': counter.count,
+        'bytes': len(response.data),
+        'mean_ms': sum(timings) / len(timings),
+        'median_ms': timings[len(timings) / 2],
+        'min_ms': timings[0],
+    }
+
+
+def runSize(size, events, repeat):
+    # Every size starts from the same, cold, caches.
+    for cache in (l10nBodyCache, platformCache, suggestionCache):
+        cache.clear()
+    with benchApp():
+        start = time.time()
+        populate(size, events)
+        setup = time.time() - start
+        inflight = ReleaseIndex.getNames(True, False)[0]
+        complete = ReleaseIndex.getNames(True, True)[0]
+        client = app.test_client()
+        results = []
+        for label, makeUrl in ENDPOINTS:
+            result = measure(client, makeUrl(inflight, complete), repeat)
+            result.update({'endpoint': label, 'size': size})
+            results.append(result)
+            print >>sys.stderr, '%5d %-20s %4d queries %9.2f ms' % (
+                size, label, result['queries'], result['median_ms'])
+        print >>sys.stderr, '%5d populated in %.1f s' % (size, setup)
+        return results
+
+
+def compare(old, new):
+    """Prints how the median time and the number of queries of every case
+       in 'new' changed since 'old'."""
+    before = dict(((r['endpoint'], r['size']), r) for r in old['results'])
+    print 'Compared to %s' % (old.get('commit') or 'an unknown commit')
+    for r in new['results']:
+        b = before.get((r['endpoint'], r['size']))
+        if not b:
+            continue
+        print '%5d %-20s %9.2f -> %9.2f ms (%+6.1f%%) %4d -> %4d queries' % (
+            r['size'], r['endpoint'], b['median_ms'], r['median_ms'],
+            (r['median_ms'] / b['median_ms'] - 1) * 100, b['queries'],
+            r['queries'])
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--sizes", dest="sizes", default="10,100,500",
+                      help="Comma separated numbers of releases per product")
+    parser.add_option("--events", dest="events", type="int", default=200,
+                      help="Events per release")
+    parser.add_option("--repeat", dest="repeat", type="int", default=10)
+    parser.add_option("--output", dest="output",
+                      help="Where to write the results. Defaults to stdout")
+    parser.add_option("--compare", dest="compare",
+                      help="Results of an earlier run to compare with")
+    options, args = parser.parse_args()
+
+    sizes = [int(s) for s in options.sizes.split(',')]
+    if min(sizes) < 2:
+        parser.error('Sizes must be at least 2, to have complete releases')
+    results = []
+    for size in sizes:
+        results.extend(runSize(size, options.events, options.repeat))
+    report = {
+        'commit': getCommit(),
+        'python': sys.version.split()[0],
+        'events': options.events,
+        'repeat': options.repeat,
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    elif not options.compare:
+        print json.dumps(report, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+from ConfigParser import RawConfigParser
+import logging
+from os import path
+import site
+
+mydir = path.dirname(path.abspath(__file__))
+site.addsitedir(mydir)
+site.addsitedir(path.join(mydir, 'vendor/lib/python'))
+
+from kickoff import app, db
+from kickoff.archive import archiveReleases
+from kickoff.model import ReleaseIndex, ReleaseProgress
+from kickoff.spool import EventSpool
+from kickoff.views.status import freezeStatus
+
+log = logging.getLogger(__name__)
+
+
+def rebuild_progress(options, args):
+    """[releaseName ...] Rebuild release progress from release_events."""
+    count = ReleaseProgress.rebuild(args or None)
+    log.info('Rebuilt progress for %d release(s)', count)
+
+
+def flush_events(options, args):
+    """[spoolFile] Record the events waiting in the event spool."""
+    spoolFile = args[0] if args else app.config.get('EVENT_SPOOL')
+    if not spoolFile:
+        raise SystemExit('No spool file given, or set in kickoff.ini')
+    spool = EventSpool(spoolFile)
+    try:
+        count = spool.flushAll()
+    finally:
+        spool.close()
+    log.info('Flushed %d spooled event(s)', count)
+
+
+def archive_events(options, args):
+    """[days] Archive events of complete releases idle for days (30)."""
+    days = int(args[0]) if args else 30
+    directory = app.config.get('EVENT_ARCHIVE_DIR')
+    if not directory:
+        raise SystemExit('event_archive_dir must be set in kickoff.ini')
+    count = archiveReleases(days, directory)
+    log.info('Archived events of %d release(s)', count)
+
+
+def snapshot_status(options, args):
+    """[releaseName ...] Freeze the status of complete releases."""
+    names = args or ReleaseIndex.getNames(complete=True)
+    count = 0
+    for name in names:
+        if freezeStatus(name):
+            count += 1
+        else:
+            log.warning('Skipped %s; rebuild-progress may need to run first', name)
+    db.session.commit()
+    log.info('Took status snapshots of %d release(s)', count)
+
+
+commands = {
+    'archive-events': archive_events,
+    'flush-events': flush_events,
+    'rebuild-progress': rebuild_progress,
+    'snapshot-status': snapshot_status,
+}
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    usage = '%prog [options] command [args]\n\nCommands:\n'
+    for name in sorted(commands):
+        usage += '  %s: %s\n' % (name, commands[name].__doc__)
+    parser = OptionParser(usage=usage)
+    parser.add_option("-d", "--db", dest="db",
+                      help="Database to use. Defaults to the one in kickoff.ini")
+    parser.add_option("-l", "--logfile", dest="logfile")
+    parser.add_option("-v", "--verbose", dest="verbose", action="store_true")
+    options, args = parser.parse_args()
+
+    if not args or args[0] not in commands:
+        parser.error('Unknown or missing command')
+
+    log_level = logging.INFO
+    if options.verbose:
+        log_level = logging.DEBUG
+    logging.basicConfig(filename=options.logfile, level=log_level)
+
+    cfg = RawConfigParser()
+    cfg.read(path.join(mydir, 'kickoff.ini'))
+    dburi = options.db
+    if not dburi:
+        dburi = cfg.get('database', 'dburi')
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = dburi
+    if cfg.has_option('app', 'event_spool'):
+        app.config['EVENT_SPOOL'] = cfg.get('app', 'event_spool')
+    if cfg.has_option('app', 'event_archive_dir'):
+        app.config['EVENT_ARCHIVE_DIR'] = cfg.get('app', 'event_archive_dir')
+    with app.test_request_context():
+        db.init_app(app)
+        commands[args[0]](options, args[1:])
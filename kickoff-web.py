@@ -23,6 +23,12 @@ if __name__ == '__main__':
     parser.add_option("-p", "--password", dest="password")
     parser.add_option("-v", "--verbose", dest="verbose", action="store_true")
     parser.add_option("--cef-log", dest="cef_log", default="cef.log")
+    parser.add_option("--metrics", dest="metrics", action="store_true", default=False,
+                      help="Serve /__metrics and add Server-Timing headers")
+    parser.add_option("--profile-slow", dest="profile_slow", type="float",
+                      help="Profile requests that take at least this many seconds")
+    parser.add_option("--profile-dir", dest="profile_dir", default="profiles",
+                      help="Where to write profiles of slow requests")
     options, args = parser.parse_args()
 
     log_level = logging.INFO
@@ -34,6 +40,9 @@ if __name__ == '__main__':
     app.config['DEBUG'] = True
     app.config['SECRET_KEY'] = 'NOT A SECRET'
     app.config.update(cef_config(options.cef_log))
+    app.config['METRICS'] = app.config['SERVER_TIMING'] = options.metrics
+    app.config['PROFILE_SLOW_REQUESTS'] = options.profile_slow
+    app.config['PROFILE_DIR'] = options.profile_dir
     with app.test_request_context():
         db.init_app(app)
         db.create_all()
@@ -6,16 +6,52 @@ from flask.ext.sqlalchemy import SQLAlchemy
 app = Flask(__name__)
 db = SQLAlchemy()
 
+from kickoff import metrics, profiler
 from kickoff.log import cef_event, CEF_WARN
+from kickoff.metrics import TimedTemplate
 from kickoff.views.csrf import CSRFView
-from kickoff.views.releases import ReleasesAPI, Releases, ReleaseAPI, ReleaseL10nAPI, Release
+from kickoff.views.metrics import MetricsAPI
+from kickoff.views.releases import ReleasesAPI, ReleasesTableAPI, Releases, ReleaseAPI, ReleaseL10nAPI, Release
 from kickoff.views.submit import SubmitRelease
-from kickoff.views.status import StatusAPI
+from kickoff.views.status import StatusAPI, StatusesAPI, EventsAPI, StatusStreamAPI
 
 log = logging.getLogger(__name__)
 
 version = '1.1'
 
+app.jinja_env.template_class = TimedTemplate
+
+# Metrics are recorded for every request when METRICS is set, including
+# ones turned away below and ones whose view raised, which only get as far
+# as teardown. See kickoff.metrics.
+@app.before_request
+def start_metrics():
+    metrics.startRequest(app)
+
+@app.after_request
+def finish_metrics_response(response):
+    return metrics.finishResponse(app, response)
+
+@app.teardown_request
+def finish_metrics(exc):
+    metrics.finishRequest(app)
+
+# Slow requests are profiled when PROFILE_SLOW_REQUESTS is set. Profiling
+# stops once the view returns, which leaves out streaming the response, or
+# on teardown if the view raised. See kickoff.profiler.
+@app.before_request
+def start_profile():
+    profiler.startRequest(app)
+
+@app.after_request
+def finish_profile(response):
+    profiler.finishRequest(app, response.status_code)
+    return response
+
+@app.teardown_request
+def abort_profile(exc):
+    profiler.finishRequest(app, 500)
+
 # Ensure X-Frame-Options is set to protect against clickjacking attacks:
 # https://wiki.mozilla.org/WebAppSec/Secure_Coding_QA_Checklist#Test:_X-Frame-Options
 @app.after_request
@@ -47,6 +83,11 @@ app.add_url_rule('/release.html', view_func=Release.as_view('release'), methods=
 app.add_url_rule('/releases.html', view_func=Releases.as_view('releases'), methods=['GET', 'POST'])
 app.add_url_rule('/csrf_token', view_func=CSRFView.as_view('csrf_token'), methods=['GET'])
 app.add_url_rule('/releases', view_func=ReleasesAPI.as_view('releases_api'), methods=['GET'])
+app.add_url_rule('/releases/table', view_func=ReleasesTableAPI.as_view('releases_table_api'), methods=['GET'])
+app.add_url_rule('/releases/status', view_func=StatusesAPI.as_view('statuses_api'), methods=['GET'])
+app.add_url_rule('/releases/events', view_func=EventsAPI.as_view('events_api'), methods=['POST'])
 app.add_url_rule('/releases/<releaseName>', view_func=ReleaseAPI.as_view('release_api'), methods=['GET', 'POST'])
 app.add_url_rule('/releases/<releaseName>/l10n', view_func=ReleaseL10nAPI.as_view('release_l10n_api'), methods=['GET'])
 app.add_url_rule('/releases/<releaseName>/status', view_func=StatusAPI.as_view('status_api'), methods=['GET', 'POST'])
+app.add_url_rule('/releases/<releaseName>/status/stream', view_func=StatusStreamAPI.as_view('status_stream_api'), methods=['GET'])
+app.add_url_rule('/__metrics', view_func=MetricsAPI.as_view('metrics_api'), methods=['GET'])
@@ -0,0 +1,162 @@
+"""Moves the events of releases that were completed a while ago out of the
+   database, so that release_events and release_progress only grow with
+   the releases that are in flight.
+
+   Each archived release keeps a row in release_archives with its final
+   status, which StatusAPI serves in place of its progress, and its events
+   are written to a gzipped file with one JSON event per line, in the
+   directory set by EVENT_ARCHIVE_DIR.
+
+   There's no record of when a release was marked as complete, so a
+   release can be archived once it's complete and it hasn't had any event
+   for the given number of days. Archiving is run with
+   "kickoff-admin.py archive-events", typically from cron. Events that
+   still arrive for an archived release bring its events back into the
+   database until it's archived again."""
+from datetime import datetime, timedelta
+import gzip
+import json
+import logging
+import os
+
+from sqlalchemy import func
+
+from kickoff import db
+from kickoff.model import ReleaseArchive, ReleaseEvents, ReleaseIndex, \
+    ReleaseProgress
+
+log = logging.getLogger(__name__)
+
+
+def getArchivable(days):
+    """Returns the names of the complete releases whose latest event was
+       sent more than 'days' days ago."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    query = db.session.query(ReleaseEvents.name) \
+        .join(ReleaseIndex, ReleaseIndex.name == ReleaseEvents.name) \
+        .filter(ReleaseIndex.complete == True) \
+        .group_by(ReleaseEvents.name) \
+        .having(func.max(ReleaseEvents._sent) < cutoff)
+    return [r.name for r in query]
+
+
+def getFilename(name):
+    return '%s.jsonl.gz' % name
+
+
+def readEvents(path):
+    f = gzip.open(path, 'rb')
+    try:
+        return [ReleaseEvents.fromJSON(line) for line in f if line.strip()]
+    finally:
+        f.close()
+
+
+def writeEvents(path, events):
+    """Writes 'events' to 'path', replacing it only once they are all
+       safely on disk."""
+    tmp = path + '.tmp'
+    raw = open(tmp, 'wb')
+    try:
+        f = gzip.GzipFile(filename='', mode='wb', fileobj=raw)
+        for event in events:
+            f.write(event.toJSON() + '\n')
+        f.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    finally:
+        raw.close()
+    os.rename(tmp, path)
+
+
+def getArchivedEvents(name, directory):
+    """Returns the archived events of release 'name', as unsaved
+       ReleaseEvents, or an empty list if it hasn't been archived or its
+       archive can't be read."""
+    archive = ReleaseArchive.query.get(name)
+    if not archive:
+        return []
+    try:
+        return readEvents(os.path.join(directory, archive.filename))
+    except IOError:
+        log.exception('Failed to read the archived events of %s', name)
+        return []
+
+
+def archiveRelease(name, directory):
+    """Archives the events of release 'name' into 'directory', and drops
+       them and the release's progress from the database. Events that
+       arrived after the release was last archived are added to its
+       archive. Returns the number of events that were archived."""
+    archive = ReleaseArchive.query.get(name)
+    events = ReleaseEvents.query.filter_by(name=name).all()
+    if not events:
+        return 0
+    byName = {}
+    if archive:
+        for event in readEvents(os.path.join(directory, archive.filename)):
+            byName[event.event_name] = event
+    else:
+        archive = ReleaseArchive(name=name, filename=getFilename(name))
+    # An earlier run may have written these to the file already.
+    for event in events:
+        byName[event.event_name] = event
+    allEvents = sorted(byName.values(), key=lambda e: (e._sent, e.event_name))
+
+    # The file is in place before the events are dropped, so the worst a
+    # failure in between can leave behind is an unused file.
+    writeEvents(os.path.join(directory, archive.filename), allEvents)
+    status = ReleaseEvents.computeStatus(name, allEvents,
+                                         ReleaseEvents.getEnUSPlatforms(name))
+    archive.status = json.dumps(status)
+    archive.events = len(allEvents)
+    archive.archivedAt = datetime.utcnow()
+    db.session.add(archive)
+    ReleaseEvents.query.filter_by(name=name).delete(synchronize_session=False)
+    ReleaseProgress.query.filter_by(name=name).delete(synchronize_session=False)
+    db.session.commit()
+    return len(events)
+
+
+def restoreReleases(names, directory):
+    """Moves the events of those of releases 'names' that are archived back
+       from 'directory' into release_events, adds them to the stored
+       progress and drops the archives, in the current transaction. This
+       is done before recording events that arrive for archived releases,
+       so that they count towards the whole status and retries of archived
+       events are recognised as duplicates. The next run archives them
+       again. Returns the names that were restored."""
+    names = set(names)
+    if not names:
+        return []
+    restored = []
+    for archive in ReleaseArchive.query.filter(ReleaseArchive.name.in_(names)):
+        if not directory:
+            log.error('Got events for %s, whose events are archived, but '
+                      'EVENT_ARCHIVE_DIR is not set', archive.name)
+            continue
+        try:
+            events = readEvents(os.path.join(directory, archive.filename))
+        except IOError:
+            log.exception('Failed to restore the archived events of %s',
+                          archive.name)
+            continue
+        ReleaseProgress.recordMany(ReleaseEvents.insertMany(events))
+        ReleaseArchive.query.filter_by(name=archive.name) \
+            .delete(synchronize_session=False)
+        restored.append(archive.name)
+        log.info('Restored %d archived events of %s', len(events),
+                 archive.name)
+    return restored
+
+
+def archiveReleases(days, directory):
+    """Archives every release that getArchivable() returns. Returns the
+       number of releases that were archived."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    names = getArchivable(days)
+    for name in names:
+        count = archiveRelease(name, directory)
+        log.info('Archived %d events of %s', count, name)
+    return len(names)
@@ -0,0 +1,87 @@
+"""Small in-process caches for values that are expensive to compute from the
+   database but rarely change.
+
+   Every process has its own caches, and a cache only hears about changes
+   made by its own process. Entries therefore also expire after a while, so
+   that changes made by other processes show up eventually."""
+from collections import OrderedDict
+import threading
+import time
+
+
+class Cache(object):
+
+    """Maps keys to computed values. Values are dropped when they are
+       invalidated, when they are older than the maximum age given to get(),
+       and, if 'maxSize' is set, when they are the least recently used once
+       the cache is full."""
+
+    def __init__(self, maxSize=None):
+        self.maxSize = maxSize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Bumped by every invalidation, so that values computed while one
+        # happened aren't stored.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute, maxAge=None):
+        """Returns the cached value for 'key', calling 'compute' to get it
+           if it's missing or older than 'maxAge' seconds."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry and (maxAge is None or now - entry[0] <= maxAge):
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now, value)
+                if self.maxSize is not None:
+                    while len(self._entries) > self.maxSize:
+                        self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        """Returns the number of entries, and of hits and misses since the
+           process started."""
+        with self._lock:
+            return {'size': len(self._entries), 'maxSize': self.maxSize,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# Suggestions for the release submission forms, by product. They are
+# invalidated by kickoff.model once changes to releases are committed.
+suggestionCache = Cache()
+
+# Parsed en-US platform lists, by release name. They are invalidated by
+# kickoff.model once changes to releases are committed, although platforms
+# don't change once a release has been submitted.
+platformCache = Cache(maxSize=1024)
+
+# Bodies of l10n API responses, by blob hash and content encoding. Blobs
+# never change, so these never need invalidating.
+l10nBodyCache = Cache(maxSize=64)
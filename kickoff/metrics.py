@@ -0,0 +1,257 @@
+"""Opt-in instrumentation of requests: how long each endpoint takes, how
+   many SQL statements it runs and how long they take, how long its
+   templates take to render and how large its responses are.
+
+   Setting METRICS records them in each process, and serves them from
+   /__metrics in the Prometheus text format. If METRICS_TOKEN is set, that
+   endpoint also wants it as its 'token' parameter. Setting SERVER_TIMING
+   as well adds a Server-Timing header with the request's own numbers to
+   every response, which browsers show in their developer tools."""
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+import time
+
+from flask import g, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from kickoff.cache import l10nBodyCache, platformCache, suggestionCache
+
+# Upper bounds of the histogram buckets, besides +Inf.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CACHES = (
+    ('suggestions', suggestionCache),
+    ('platforms', platformCache),
+    ('l10n_bodies', l10nBodyCache),
+)
+
+
+class Histogram(object):
+
+    """Counts observations into cumulative buckets, as Prometheus
+       histograms do."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Returns (upper bound, count) for every bucket, ending with
+           +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics(object):
+
+    """The numbers recorded by this process, by endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+            self.statements = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+            self.sizes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+            self.sqlSeconds = defaultdict(float)
+            self.templateSeconds = defaultdict(float)
+            self.errors = defaultdict(int)
+
+    def record(self, endpoint, duration, statements, sqlSeconds,
+               templateSeconds, size, error=False):
+        with self._lock:
+            self.durations[endpoint].observe(duration)
+            if error:
+                self.errors[endpoint] += 1
+            self.statements[endpoint].observe(statements)
+            self.sqlSeconds[endpoint] += sqlSeconds
+            self.templateSeconds[endpoint] += templateSeconds
+            if size is not None:
+                self.sizes[endpoint].observe(size)
+
+    def render(self):
+        """Returns everything recorded so far, and the state of the
+           caches, in the Prometheus text format."""
+        lines = []
+
+        def header(name, kind, help):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        def histograms(name, help, byEndpoint):
+            header(name, 'histogram', help)
+            for endpoint in sorted(byEndpoint):
+                histogram = byEndpoint[endpoint]
+                for bound, count in histogram.cumulative():
+                    lines.append('%s_bucket{endpoint="%s",le="%s"} %d' %
+                                 (name, endpoint, bound, count))
+                lines.append('%s_sum{endpoint="%s"} %s' %
+                             (name, endpoint, repr(histogram.sum)))
+                lines.append('%s_count{endpoint="%s"} %d' %
+                             (name, endpoint, histogram.count))
+
+        def counters(name, help, byLabel, label='endpoint'):
+            header(name, 'counter', help)
+            for key in sorted(byLabel):
+                lines.append('%s{%s="%s"} %s' % (name, label, key,
+                                                 repr(byLabel[key])))
+
+        with self._lock:
+            histograms('kickoff_request_duration_seconds',
+                       'Time spent handling requests, until the response '
+                       'is returned by the view or the view fails.',
+                       self.durations)
+            histograms('kickoff_sql_statements',
+                       'SQL statements run per request.', self.statements)
+            counters('kickoff_sql_duration_seconds_total',
+                     'Time spent running SQL statements.', self.sqlSeconds)
+            counters('kickoff_template_render_seconds_total',
+                     'Time spent rendering templates.', self.templateSeconds)
+            histograms('kickoff_response_size_bytes',
+                       'Size of response bodies whose length is known up '
+                       'front.', self.sizes)
+            counters('kickoff_request_errors_total',
+                     'Requests that failed with an unhandled exception.',
+                     self.errors)
+
+        stats = dict((name, cache.stats()) for name, cache in CACHES)
+        counters('kickoff_cache_hits_total', 'Cache lookups that were hits.',
+                 dict((n, s['hits']) for n, s in stats.items()), 'cache')
+        counters('kickoff_cache_misses_total',
+                 'Cache lookups that were misses.',
+                 dict((n, s['misses']) for n, s in stats.items()), 'cache')
+        header('kickoff_cache_entries', 'gauge', 'Entries in each cache.')
+        for name in sorted(stats):
+            lines.append('kickoff_cache_entries{cache="%s"} %d' %
+                         (name, stats[name]['size']))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class RequestMetrics(object):
+
+    """What the current request has done so far. It lives in flask.g while
+       metrics are enabled."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.statements = 0
+        self.sqlSeconds = 0.0
+        self.templateSeconds = 0.0
+        self._statementStart = None
+        # Set once the view has returned a response.
+        self.duration = None
+        self.size = None
+
+
+def current():
+    """Returns the RequestMetrics of the current request, or None if there
+       is no request or it isn't being instrumented."""
+    try:
+        return getattr(g, 'metrics', None)
+    except RuntimeError:
+        # Outside of a request context, e.g. in a script.
+        return None
+
+
+def _beforeExecute(conn, cursor, statement, parameters, context, executemany):
+    state = current()
+    if state:
+        state._statementStart = time.time()
+
+
+def _afterExecute(conn, cursor, statement, parameters, context, executemany):
+    state = current()
+    if state and state._statementStart is not None:
+        state.statements += 1
+        state.sqlSeconds += time.time() - state._statementStart
+        state._statementStart = None
+
+
+# Listening on the Engine class covers engines created later, such as the
+# one flask-sqlalchemy creates for each database URI. Connections only
+# notice listeners that exist when they are opened, so this has to happen
+# before anything touches the database.
+event.listen(Engine, 'before_cursor_execute', _beforeExecute)
+event.listen(Engine, 'after_cursor_execute', _afterExecute)
+
+
+class TimedTemplate(Template):
+
+    """A template that adds the time it takes to render to the current
+       request's metrics."""
+
+    def render(self, *args, **kwargs):
+        state = current()
+        if not state:
+            return Template.render(self, *args, **kwargs)
+        start = time.time()
+        try:
+            return Template.render(self, *args, **kwargs)
+        finally:
+            state.templateSeconds += time.time() - start
+
+
+def getResponseSize(response):
+    if response.content_length is not None:
+        return response.content_length
+    if response.is_sequence:
+        return sum(map(len, response.response))
+    return None
+
+
+def startRequest(app):
+    if app.config.get('METRICS'):
+        g.metrics = RequestMetrics()
+
+
+def finishResponse(app, response):
+    """Notes how long the current request took and how large 'response'
+       is, and adds them to it as a Server-Timing header if SERVER_TIMING
+       is set. This doesn't happen when the view raises, so the request is
+       only recorded by finishRequest()."""
+    state = current()
+    if not state:
+        return response
+    state.duration = time.time() - state.start
+    state.size = getResponseSize(response)
+    if app.config.get('SERVER_TIMING'):
+        response.headers['Server-Timing'] = \
+            'db;dur=%.1f;desc="%d statements", tpl;dur=%.1f, total;dur=%.1f' % (
+                state.sqlSeconds * 1000, state.statements,
+                state.templateSeconds * 1000, state.duration * 1000)
+    return response
+
+
+def finishRequest(app):
+    """Records the metrics of the current request, once it's torn down.
+       Requests that never got a response from finishResponse() failed with
+       an unhandled exception, and are counted as errors."""
+    state = current()
+    if not state:
+        return
+    g.metrics = None
+    error = state.duration is None
+    if error:
+        state.duration = time.time() - state.start
+    metrics.record(request.endpoint or 'none', state.duration,
+                   state.statements, state.sqlSeconds, state.templateSeconds,
+                   state.size, error)
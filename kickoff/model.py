@@ -1,14 +1,152 @@
+from collections import defaultdict, namedtuple
 from datetime import datetime, timedelta
+import hashlib
+from itertools import groupby
+import re
+from weakref import WeakKeyDictionary
 
 import pytz
 import json
+import zlib
 
-from sqlalchemy import func
+from flask import current_app
+
+from sqlalchemy import case, event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session, object_session, undefer, undefer_group
+from sqlalchemy.orm.attributes import get_history
 
+from mozilla.build.versions import ANY_VERSION_REGEX
 from mozilla.release.info import getReleaseName
 
 from kickoff import db
+from kickoff.cache import platformCache, suggestionCache
+
+
+# How each database spells an INSERT that silently skips rows whose primary
+# key already exists.
+INSERT_IGNORE_PREFIXES = {
+    'sqlite': 'OR IGNORE',
+    'mysql': 'IGNORE',
+}
+
+
+def insertMissing(connection, table, rows):
+    """Inserts 'rows', dicts of column values, into 'table' through
+       'connection', skipping those whose primary key already exists.
+       Returns how many were inserted. On SQLite and MySQL that takes a
+       single statement, which is also safe against concurrent inserts of
+       the same rows. Elsewhere each row gets its own savepoint."""
+    if not rows:
+        return 0
+    dialect = connection.dialect.name
+    if dialect in INSERT_IGNORE_PREFIXES:
+        insert = table.insert().prefix_with(INSERT_IGNORE_PREFIXES[dialect])
+        return connection.execute(insert, rows).rowcount
+    inserted = 0
+    for row in rows:
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert(), row)
+            inserted += 1
+        except IntegrityError:
+            pass
+    return inserted
+
+
+# The most parameters SQLite before 3.32 accepts in a single statement.
+MAX_PARAMETERS = 999
+
+
+def insertAll(connection, table, rows):
+    """Inserts 'rows', dicts with a value for every column of 'table', in a
+       single statement through 'connection'. If any of them is already
+       there, none of them are inserted and IntegrityError is raised,
+       leaving the transaction otherwise usable."""
+    preparer = connection.dialect.identifier_preparer
+    columns = list(table.columns)
+    params = []
+    values = []
+    for n, row in enumerate(rows):
+        names = []
+        for column in columns:
+            key = '%s_%d' % (column.key, n)
+            params.append(db.bindparam(key, row[column.key],
+                                       type_=column.type))
+            names.append(':' + key)
+        values.append('(%s)' % ', '.join(names))
+    # SQLAlchemy 0.7 can't build an INSERT with several rows of VALUES.
+    statement = db.text('INSERT INTO %s (%s) VALUES %s' % (
+        preparer.format_table(table),
+        ', '.join(preparer.format_column(c) for c in columns),
+        ', '.join(values)), bindparams=params)
+    if connection.dialect.name in INSERT_IGNORE_PREFIXES:
+        # A failed statement is undone on its own there, unlike elsewhere.
+        connection.execute(statement)
+    else:
+        with connection.begin_nested():
+            connection.execute(statement)
+
+
+class L10nBlob(db.Model):
+
+    """L10n changesets, stored once for each distinct content and found by
+       its SHA-1. Releases that share changesets, such as the builds of one
+       version, share a single copy. Large changesets are compressed."""
+    __tablename__ = 'l10n_blobs'
+    hash = db.Column(db.String(40), primary_key=True)
+    compressed = db.Column(db.Boolean(), nullable=False, default=False)
+    data = db.Column(db.LargeBinary(), nullable=False)
+
+    # Changesets of at least this many bytes are compressed.
+    COMPRESS_THRESHOLD = 1024
+
+    @staticmethod
+    def getHash(changesets):
+        return hashlib.sha1(changesets.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def getValues(cls, changesets):
+        data = changesets.encode('utf-8')
+        compressed = len(data) >= cls.COMPRESS_THRESHOLD
+        if compressed:
+            data = zlib.compress(data)
+        return {'hash': cls.getHash(changesets), 'compressed': compressed,
+                'data': data}
+
+    @classmethod
+    def store(cls, connection, changesets):
+        """Stores 'changesets' unless they're stored already, and returns
+           their hash. Releases saving the same changesets at the same time
+           end up sharing one copy."""
+        values = cls.getValues(changesets)
+        insertMissing(connection, cls.__table__, [values])
+        return values['hash']
+
+    @classmethod
+    def load(cls, hash_, connection=None):
+        """Returns the changesets stored as 'hash_', or None if there
+           aren't any."""
+        if connection is None:
+            connection = db.session
+        table = cls.__table__
+        query = db.select([table.c.compressed, table.c.data]) \
+            .where(table.c.hash == hash_)
+        row = connection.execute(query).first()
+        if row is None:
+            return None
+        return cls.decode(row.compressed, row.data)
+
+    @staticmethod
+    def decode(compressed, data):
+        if compressed:
+            data = zlib.decompress(data)
+        return data.decode('utf-8')
+
+    def __repr__(self):
+        return '<L10nBlob %r>' % self.hash
 
 
 class Release(object):
@@ -22,14 +160,39 @@ class Release(object):
     buildNumber = db.Column(db.Integer(), nullable=False)
     branch = db.Column(db.String(50), nullable=False)
     mozillaRevision = db.Column(db.String(100), nullable=False)
-    l10nChangesets = db.Column(db.Text(), nullable=False)
     dashboardCheck = db.Column(db.Boolean(), nullable=False, default=False)
     ready = db.Column(db.Boolean(), nullable=False, default=False)
     complete = db.Column(db.Boolean(), nullable=False, default=False)
     status = db.Column(db.String(250), default="")
     mozillaRelbranch = db.Column(db.String(50), default=None, nullable=True)
-    enUSPlatforms = db.Column(db.String(500), default=None, nullable=True)
-    comment = db.Column(db.Text, default=None, nullable=True)
+
+    # Columns on a mixin that are deferred or have a foreign key have to be
+    # created for each table.
+    @declared_attr
+    def l10nHash(cls):
+        return db.Column('l10nHash', db.String(40),
+                         db.ForeignKey('l10n_blobs.hash'), nullable=False)
+
+    # Columns that can be large and that release listings mostly don't show.
+    # They are deferred, and are loaded together the first time one of them
+    # is accessed, unless the query asks for them up front with listQuery()
+    # or fullQuery().
+    @declared_attr
+    def enUSPlatforms(cls):
+        return db.deferred(db.Column('enUSPlatforms', db.String(500),
+                                     default=None, nullable=True),
+                           group='heavy')
+
+    @declared_attr
+    def comment(cls):
+        return db.deferred(db.Column('comment', db.Text, default=None,
+                                     nullable=True), group='heavy')
+
+    @declared_attr
+    def __table_args__(cls):
+        # Backs getMaxBuildNumber(s).
+        return (db.Index('%s_version_buildNumber' % cls.__tablename__,
+                         'version', 'buildNumber'),)
 
     # Dates are always returned in UTC time and ISO8601 format to make them
     # as transportable as possible.
@@ -41,6 +204,25 @@ class Release(object):
     def submittedAt(self, submittedAt):
         self._submittedAt = submittedAt
 
+    # The changesets live in L10nBlob. New ones are stored there by a mapper
+    # event when the release is flushed.
+    @property
+    def l10nChangesets(self):
+        cached = getattr(self, '_l10n', None)
+        if cached and cached[0] == self.l10nHash:
+            return cached[1]
+        changesets = L10nBlob.load(self.l10nHash)
+        self._l10n = (self.l10nHash, changesets)
+        return changesets
+
+    @l10nChangesets.setter
+    def l10nChangesets(self, changesets):
+        if changesets is None:
+            self.l10nHash = None
+        else:
+            self.l10nHash = L10nBlob.getHash(changesets)
+        self._l10n = (self.l10nHash, changesets)
+
     def __init__(self, submitter, version, buildNumber, branch,
                  mozillaRevision, l10nChangesets, dashboardCheck,
                  mozillaRelbranch, enUSPlatforms=None, submittedAt=None,
@@ -65,6 +247,8 @@ class Release(object):
         for c in self.__table__.columns:
             me[c.name] = getattr(self, c.name)
         me['submittedAt'] = me['submittedAt']
+        del me['l10nHash']
+        me['l10nChangesets'] = self.l10nChangesets
         return me
 
     @classmethod
@@ -83,6 +267,18 @@ class Release(object):
                                    self.buildNumber)
         self.comment = form.comment.data
 
+    @classmethod
+    def listQuery(cls, include=()):
+        """Returns a query for listing releases, which also loads the heavy
+           columns in 'include' up front."""
+        return cls.query.options(*[undefer(c) for c in include])
+
+    @classmethod
+    def fullQuery(cls):
+        """Returns a query that loads every column of the releases up
+           front, for when all of them are going to be used."""
+        return cls.query.options(undefer_group('heavy'))
+
     @classmethod
     def getRecent(cls, age=timedelta(weeks=7)):
         """Returns all releases of 'age' or newer."""
@@ -97,6 +293,18 @@ class Release(object):
             .filter_by(version=version) \
             .one()[0]
 
+    @classmethod
+    def getMaxBuildNumbers(cls, versions):
+        """Returns a dict of the highest build number known for each of the
+           versions provided. Versions without any releases are left out."""
+        if not versions:
+            return {}
+        query = cls.query \
+            .with_entities(cls.version, func.max(cls.buildNumber)) \
+            .filter(cls.version.in_(versions)) \
+            .group_by(cls.version)
+        return dict(query)
+
     def __repr__(self):
         return '<Release %r>' % self.name
 
@@ -168,37 +376,333 @@ class ThunderbirdRelease(DesktopRelease, db.Model):
         self.commRelbranch = form.commRelbranch.data
 
 
+class ResourceVersion(db.Model):
+
+    """A version stamp for each resource served by the API, bumped every
+       time the resource changes. Used to answer conditional requests
+       without loading the resource itself. Stamps are maintained by the
+       mapper events at the bottom of this module, so they are updated in
+       the same transaction as the change they track."""
+    __tablename__ = 'resource_versions'
+    resource = db.Column(db.String(150), primary_key=True)
+    version = db.Column(db.Integer(), nullable=False, default=1)
+    _updatedAt = db.Column('updatedAt', db.DateTime(pytz.utc),
+                           nullable=False, default=datetime.utcnow)
+
+    @hybrid_property
+    def updatedAt(self):
+        return pytz.utc.localize(self._updatedAt)
+
+    @staticmethod
+    def releasesKey():
+        """The list of releases, as served by ReleasesAPI."""
+        return 'releases'
+
+    @staticmethod
+    def releaseKey(name):
+        """A single release row, as served by ReleaseAPI and ReleaseL10nAPI."""
+        return 'release:%s' % name
+
+    @staticmethod
+    def statusKey(name):
+        """The events of a release, as served by StatusAPI."""
+        return 'status:%s' % name
+
+    @classmethod
+    def getMany(cls, resources):
+        """Returns the stamps for 'resources' that exist, in one query."""
+        return cls.query.filter(cls.resource.in_(resources)).all()
+
+    @classmethod
+    def bump(cls, connection, *resources):
+        """Bumps the stamps for 'resources' through 'connection', creating
+           any that don't exist yet. Missing stamps are inserted at version
+           0 first, so that concurrent first bumps don't collide, and then
+           all of them are bumped with a single UPDATE."""
+        table = cls.__table__
+        now = datetime.utcnow()
+        resources = sorted(set(resources))
+        if not resources:
+            return
+        insertMissing(connection, table,
+                      [{'resource': r, 'version': 0, 'updatedAt': now}
+                       for r in resources])
+        for start in xrange(0, len(resources), MAX_PARAMETERS):
+            connection.execute(
+                table.update()
+                     .where(table.c.resource.in_(
+                         resources[start:start + MAX_PARAMETERS]))
+                     .values(version=table.c.version + 1, updatedAt=now))
+
+    def __repr__(self):
+        return '<ResourceVersion %r>' % self.resource
+
+
+class ReleaseName(namedtuple('ReleaseName', 'product version buildNumber')):
+
+    """The parts of a release name such as Firefox-3.0-build1. The product
+       is in lower case, like the products of the release tables."""
+    __slots__ = ()
+
+    def __str__(self):
+        return getReleaseName(self.product, self.version, self.buildNumber)
+
+
+RELEASE_NAME_REGEX = re.compile(
+    r'(?P<product>\w{0,100})-(?P<version>%s)-build(?P<buildNumber>\d+)\Z'
+    % ANY_VERSION_REGEX)
+
+# Release names are parsed over and over again, by every request about a
+# release. A plain dict is enough to remember them, as long as it doesn't
+# grow forever.
+MAX_PARSED_NAMES = 4096
+_parsedNames = {}
+
+
+def parseReleaseName(name):
+    """Returns the ReleaseName for 'name', or None if it isn't a valid
+       release name."""
+    try:
+        return _parsedNames[name]
+    except KeyError:
+        pass
+    parsed = None
+    match = RELEASE_NAME_REGEX.match(name)
+    if match:
+        parsed = ReleaseName(match.group('product').lower(),
+                             match.group('version'),
+                             int(match.group('buildNumber')))
+    if len(_parsedNames) >= MAX_PARSED_NAMES:
+        _parsedNames.clear()
+    _parsedNames[name] = parsed
+    return parsed
+
+
+def getProduct(release):
+    """Returns the product of 'release', which is either a release name or
+       a product. Names that don't parse are taken to start with their
+       product, as the release names of old tests and databases do."""
+    parsed = parseReleaseName(release)
+    if parsed:
+        return parsed.product
+    return release.partition('-')[0].lower()
+
+
+# The release table of each product.
+RELEASE_TABLES = dict((table.product, table) for table in
+                      (FennecRelease, FirefoxRelease, ThunderbirdRelease))
+
+
 def getReleaseTable(release):
     """Helper method to figure out what type of release a request is for.
        Because the API methods are not specific to the type of release, we
        need this to make sure we operate on the correct table."""
-    release = release.lower()
-    if release.startswith('fennec'):
-        return FennecRelease
-    elif release.startswith('firefox'):
-        return FirefoxRelease
-    elif release.startswith('thunderbird'):
-        return ThunderbirdRelease
-    else:
+    try:
+        return RELEASE_TABLES[getProduct(release)]
+    except KeyError:
         raise ValueError("Can't find release table for release %s" % release)
 
 
-def getReleases(ready=None, complete=None):
-    filters = {}
-    if ready is not None:
-        filters['ready'] = ready
-    if complete is not None:
-        filters['complete'] = complete
-    releases = []
-    for table in (FennecRelease, FirefoxRelease, ThunderbirdRelease):
-        if filters:
-            for r in table.query.filter_by(**filters):
-                releases.append(r)
+class ReleaseIndex(db.Model):
+
+    """A lightweight copy of the columns that releases are listed, filtered
+       and sorted by, for all products in one table. It is kept in sync with
+       the release tables by the mapper events at the bottom of this
+       module."""
+    __tablename__ = 'release_index'
+    name = db.Column(db.String(100), primary_key=True)
+    product = db.Column(db.String(50), nullable=False)
+    ready = db.Column(db.Boolean(), nullable=False, default=False)
+    complete = db.Column(db.Boolean(), nullable=False, default=False)
+    _submittedAt = db.Column('submittedAt', db.DateTime(pytz.utc),
+                             nullable=False)
+    submitter = db.Column(db.String(250), nullable=False)
+    branch = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(250), default="")
+    __table_args__ = (
+        db.Index('release_index_ready_complete_submittedAt',
+                 'ready', 'complete', 'submittedAt'),
+        db.Index('release_index_product_submittedAt',
+                 'product', 'submittedAt'),
+    )
+
+    @classmethod
+    def filtered(cls, ready=None, complete=None, query=None):
+        """Filters 'query', which defaults to one on this table, by the
+           columns of this table."""
+        if query is None:
+            query = cls.query
+        if ready is not None:
+            query = query.filter(cls.ready == ready)
+        if complete is not None:
+            query = query.filter(cls.complete == complete)
+        return query
+
+    @classmethod
+    def searched(cls, text, query=None):
+        """Filters 'query', which defaults to one on this table, to releases
+           whose name, submitter or branch contain 'text'."""
+        if query is None:
+            query = cls.query
+        if text:
+            pattern = '%%%s%%' % text.replace('\\', '\\\\') \
+                .replace('%', '\\%').replace('_', '\\_')
+            query = query.filter(db.or_(
+                cls.name.like(pattern, escape='\\'),
+                cls.submitter.like(pattern, escape='\\'),
+                cls.branch.like(pattern, escape='\\')))
+        return query
+
+    @classmethod
+    def getPage(cls, ready, complete, search, orderBy, start, length):
+        """Returns the number of releases matching 'ready' and 'complete',
+           the number of those that also match 'search', and the names of
+           'length' of them starting at 'start' when ordered by 'orderBy'."""
+        query = cls.filtered(ready, complete)
+        total = query.count()
+        query = cls.searched(search, query)
+        matching = total
+        if search:
+            matching = query.count()
+        query = query.with_entities(cls.name).order_by(*orderBy)
+        names = [r.name for r in query.offset(start).limit(length)]
+        return total, matching, names
+
+    @classmethod
+    def getNames(cls, ready=None, complete=None, dashboardOrder=False):
+        """Returns the names of the matching releases, ordered by name
+           unless 'dashboardOrder' is set. Dashboard order puts releases that
+           aren't ready first and completed ones last, newest first within
+           each of those."""
+        query = cls.filtered(ready, complete).with_entities(cls.name)
+        if dashboardOrder:
+            query = query.order_by(cls.ready, cls.complete,
+                                   cls._submittedAt.desc())
         else:
-            for r in table.query.all():
-                releases.append(r)
-    return releases
+            query = query.order_by(cls.name)
+        return [r.name for r in query]
+
+    @staticmethod
+    def getValues(release):
+        return {'name': release.name, 'product': release.product,
+                'ready': release.ready, 'complete': release.complete,
+                'submittedAt': release._submittedAt,
+                'submitter': release.submitter, 'branch': release.branch,
+                'status': release.status}
+
+    def __repr__(self):
+        return '<ReleaseIndex %r>' % self.name
+
+
+def getReleaseNames(ready=None, complete=None):
+    return ReleaseIndex.getNames(ready, complete)
+
+
+def getReleasesByName(names, include=()):
+    """Returns the release rows named in 'names', in the same order. Names
+       that don't exist are skipped. Of the heavy columns, only those in
+       'include' are loaded up front."""
+    byTable = defaultdict(list)
+    for name in names:
+        byTable[getReleaseTable(name)].append(name)
+    releases = {}
+    for table, tableNames in byTable.iteritems():
+        query = table.listQuery(include)
+        for r in query.filter(table.name.in_(tableNames)):
+            releases[r.name] = r
+    return [releases[name] for name in names if name in releases]
+
+
+def getReleases(ready=None, complete=None, dashboardOrder=False, include=()):
+    """Returns the matching release rows of every product. They are ordered
+       like ReleaseIndex.getNames() orders their names. Of the heavy
+       columns, only those in 'include' are loaded up front."""
+    names = ReleaseIndex.getNames(ready, complete, dashboardOrder)
+    releases = {}
+    for table in (FennecRelease, FirefoxRelease, ThunderbirdRelease):
+        query = table.listQuery(include)
+        if ready is not None or complete is not None:
+            query = query.join(ReleaseIndex, ReleaseIndex.name == table.name)
+            query = ReleaseIndex.filtered(ready, complete, query)
+        for r in query:
+            releases[r.name] = r
+    return [releases[name] for name in names]
+
+
+def parseL10nChangesets(changesets):
+    """Returns (locale, revision, platforms) for every locale in
+       'changesets'. Those are JSON for Fennec, where each locale maps to
+       either a revision or an object with "revision" and "platforms", and
+       "locale revision" lines for everything else. Locales that can't be
+       parsed are skipped."""
+    try:
+        parsed = json.loads(changesets)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, dict):
+        for locale, value in parsed.iteritems():
+            platforms = None
+            if isinstance(value, dict):
+                platforms = value.get('platforms')
+                value = value.get('revision')
+            if isinstance(value, basestring):
+                yield locale, value, platforms
+    else:
+        for line in changesets.splitlines():
+            fields = line.split()
+            if len(fields) == 2:
+                yield fields[0], fields[1], None
+
 
+class ReleaseL10n(db.Model):
+
+    """The l10n changesets of a release, one row per locale. They are parsed
+       from the release's l10nChangesets by the mapper events at the bottom
+       of this module, so that single locales can be looked up without
+       fetching and parsing all of them."""
+    __tablename__ = 'release_l10n'
+    name = db.Column(db.String(100), primary_key=True)
+    locale = db.Column(db.String(100), primary_key=True)
+    revision = db.Column(db.String(100), nullable=False)
+    _platforms = db.Column('platforms', db.String(500), nullable=True)
+
+    @property
+    def platforms(self):
+        if self._platforms is None:
+            return None
+        return json.loads(self._platforms)
+
+    @classmethod
+    def getLocales(cls, name, locales=None):
+        """Returns the rows of release 'name', ordered by locale. If
+           'locales' is given, only those locales are returned."""
+        query = cls.query.filter_by(name=name)
+        if locales:
+            query = query.filter(cls.locale.in_(locales))
+        return query.order_by(cls.locale).all()
+
+    @staticmethod
+    def getValues(name, changesets):
+        values = []
+        for locale, revision, platforms in parseL10nChangesets(changesets):
+            if platforms is not None:
+                platforms = json.dumps(platforms)
+            values.append({'name': name, 'locale': locale,
+                           'revision': revision, 'platforms': platforms})
+        return values
+
+    def toDict(self):
+        me = {'revision': self.revision}
+        if self._platforms is not None:
+            me['platforms'] = self.platforms
+        return me
+
+    def __repr__(self):
+        return '<ReleaseL10n %r %r>' % (self.name, self.locale)
+
+
+# Format of sent times in ReleaseEvents.toJSON().
+SENT_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
 
 class ReleaseEvents(db.Model):
 
@@ -212,6 +716,11 @@ class ReleaseEvents(db.Model):
     chunkNum = db.Column(db.Integer(), default=0, nullable=False)
     chunkTotal = db.Column(db.Integer(), default=0, nullable=False)
     group = db.Column(db.String(100), default=None, nullable=True)
+    __table_args__ = (
+        # Backs the per-step status queries and rebuilding progress.
+        db.Index('release_events_name_group_platform',
+                 'name', 'group', 'platform'),
+    )
 
     # Dates are always returned in UTC time and ISO8601 format to make them
     # as transportable as possible.
@@ -241,6 +750,38 @@ class ReleaseEvents(db.Model):
             me[c.name] = getattr(self, c.name)
         return me
 
+    def getValues(self):
+        """Returns the values of every column, for inserting this event
+           without the mapper."""
+        return {'name': self.name, 'sent': self._sent,
+                'event_name': self.event_name, 'platform': self.platform,
+                'results': self.results, 'chunkNum': self.chunkNum,
+                'chunkTotal': self.chunkTotal, 'group': self.group}
+
+    def toJSON(self):
+        """Returns this event as JSON that fromJSON() can read back. Unlike
+           toDict(), it keeps the full precision of the sent time."""
+        return json.dumps({
+            'name': self.name,
+            'sent': self._sent.strftime(SENT_FORMAT),
+            'event_name': self.event_name,
+            'platform': self.platform,
+            'results': self.results,
+            'chunkNum': self.chunkNum,
+            'chunkTotal': self.chunkTotal,
+            'group': self.group,
+        })
+
+    @classmethod
+    def fromJSON(cls, data):
+        """Returns a new, unsaved event from the output of toJSON()."""
+        values = json.loads(data)
+        return cls(values['name'],
+                   datetime.strptime(values['sent'], SENT_FORMAT),
+                   values['event_name'], values['platform'],
+                   values['results'], values['chunkNum'],
+                   values['chunkTotal'], values['group'])
+
     @classmethod
     def createFromForm(cls, releaseName, form):
         return cls(releaseName, form.sent.data, form.event_name.data,
@@ -265,74 +806,176 @@ class ReleaseEvents(db.Model):
 
 
     @classmethod
-    def getStatus(cls, name):
-        if not cls.query.filter_by(name=name).first():
-            return None
-        status = {'tag': cls.tagStatus, 'build': cls.buildStatus, 'repack': cls.repackStatus,
-                  'update': cls.updateStatus, 'releasetest': cls.releasetestStatus,
-                  'readyforrelease': cls.readyForReleaseStatus, 'postrelease': cls.postreleaseStatus}
-        for step in status:
-            status[step] = status[step](name)
-        status['name'] = name
-        return status
+    def getExisting(cls, keys):
+        """Returns the subset of 'keys', a collection of (name, event_name)
+           pairs, that are already recorded. Only one query is made no matter
+           how many keys there are."""
+        keys = set(keys)
+        if not keys:
+            return set()
+        # Not every database can compare tuples with IN, so we over-select
+        # here and narrow the results down afterwards.
+        rows = cls.query \
+            .with_entities(cls.name, cls.event_name) \
+            .filter(cls.name.in_(set(k[0] for k in keys))) \
+            .filter(cls.event_name.in_(set(k[1] for k in keys)))
+        return keys.intersection((r.name, r.event_name) for r in rows)
 
 
     @classmethod
-    def tagStatus(cls, name):
-        if cls.query.filter_by(name=name, group='tag').count() > 0:
-            return {'progress': 1.00}
-        return {'progress': 0.00}
+    def insertIgnore(cls, event):
+        """Inserts 'event', an unsaved ReleaseEvents, in the current
+           transaction unless the same (name, event_name) is already
+           recorded. Returns whether it was inserted. On SQLite and MySQL
+           that takes a single statement, which is also safe against
+           concurrent inserts of the same event."""
+        connection = db.session.connection()
+        inserted = insertMissing(connection, cls.__table__,
+                                 [event.getValues()]) == 1
+        # This doesn't go through the mapper, so its events don't fire.
+        if inserted:
+            ResourceVersion.bump(connection,
+                                 ResourceVersion.statusKey(event.name))
+        return inserted
 
+    @classmethod
+    def insertMany(cls, events):
+        """Like insertIgnore(), but for any number of events, possibly from
+           different releases. Events that appear more than once are only
+           inserted the first time. Returns the ones that were inserted.
+           Unless another process records some of the same events at the
+           same time, this takes a single query to find the ones that are
+           already recorded, a single INSERT for every few hundred new ones
+           and a single bump of each release's stamp."""
+        recorded = cls.getExisting((e.name, e.event_name) for e in events)
+        new = []
+        for event in events:
+            key = (event.name, event.event_name)
+            if key not in recorded:
+                recorded.add(key)
+                new.append(event)
+        table = cls.__table__
+        connection = db.session.connection()
+        size = MAX_PARAMETERS / len(table.columns)
+        inserted = []
+        for start in xrange(0, len(new), size):
+            batch = new[start:start + size]
+            try:
+                insertAll(connection, table, [e.getValues() for e in batch])
+                inserted.extend(batch)
+            except IntegrityError:
+                # Some of them were recorded since we looked, so find out
+                # which of the rest are ours one by one.
+                inserted.extend(e for e in batch if insertMissing(
+                    connection, table, [e.getValues()]))
+        ResourceVersion.bump(connection, *[ResourceVersion.statusKey(name)
+                                           for name in set(e.name for e in inserted)])
+        return inserted
 
     @classmethod
-    def buildStatus(cls, name):
-        build_events = cls.query.filter_by(name=name, group='build')
+    def getStatus(cls, name, pending=()):
+        """Returns the status of every step of release 'name', including
+           the progress made by 'pending', events that aren't recorded
+           yet."""
+        # Progress is maintained as events come in, so there's no need to
+        # look at the events themselves here.
+        rows = ReleaseProgress.query.filter_by(name=name).all()
+        if not rows:
+            # Archived releases keep their final status. Events that arrive
+            # late bring their progress back once they are recorded.
+            archived = ReleaseArchive.getStatus(name)
+            if archived is not None:
+                return archived
+        if pending:
+            rows = ReleaseProgress.merge(name, rows, pending)
+        if not rows:
+            return None
+        return ReleaseProgress.computeStatus(name, rows,
+                                             cls.getEnUSPlatforms(name))
+
 
-        builds = {'platforms': {}, 'progress': 0.00}
-        for platform in cls.getEnUSPlatforms(name):
-            builds['platforms'][platform] = 0.00
+    @classmethod
+    def getStatuses(cls, ready=None, complete=None, pending=None):
+        """Returns (name, status) for every matching release, in dashboard
+           order, where status is what getStatus() returns for it. 'pending'
+           maps release names to events that aren't recorded yet. Five
+           queries are made, no matter how many releases there are, and a
+           sixth only if some release has no stored progress. That only
+           beats getStatus() per release once every query has to go over
+           the network; on SQLite the two take about as long."""
+        releases = getReleases(ready, complete, dashboardOrder=True,
+                               include=('enUSPlatforms',))
+
+        def filtered(table):
+            query = table.query
+            if ready is not None or complete is not None:
+                query = query.join(ReleaseIndex,
+                                   ReleaseIndex.name == table.name)
+                query = ReleaseIndex.filtered(ready, complete, query)
+            return query
+
+        rows = defaultdict(list)
+        for row in filtered(ReleaseProgress):
+            rows[row.name].append(row)
+        archived = {}
+        if any(not rows[r.name] for r in releases):
+            archived = dict((a.name, a) for a in filtered(ReleaseArchive))
+
+        statuses = []
+        for release in releases:
+            name = release.name
+            status = None
+            if not rows[name] and name in archived:
+                # As in getStatus(), late events only count once recorded.
+                status = json.loads(archived[name].status)
+            else:
+                if pending and name in pending:
+                    rows[name] = ReleaseProgress.merge(name, rows[name],
+                                                       pending[name])
+                if rows[name]:
+                    platforms = json.loads(release.enUSPlatforms or '[]')
+                    status = ReleaseProgress.computeStatus(name, rows[name],
+                                                           platforms)
+            statuses.append((name, status))
+        return statuses
 
-        for build in build_events:
-            builds['platforms'][build.platform] = 1.00
-            builds['progress'] += (1.00/len(builds['platforms']))
 
-        return builds
+    @classmethod
+    def computeStatus(cls, name, events, platforms):
+        """Builds the status of every step from 'events', which may be any
+           iterable of rows with group, platform, event_name and chunkTotal
+           attributes. No queries are made."""
+        return ReleaseProgress.computeStatus(
+            name, ReleaseProgress.fold(name, events), platforms)
 
 
     @classmethod
-    def repackStatus(cls, name):
-        repack_events = cls.query.filter_by(name=name, group='repack')
+    def tagStatus(cls, name):
+        return _flagProgress(cls.query.filter_by(name=name, group='tag').count())
 
-        repacks = {'platforms': {}, 'progress': 0.00}
-        for platform in cls.getEnUSPlatforms(name):
-            repacks['platforms'][platform] = 0.00
 
-        for repack in repack_events:
-            if repacks['platforms'][repack.platform] != 1:
-                if 'complete' not in repack.event_name:
-                    repacks['platforms'][repack.platform] += (1.00/repack.chunkTotal)
-                else:
-                    repacks['platforms'][repack.platform] = 1.00
-        repacks['progress'] = (sum(repacks['platforms'].values()) / len(repacks['platforms']))
+    @classmethod
+    def buildStatus(cls, name):
+        build_events = cls.query.filter_by(name=name, group='build')
+        return _buildProgress(ReleaseProgress.aggregate(name, build_events),
+                              cls.getEnUSPlatforms(name))
 
-        for platform, progress in repacks['platforms'].items():
-            repacks['platforms'][platform] = round(progress, 2)
 
-        return repacks
+    @classmethod
+    def repackStatus(cls, name):
+        repack_events = cls.query.filter_by(name=name, group='repack')
+        return _chunkProgress(ReleaseProgress.aggregate(name, repack_events),
+                              cls.getEnUSPlatforms(name))
 
 
     @classmethod
     def updateStatus(cls, name):
-        if cls.query.filter_by(name=name, group='update').count() > 0:
-            return {'progress': 1.00}
-        return {'progress': 0.00}
+        return _flagProgress(cls.query.filter_by(name=name, group='update').count())
 
 
     @classmethod
     def releasetestStatus(cls, name):
-        if cls.query.filter_by(name=name, group='releasetest').count() > 0:
-            return {'progress': 1.00}
-        return {'progress': 0.00}
+        return _flagProgress(cls.query.filter_by(name=name, group='releasetest').count())
 
 
     @classmethod
@@ -340,22 +983,8 @@ class ReleaseEvents(db.Model):
         update_verify_events = cls.query.filter_by(name=name, group='update_verify')
         release_events = cls.query.filter_by(name=name, group='release')
 
-        update_verifys = {}
-        for platform in cls.getEnUSPlatforms(name):
-            update_verifys[platform] = 0.00
-
-        for update_verify in update_verify_events:
-            if update_verifys[update_verify.platform] != 1:
-                if 'complete' not in update_verify.event_name:
-                    update_verifys[update_verify.platform] += (1.00/update_verify.chunkTotal)
-                else:
-                    update_verifys[update_verify.platform] = 1.00
-        data = {'platforms': update_verifys, 'progress': 0.00}
-        data['progress'] = (sum(data['platforms'].values()) / len(data['platforms']))
-
-        for platform, progress in data['platforms'].items():
-            data['platforms'][platform] = round(progress, 2)
-
+        data = _chunkProgress(ReleaseProgress.aggregate(name, update_verify_events),
+                              cls.getEnUSPlatforms(name))
         if release_events.first():
             data['progress'] = 1.00
 
@@ -364,13 +993,524 @@ class ReleaseEvents(db.Model):
 
     @classmethod
     def postreleaseStatus(cls, name):
-        if cls.query.filter_by(name=name, group='postrelease').count() > 0:
-            return {'progress': 1.00}
-        return {'progress': 0.00}
+        return _flagProgress(cls.query.filter_by(name=name, group='postrelease').count())
 
 
     @classmethod
     def getEnUSPlatforms(cls, name):
-        releaseTable = getReleaseTable(name.split('-')[0].title())
-        release = releaseTable.query.filter_by(name=name).first()
-        return json.loads(release.enUSPlatforms)
+        """Returns the parsed en-US platforms of release 'name'. They are
+           cached, and only looked up at most every PLATFORM_CACHE_MAX_AGE
+           seconds (3600 by default) in case another process changed
+           them."""
+        def compute():
+            releaseTable = getReleaseTable(name)
+            release = releaseTable.listQuery(include=('enUSPlatforms',)) \
+                .filter_by(name=name).first()
+            return json.loads(release.enUSPlatforms or '[]')
+        maxAge = current_app.config.get('PLATFORM_CACHE_MAX_AGE', 3600)
+        return platformCache.get(name, compute, maxAge)
+
+
+# Steps whose progress is tracked separately for every platform, and the
+# subset of those that are split into chunks.
+PLATFORM_GROUPS = ('build', 'repack', 'update_verify')
+CHUNKED_GROUPS = ('repack', 'update_verify')
+
+
+# The Python and SQL halves of each rule below must agree, as stored
+# progress is kept with the former and rebuilt with the latter.
+
+def getChunkShare(chunkTotal):
+    """Returns how much of its platform a chunk out of 'chunkTotal' counts
+       for. Events without a total still count as events, but make no
+       progress."""
+    if not chunkTotal:
+        return 0.00
+    return 1.00 / chunkTotal
+
+
+def chunkShareClause(chunkTotal):
+    """getChunkShare() as SQL, for the column 'chunkTotal'. Dividing by
+       NULL gives NULL, which SUM() skips."""
+    return 1.00 / func.nullif(chunkTotal, 0)
+
+
+def isCompleteEvent(eventName):
+    """Returns whether an event named 'eventName' finishes its platform
+       outright, whatever the case of its name."""
+    return 'complete' in eventName.lower()
+
+
+def completeEventClause(eventName):
+    """isCompleteEvent() as SQL, for the column 'eventName'."""
+    return func.lower(eventName).contains('complete')
+
+
+class ReleaseProgress(db.Model):
+
+    """Progress of a release, per event group and platform. Rows are
+       updated as events are recorded so that status can be read without
+       going through release_events. Groups that aren't tracked per platform
+       use an empty platform."""
+    __tablename__ = 'release_progress'
+    name = db.Column(db.String(100), nullable=False, primary_key=True)
+    group = db.Column(db.String(100), nullable=False, primary_key=True)
+    platform = db.Column(db.String(100), nullable=False, primary_key=True)
+    # MySQL's plain FLOAT is single precision, which is not enough to add up
+    # hundreds of chunks reliably.
+    progress = db.Column(db.Float(precision=53), default=0.00, nullable=False)
+    events = db.Column(db.Integer(), default=0, nullable=False)
+
+    def __init__(self, name, group, platform):
+        self.name = name
+        self.group = group
+        self.platform = platform
+        self.progress = 0.00
+        self.events = 0
+
+    def __repr__(self):
+        return '<ReleaseProgress %r>' % ((self.name, self.group, self.platform),)
+
+    @staticmethod
+    def getKey(event):
+        """Returns the (group, platform) that 'event' counts towards."""
+        group = event.group or ''
+        platform = ''
+        if group in PLATFORM_GROUPS:
+            platform = event.platform or ''
+        return group, platform
+
+    def apply(self, event):
+        """Folds a single event into this row. Each chunk counts for
+           1/chunkTotal of its platform, and a 'complete' event finishes the
+           platform outright. Any event at all finishes the other groups."""
+        self.events += 1
+        if self.group in CHUNKED_GROUPS:
+            if self.progress != 1:
+                if not isCompleteEvent(event.event_name):
+                    self.progress = min(
+                        self.progress + getChunkShare(event.chunkTotal), 1.00)
+                else:
+                    self.progress = 1.00
+        else:
+            self.progress = 1.00
+
+    @classmethod
+    def fromTotals(cls, name, totals):
+        """Returns new, unsaved progress rows for release 'name' from
+           'totals', which maps (group, platform) to the number of events,
+           the sum of 1/chunkTotal over them and whether any of them is a
+           'complete' event. This gives the same progress as applying the
+           events one by one."""
+        rows = []
+        for (group, platform), (events, chunks, complete) in totals.iteritems():
+            row = cls(name, group, platform)
+            row.events = events
+            if group in CHUNKED_GROUPS and not complete:
+                row.progress = min(chunks, 1.00)
+            else:
+                row.progress = 1.00
+            rows.append(row)
+        return rows
+
+    @classmethod
+    def addTotals(cls, totals, rows):
+        """Adds up 'rows', as selected by sumEvents(), into 'totals' under
+           the (group, platform) they count towards."""
+        for row in rows:
+            key = cls.getKey(row)
+            events, chunks, complete = totals.get(key, (0, 0.00, False))
+            totals[key] = (events + row.events, chunks + (row.chunks or 0.00),
+                           complete or bool(row.complete))
+        return totals
+
+    @staticmethod
+    def sumEvents(events, *columns):
+        """Groups 'events', a query on ReleaseEvents, by 'columns', group and
+           platform, and selects the totals fromTotals() needs for each of
+           them, so that the database does the adding up."""
+        group = columns + (ReleaseEvents.group, ReleaseEvents.platform)
+        complete = case([(completeEventClause(ReleaseEvents.event_name), 1)],
+                        else_=0)
+        return events.with_entities(
+            *(group + (func.count().label('events'),
+                       func.sum(chunkShareClause(ReleaseEvents.chunkTotal))
+                       .label('chunks'),
+                       func.max(complete).label('complete')))) \
+            .group_by(*group)
+
+    @staticmethod
+    def totalEvents(events):
+        """Adds up 'events' into what fromTotals() takes, but keyed by
+           (name, group, platform) so that they may come from different
+           releases."""
+        totals = {}
+        for event in events:
+            key = (event.name,) + ReleaseProgress.getKey(event)
+            count, chunks, complete = totals.get(key, (0, 0.00, False))
+            if isCompleteEvent(event.event_name):
+                complete = True
+            elif key[1] in CHUNKED_GROUPS:
+                chunks += getChunkShare(event.chunkTotal)
+            totals[key] = (count + 1, chunks, complete)
+        return totals
+
+    @classmethod
+    def record(cls, event):
+        """Adds a newly created ReleaseEvents row to the stored progress. The
+           caller is expected to commit, so that the event and the progress
+           it made land in the same transaction."""
+        cls.recordMany([event])
+
+    @classmethod
+    def recordMany(cls, events):
+        """Like record(), but for any number of events, possibly from
+           different releases. Missing rows are created with a single
+           insert-ignore, and every row the events count towards is then
+           updated in place, so that concurrent events for the same row all
+           count. Rows already loaded in the session aren't refreshed."""
+        totals = cls.totalEvents(events)
+        if not totals:
+            return
+        table = cls.__table__
+        connection = db.session.connection()
+        insertMissing(connection, table,
+                      [{'name': name, 'group': group, 'platform': platform,
+                        'progress': 0.00, 'events': 0}
+                       for name, group, platform in sorted(totals)])
+        for key, (count, chunks, complete) in sorted(totals.iteritems()):
+            name, group, platform = key
+            if group in CHUNKED_GROUPS and not complete:
+                # The same as min(), which not every database has.
+                added = table.c.progress + chunks
+                progress = case([(added < 1.00, added)], else_=1.00)
+            else:
+                progress = 1.00
+            connection.execute(
+                table.update()
+                     .where(table.c.name == name)
+                     .where(table.c.group == group)
+                     .where(table.c.platform == platform)
+                     .values(events=table.c.events + count,
+                             progress=progress))
+
+    @classmethod
+    def fold(cls, name, events):
+        """Returns new, unsaved progress rows for 'events', all of which
+           belong to the release 'name'."""
+        totals = dict((key[1:], total) for key, total in
+                      cls.totalEvents(events).iteritems())
+        return cls.fromTotals(name, totals)
+
+    @classmethod
+    def aggregate(cls, name, events):
+        """Like fold(), but 'events' is a query on the events of release
+           'name', which are added up by the database in a single grouped
+           query instead of being loaded."""
+        return cls.fromTotals(name, cls.addTotals({}, cls.sumEvents(events)))
+
+    @classmethod
+    def merge(cls, name, rows, events):
+        """Returns new, unsaved copies of 'rows', the stored progress of
+           release 'name', with 'events' folded into them. The stored rows
+           are left alone."""
+        merged = {}
+        for row in rows:
+            copy = cls(name, row.group, row.platform)
+            copy.progress = row.progress
+            copy.events = row.events
+            merged[(row.group, row.platform)] = copy
+        for event in events:
+            key = cls.getKey(event)
+            if key not in merged:
+                merged[key] = cls(name, *key)
+            merged[key].apply(event)
+        return merged.values()
+
+    @classmethod
+    def isMissing(cls, name):
+        """Returns whether release 'name' has events but no stored progress,
+           as before rebuild-progress has been run for it."""
+        if cls.query.filter_by(name=name).first() is not None:
+            return False
+        return ReleaseEvents.query.filter_by(name=name).first() is not None
+
+    @classmethod
+    def rebuild(cls, names=None):
+        """Recomputes stored progress from release_events for the releases in
+           'names', or for every release if it's not given, and bumps the
+           status stamps of those whose progress was rewritten. Returns the
+           number of releases that have events."""
+        progress = cls.query
+        events = ReleaseEvents.query
+        if names:
+            progress = progress.filter(cls.name.in_(names))
+            events = events.filter(ReleaseEvents.name.in_(names))
+        rebuilt = set(r.name for r in progress.with_entities(cls.name).distinct())
+        progress.delete(synchronize_session=False)
+
+        totals = cls.sumEvents(events, ReleaseEvents.name) \
+            .order_by(ReleaseEvents.name)
+        count = 0
+        for name, rows in groupby(totals, key=lambda r: r.name):
+            db.session.add_all(cls.fromTotals(name, cls.addTotals({}, rows)))
+            db.session.flush()
+            rebuilt.add(name)
+            count += 1
+        # Whatever status was served before may have changed.
+        ResourceVersion.bump(db.session.connection(),
+                             *[ResourceVersion.statusKey(n) for n in rebuilt])
+        db.session.commit()
+        return count
+
+    @classmethod
+    def computeStatus(cls, name, rows, platforms):
+        """Builds the status of every step of a release from its progress
+           rows. No queries are made."""
+        byGroup = defaultdict(list)
+        for row in rows:
+            byGroup[row.group].append(row)
+
+        status = {
+            'tag': _flagProgress(byGroup['tag']),
+            'build': _buildProgress(byGroup['build'], platforms),
+            'repack': _chunkProgress(byGroup['repack'], platforms),
+            'update': _flagProgress(byGroup['update']),
+            'releasetest': _flagProgress(byGroup['releasetest']),
+            'readyforrelease': _chunkProgress(byGroup['update_verify'],
+                                              platforms),
+            'postrelease': _flagProgress(byGroup['postrelease']),
+        }
+        if byGroup['release']:
+            status['readyforrelease']['progress'] = 1.00
+        status['name'] = name
+        return status
+
+
+class ReleaseArchive(db.Model):
+
+    """A release whose events have been archived. Its events and progress
+       are moved out of the database, leaving only its final status here
+       and its events in a compressed file. See kickoff.archive."""
+    __tablename__ = 'release_archives'
+    name = db.Column(db.String(100), primary_key=True)
+    _archivedAt = db.Column('archivedAt', db.DateTime(pytz.utc),
+                            nullable=False, default=datetime.utcnow)
+    # The status as getStatus() returned it, as JSON.
+    status = db.Column(db.Text(), nullable=False)
+    events = db.Column(db.Integer(), nullable=False)
+    # Relative to the archive directory.
+    filename = db.Column(db.String(200), nullable=False)
+
+    @hybrid_property
+    def archivedAt(self):
+        return pytz.utc.localize(self._archivedAt)
+
+    @archivedAt.setter
+    def archivedAt(self, archivedAt):
+        self._archivedAt = archivedAt
+
+    def __repr__(self):
+        return '<ReleaseArchive %r>' % self.name
+
+    @classmethod
+    def getStatus(cls, name):
+        archive = cls.query.get(name)
+        if not archive:
+            return None
+        return json.loads(archive.status)
+
+
+class ReleaseSnapshot(db.Model):
+
+    """The status of a complete release, frozen as the body StatusAPI
+       serves for it. It's only good for as long as the release's
+       validators still have the ETag it was taken at; any later event or
+       change to the release makes it stale."""
+    __tablename__ = 'release_snapshots'
+    name = db.Column(db.String(100), primary_key=True)
+    etag = db.Column(db.String(32), nullable=False)
+    body = db.Column(db.Text(), nullable=False)
+
+    def __repr__(self):
+        return '<ReleaseSnapshot %r>' % self.name
+
+    @classmethod
+    def take(cls, name, etag):
+        """Freezes the current status of release 'name', whose validators
+           have the ETag 'etag'. The caller is expected to commit."""
+        snapshot = cls.query.get(name) or cls(name=name)
+        snapshot.etag = etag
+        snapshot.body = json.dumps({'status': ReleaseEvents.getStatus(name)})
+        db.session.add(snapshot)
+        return snapshot
+
+    @classmethod
+    def getBody(cls, name, etag):
+        """Returns the frozen body of release 'name' if it was taken at
+           'etag', otherwise None. The row isn't loaded through the ORM."""
+        table = cls.__table__
+        row = db.session.execute(
+            table.select(table.c.name == name).where(table.c.etag == etag)
+            .with_only_columns([table.c.body])).first()
+        if row:
+            return row.body
+        return None
+
+
+def _flagProgress(rows):
+    if rows:
+        return {'progress': 1.00}
+    return {'progress': 0.00}
+
+
+def _buildProgress(rows, platforms):
+    builds = {'platforms': {}, 'progress': 0.00}
+    for platform in platforms:
+        builds['platforms'][platform] = 0.00
+
+    for build in rows:
+        builds['platforms'][build.platform] = 1.00
+    # Releases without en-US platforms have nothing to build.
+    if builds['platforms']:
+        builds['progress'] = (sum(build.events for build in rows) * 1.00 /
+                              len(builds['platforms']))
+
+    return builds
+
+
+def _chunkProgress(rows, platforms):
+    progress = {}
+    for platform in platforms:
+        progress[platform] = 0.00
+
+    for row in rows:
+        progress[row.platform] = row.progress
+    data = {'platforms': progress, 'progress': 0.00}
+    if progress:
+        data['progress'] = (sum(progress.values()) / len(progress))
+
+    for platform, value in progress.items():
+        progress[platform] = round(value, 2)
+
+    return data
+
+
+def _releaseChanged(mapper, connection, target):
+    resources = [ResourceVersion.releasesKey(),
+                 ResourceVersion.releaseKey(target.name)]
+    # Edits can rename a release, in which case the old name changed too.
+    for name in get_history(target, 'name').deleted:
+        resources.append(ResourceVersion.releaseKey(name))
+    ResourceVersion.bump(connection, *resources)
+
+
+def _indexRelease(mapper, connection, target):
+    table = ReleaseIndex.__table__
+    values = ReleaseIndex.getValues(target)
+    oldName = target.name
+    # Edits can rename a release, so look it up by the name it had.
+    if get_history(target, 'name').deleted:
+        oldName = get_history(target, 'name').deleted[0]
+    updated = connection.execute(
+        table.update().where(table.c.name == oldName).values(**values))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(**values))
+
+
+def _unindexRelease(mapper, connection, target):
+    table = ReleaseIndex.__table__
+    connection.execute(table.delete().where(table.c.name == target.name))
+
+
+def _storeL10nBlob(mapper, connection, target):
+    cached = getattr(target, '_l10n', None)
+    if cached and get_history(target, 'l10nHash').added:
+        L10nBlob.store(connection, cached[1])
+
+
+def _storeL10n(mapper, connection, target):
+    table = ReleaseL10n.__table__
+    oldNames = get_history(target, 'name').deleted
+    hashes = get_history(target, 'l10nHash').added
+    if hashes:
+        for name in [target.name] + list(oldNames):
+            connection.execute(table.delete().where(table.c.name == name))
+        cached = getattr(target, '_l10n', None)
+        if cached and cached[0] == hashes[0]:
+            changesets = cached[1]
+        else:
+            changesets = L10nBlob.load(hashes[0], connection)
+        values = ReleaseL10n.getValues(target.name, changesets or '')
+        if values:
+            connection.execute(table.insert(), values)
+    elif oldNames:
+        connection.execute(table.update()
+                           .where(table.c.name == oldNames[0])
+                           .values(name=target.name))
+
+
+def _deleteL10n(mapper, connection, target):
+    table = ReleaseL10n.__table__
+    connection.execute(table.delete().where(table.c.name == target.name))
+
+
+# Cache entries to invalidate once the transaction that changed them
+# commits, by session. Invalidating them while flushing would let other
+# requests cache what they read before the commit, and would be for
+# nothing if the transaction is rolled back.
+_invalidations = WeakKeyDictionary()
+
+
+def _invalidateOnCommit(target, cache, *keys):
+    invalidations = _invalidations.setdefault(object_session(target), set())
+    invalidations.update((cache, key) for key in keys)
+
+
+def _invalidateCaches(session):
+    for cache, key in _invalidations.pop(session, ()):
+        cache.invalidate(key)
+
+
+def _dropInvalidations(session):
+    _invalidations.pop(session, None)
+
+
+def _invalidateSuggestions(mapper, connection, target):
+    _invalidateOnCommit(target, suggestionCache, target.product)
+
+
+def _invalidatePlatforms(mapper, connection, target):
+    _invalidateOnCommit(target, platformCache, target.name,
+                        *get_history(target, 'name').deleted)
+
+
+def _platformsChanged(mapper, connection, target):
+    # Most updates only touch the status or flags, which don't matter here.
+    if get_history(target, 'name').deleted or \
+            get_history(target, 'enUSPlatforms').added:
+        _invalidatePlatforms(mapper, connection, target)
+
+
+def _eventRecorded(mapper, connection, target):
+    ResourceVersion.bump(connection, ResourceVersion.statusKey(target.name))
+
+
+for table in (FennecRelease, FirefoxRelease, ThunderbirdRelease):
+    for identifier in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(table, identifier, _releaseChanged)
+        event.listen(table, identifier, _invalidateSuggestions)
+    event.listen(table, 'after_insert', _indexRelease)
+    event.listen(table, 'after_update', _indexRelease)
+    event.listen(table, 'after_delete', _unindexRelease)
+    event.listen(table, 'before_insert', _storeL10nBlob)
+    event.listen(table, 'before_update', _storeL10nBlob)
+    event.listen(table, 'after_insert', _storeL10n)
+    event.listen(table, 'after_update', _storeL10n)
+    event.listen(table, 'after_delete', _deleteL10n)
+    event.listen(table, 'after_insert', _invalidatePlatforms)
+    event.listen(table, 'after_update', _platformsChanged)
+    event.listen(table, 'after_delete', _invalidatePlatforms)
+event.listen(ReleaseEvents, 'after_insert', _eventRecorded)
+event.listen(Session, 'after_commit', _invalidateCaches)
+event.listen(Session, 'after_rollback', _dropInvalidations)
@@ -0,0 +1,214 @@
+"""Profiles requests that turn out to be slow, so that pathological cases
+   can be caught in production.
+
+   A request can't be known to be slow until it's over, so every request is
+   profiled, cheaply: a single background thread samples the stacks of the
+   threads handling requests every PROFILE_INTERVAL seconds (0.01 by
+   default), and the SQL statements each request runs are noted. Requests
+   that take at least PROFILE_SLOW_REQUESTS seconds have their samples and
+   statements written to a file in PROFILE_DIR, of which the newest
+   PROFILE_KEEP (100 by default) are kept. Profiling is off unless
+   PROFILE_SLOW_REQUESTS is set.
+
+   The stacks are written in the folded format that flame graph tools such
+   as flamegraph.pl read."""
+from collections import Counter
+import logging
+import os
+import sys
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# Parameters are cut short, as some are whole l10n changesets.
+MAX_PARAMETERS_LENGTH = 200
+SUFFIX = '.profile'
+
+
+class RequestProfile(object):
+
+    """The stack samples and SQL statements of a single request."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.samples = Counter()
+        self.statements = []
+        self._statementStart = None
+
+
+def getStack(frame):
+    """Returns the stack that ends at 'frame' in the folded format,
+       outermost call first."""
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append('%s:%s' % (code.co_filename, code.co_name))
+        frame = frame.f_back
+    calls.reverse()
+    return ';'.join(calls)
+
+
+class Sampler(threading.Thread):
+
+    """Samples the stacks of the threads that have a profile, every
+       'interval' seconds."""
+
+    def __init__(self, interval):
+        threading.Thread.__init__(self, name='Request sampler')
+        self.daemon = True
+        self.interval = interval
+        # Samples are only ever added with the lock held, so a profile is
+        # left alone once remove() returns.
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._busy = threading.Event()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles[threading.current_thread().ident] = profile
+            self._busy.set()
+
+    def remove(self):
+        with self._lock:
+            self._profiles.pop(threading.current_thread().ident, None)
+
+    def sample(self):
+        with self._lock:
+            if not self._profiles:
+                self._busy.clear()
+                return
+            frames = sys._current_frames()
+            for ident, profile in self._profiles.iteritems():
+                if ident in frames:
+                    profile.samples[getStack(frames[ident])] += 1
+
+    def run(self):
+        while True:
+            self._busy.wait()
+            time.sleep(self.interval)
+            self.sample()
+
+
+_sampler = None
+_samplerLock = threading.Lock()
+
+
+def getSampler(app):
+    global _sampler
+    with _samplerLock:
+        if _sampler is None:
+            _sampler = Sampler(app.config.get('PROFILE_INTERVAL', 0.01))
+            _sampler.start()
+        return _sampler
+
+
+def current():
+    """Returns the RequestProfile of the current request, or None if there
+       is no request or it isn't being profiled."""
+    try:
+        return getattr(g, 'profile', None)
+    except RuntimeError:
+        return None
+
+
+def _beforeExecute(conn, cursor, statement, parameters, context, executemany):
+    profile = current()
+    if profile:
+        profile._statementStart = time.time()
+
+
+def _afterExecute(conn, cursor, statement, parameters, context, executemany):
+    profile = current()
+    if profile and profile._statementStart is not None:
+        profile.statements.append((time.time() - profile._statementStart,
+                                   statement, parameters))
+        profile._statementStart = None
+
+
+# See kickoff.metrics for why these are on the Engine class.
+event.listen(Engine, 'before_cursor_execute', _beforeExecute)
+event.listen(Engine, 'after_cursor_execute', _afterExecute)
+
+
+def formatProfile(profile, duration, status, interval):
+    lines = [
+        '# %s %s' % (request.method, request.url),
+        '# endpoint: %s' % request.endpoint,
+        '# status: %s' % status,
+        '# duration: %.3f s' % duration,
+        '# samples: %d, every %g s' % (sum(profile.samples.values()),
+                                      interval),
+        '',
+        '## SQL: %d statements, %.3f s' % (
+            len(profile.statements),
+            sum(d for d, _, _ in profile.statements)),
+    ]
+    for duration, statement, parameters in profile.statements:
+        parameters = repr(parameters)
+        if len(parameters) > MAX_PARAMETERS_LENGTH:
+            parameters = parameters[:MAX_PARAMETERS_LENGTH] + '...'
+        lines.append('%.4f s  %s' % (duration, ' '.join(statement.split())))
+        lines.append('         %s' % parameters)
+    lines.extend(['', '## Stacks'])
+    for stack, count in profile.samples.most_common():
+        lines.append('%s %d' % (stack, count))
+    return '\n'.join(lines) + '\n'
+
+
+def writeProfile(directory, keep, endpoint, text):
+    """Writes 'text' to a new file in 'directory', and removes all but the
+       newest 'keep' profiles there. Returns the path of the new file."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    now = time.time()
+    # Names sort in the order the profiles were written.
+    filename = '%s.%06d-%d-%s%s' % (time.strftime('%Y%m%dT%H%M%S',
+                                                  time.gmtime(now)),
+                                    (now % 1) * 1000000, os.getpid(),
+                                    endpoint, SUFFIX)
+    path = os.path.join(directory, filename)
+    with open(path, 'w') as f:
+        f.write(text)
+    profiles = sorted(n for n in os.listdir(directory) if n.endswith(SUFFIX))
+    for name in profiles[:max(len(profiles) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            # Another process got to it first.
+            pass
+    return path
+
+
+def startRequest(app):
+    if app.config.get('PROFILE_SLOW_REQUESTS') is None:
+        return
+    g.profile = RequestProfile()
+    getSampler(app).add(g.profile)
+
+
+def finishRequest(app, status):
+    """Stops profiling the current request, which ended with 'status', and
+       writes its profile out if it was slow. Does nothing if that was done
+       already."""
+    profile = current()
+    if not profile:
+        return
+    g.profile = None
+    sampler = getSampler(app)
+    sampler.remove()
+    duration = time.time() - profile.start
+    if duration >= app.config['PROFILE_SLOW_REQUESTS']:
+        text = formatProfile(profile, duration, status, sampler.interval)
+        try:
+            path = writeProfile(app.config.get('PROFILE_DIR', 'profiles'),
+                                app.config.get('PROFILE_KEEP', 100),
+                                request.endpoint or 'none', text)
+            log.info('%s took %.3f s, profile written to %s',
+                     request.path, duration, path)
+        except (IOError, OSError):
+            log.exception('Failed to write the profile of %s', request.path)
@@ -0,0 +1,46 @@
+"""A minimal in-process publish/subscribe mechanism, used to wake up status
+   streams as soon as a release changes instead of having them poll the
+   database.
+
+   Every process has its own broker, so under a multi-process deployment a
+   subscriber won't hear about changes made by another process. Subscribers
+   must therefore treat a wake-up as a hint and still check for changes on
+   their own every now and then."""
+import threading
+import time
+
+
+class Broker(object):
+
+    """Keeps a version number for every release that has changed since the
+       process started. Publishing bumps the version and wakes up everyone
+       who is waiting on it."""
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._versions = {}
+
+    def publish(self, name):
+        with self._changed:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._changed.notify_all()
+
+    def version(self, name):
+        with self._changed:
+            return self._versions.get(name, 0)
+
+    def wait(self, name, version, timeout):
+        """Blocks until the version of 'name' is no longer 'version', or
+           until 'timeout' seconds have passed. Returns the current
+           version either way."""
+        deadline = time.time() + timeout
+        with self._changed:
+            while self._versions.get(name, 0) == version:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return self._versions.get(name, 0)
+
+
+broker = Broker()
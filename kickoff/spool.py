@@ -0,0 +1,234 @@
+"""A durable local buffer for release events, so that posting an event
+   doesn't have to wait for the database.
+
+   Events are appended to a SQLite database on local disk, in WAL mode, and
+   acknowledged as soon as they are there. A background thread in every
+   process moves them into release_events in batches, dropping the ones
+   that were already recorded. Events that haven't made it there yet are
+   merged into the status that StatusAPI serves.
+
+   The spool is enabled by setting EVENT_SPOOL to the path of its file. All
+   processes of a deployment must share the same file. They flush every
+   EVENT_SPOOL_INTERVAL seconds (1 by default); if that's set to 0, nothing
+   is flushed in the background and it's left to
+   "kickoff-admin.py flush-events"."""
+from collections import defaultdict
+import logging
+import sqlite3
+import threading
+
+from flask import current_app
+
+from kickoff import db
+from kickoff.archive import restoreReleases
+from kickoff.model import ReleaseEvents, ReleaseProgress
+from kickoff.pubsub import broker
+
+log = logging.getLogger(__name__)
+
+
+class EventSpool(object):
+
+    """The events waiting to be recorded, in the order they were
+       appended. Each (name, event_name) is only held once."""
+
+    def __init__(self, path):
+        self.path = path
+        self.flusher = None
+        self._lock = threading.Lock()
+        # Statements are committed as they run; appends only return once
+        # the event is safely on disk.
+        self._conn = sqlite3.connect(path, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS events ('
+                           'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                           'name TEXT NOT NULL, '
+                           'event_name TEXT NOT NULL, '
+                           'data TEXT NOT NULL, '
+                           'UNIQUE (name, event_name))')
+        # Events that couldn't be recorded even on their own, kept aside so
+        # that they don't hold up the ones behind them.
+        self._conn.execute('CREATE TABLE IF NOT EXISTS failed ('
+                           'seq INTEGER PRIMARY KEY, '
+                           'name TEXT NOT NULL, '
+                           'event_name TEXT NOT NULL, '
+                           'data TEXT NOT NULL, '
+                           'error TEXT NOT NULL)')
+
+    def _execute(self, sql, *params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def append(self, event):
+        """Adds 'event', an unsaved ReleaseEvents, to the spool. Returns
+           False if an event with the same name and event_name is already
+           waiting in it."""
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO events (name, event_name, data) '
+                'VALUES (?, ?, ?)',
+                (event.name, event.event_name, event.toJSON()))
+            return cursor.rowcount == 1
+
+    def getPending(self, name):
+        """Returns the events of release 'name' that are still waiting to
+           be recorded, as unsaved ReleaseEvents. Events that a flush is
+           recording right now are left out."""
+        events = [ReleaseEvents.fromJSON(row[0]) for row in self._execute(
+            'SELECT data FROM events WHERE name = ? ORDER BY seq', name)]
+        if not events:
+            return []
+        recorded = ReleaseEvents.getExisting((e.name, e.event_name)
+                                             for e in events)
+        return [e for e in events if (e.name, e.event_name) not in recorded]
+
+    def getAllPending(self):
+        """Like getPending(), but for every release with events in the
+           spool. Returns a dict of lists of events, keyed by release
+           name."""
+        events = [ReleaseEvents.fromJSON(row[0]) for row in self._execute(
+            'SELECT data FROM events ORDER BY seq')]
+        pending = defaultdict(list)
+        if events:
+            recorded = ReleaseEvents.getExisting((e.name, e.event_name)
+                                                 for e in events)
+            for e in events:
+                if (e.name, e.event_name) not in recorded:
+                    pending[e.name].append(e)
+        return pending
+
+    def _record(self, rows):
+        """Records the events in 'rows', (seq, data) pairs from the spool,
+           in a single transaction. Returns the events that weren't
+           recorded already."""
+        events = [ReleaseEvents.fromJSON(data) for _, data in rows]
+        restoreReleases(set(e.name for e in events),
+                        current_app.config.get('EVENT_ARCHIVE_DIR'))
+        # Other processes may be flushing some of the same events right now.
+        added = ReleaseEvents.insertMany(events)
+        ReleaseProgress.recordMany(added)
+        db.session.commit()
+        return added
+
+    def flush(self, limit=1000):
+        """Records up to 'limit' of the oldest events in release_events,
+           along with the progress they made, and removes them from the
+           spool. Events that were already recorded are dropped. If the
+           batch fails, its events are recorded one by one, and those that
+           still fail are moved to the failed table. Returns the number of
+           events that were taken from the spool."""
+        rows = self._execute('SELECT seq, data FROM events ORDER BY seq '
+                             'LIMIT ?', limit)
+        if not rows:
+            return 0
+        failed = []
+        try:
+            added = self._record(rows)
+        except Exception:
+            db.session.rollback()
+            log.exception('Failed to flush %d spooled events, recording '
+                          'them one by one', len(rows))
+            added = []
+            for row in rows:
+                try:
+                    added.extend(self._record([row]))
+                except Exception as e:
+                    db.session.rollback()
+                    log.exception('Failed to record spooled event %s, moving '
+                                  'it aside', row[1])
+                    failed.append((repr(e), row[0]))
+        # If we die before this, the events are simply dropped as
+        # duplicates by the next flush.
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO failed (seq, name, event_name, data, '
+                'error) SELECT seq, name, event_name, data, ? FROM events '
+                'WHERE seq = ?', failed)
+            self._conn.executemany('DELETE FROM events WHERE seq = ?',
+                                   [(seq,) for seq, _ in rows])
+        for name in set(e.name for e in added):
+            broker.publish(name)
+        log.debug('Flushed %d spooled events, %d new, %d failed', len(rows),
+                  len(added), len(failed))
+        return len(rows)
+
+    def getFailed(self):
+        """Returns the events that couldn't be recorded, as (data, error)
+           pairs in the order they were appended."""
+        return self._execute('SELECT data, error FROM failed ORDER BY seq')
+
+    def flushAll(self, batchSize=1000):
+        total = 0
+        while True:
+            count = self.flush(batchSize)
+            total += count
+            if count < batchSize:
+                return total
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM events')[0][0]
+
+    def close(self):
+        if self.flusher:
+            self.flusher.stop()
+        with self._lock:
+            self._conn.close()
+
+
+class Flusher(threading.Thread):
+
+    """Flushes a spool into the database of 'app' every 'interval' seconds
+       until it's stopped."""
+
+    def __init__(self, app, spool, interval):
+        threading.Thread.__init__(self, name='EventSpool flusher')
+        self.daemon = True
+        self.app = app
+        self.spool = spool
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                with self.app.test_request_context():
+                    self.spool.flushAll()
+            except Exception:
+                log.exception('Failed to flush spooled events')
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+
+_spools = {}
+_spoolsLock = threading.Lock()
+
+
+def getSpool(app):
+    """Returns the spool that 'app' is configured to use, starting its
+       flusher the first time. Returns None if events aren't spooled."""
+    path = app.config.get('EVENT_SPOOL')
+    if not path:
+        return None
+    with _spoolsLock:
+        if path not in _spools:
+            spool = EventSpool(path)
+            interval = app.config.get('EVENT_SPOOL_INTERVAL', 1)
+            if interval:
+                spool.flusher = Flusher(app, spool, interval)
+                spool.flusher.start()
+            _spools[path] = spool
+        return _spools[path]
+
+
+def closeSpools():
+    """Stops every flusher and closes every spool opened by getSpool()."""
+    with _spoolsLock:
+        for spool in _spools.values():
+            spool.close()
+        _spools.clear()
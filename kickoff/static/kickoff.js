@@ -22,44 +22,51 @@ function initialSetup(){
 function viewReleases(){
   toLocalDate();
   // initial sorting by SubmittedAt (descending)
-  // and then saving user table state using localStorage
-  $( "#reviewed" ).dataTable({
-    "bJQueryUI": true,
-    "aaSorting": [[ 3, "desc" ]],
-    "bStateSave": true,
-    "fnStateSave": function (oSettings, oData) {
-        localStorage.setItem( 'DataTables_reviewed'+window.location.pathname, JSON.stringify(oData) );
-    },
-    "fnStateLoad": function (oSettings) {
-        return JSON.parse( localStorage.getItem('DataTables_reviewed'+window.location.pathname) );
-    }
-  });
-  $( "#complete" ).dataTable({
+  releasesTable("reviewed", 3);
+  releasesTable("complete", 2);
+}
+
+function releasesTable(id, sortColumn){
+  // Paging, sorting and searching are done by the server. The first page
+  // is already rendered, so it isn't fetched again unless a saved table
+  // state asks for a different one.
+  var table = $( "#" + id );
+  var stateKey = 'DataTables_' + id + window.location.pathname;
+  var state = JSON.parse( localStorage.getItem(stateKey) );
+  table.dataTable({
     "bJQueryUI": true,
-    "aaSorting": [[ 2, "desc" ]],
+    "bServerSide": true,
+    "sAjaxSource": table.data("source"),
+    "iDeferLoading": state ? null : table.data("total"),
+    "iDisplayLength": table.data("page-size"),
+    "aaSorting": [[ sortColumn, "desc" ]],
+    "aoColumnDefs": [{ "bSortable": false, "aTargets": [ "unsortable" ] }],
+    "fnDrawCallback": function () { toLocalDate(); },
+    // saving user table state using localStorage
     "bStateSave": true,
     "fnStateSave": function (oSettings, oData) {
-        localStorage.setItem( 'DataTables_complete'+window.location.pathname, JSON.stringify(oData) );
+        localStorage.setItem( stateKey, JSON.stringify(oData) );
     },
     "fnStateLoad": function (oSettings) {
-        return JSON.parse( localStorage.getItem('DataTables_complete'+window.location.pathname) );
+        return state;
     }
   });
 }
 
 function toLocalDate() {
-    $( '.submittedAt' ).each(function() {
+    $( '.submittedAt:not(.localDate)' ).each(function() {
         var localdate = new Date($(this).html());
 
         // formatDate does not handle hour/minute
         formateddate=$.datepicker.formatDate('yy/mm/dd', localdate) + " " + localdate.getHours() + ":" + (localdate.getMinutes() < 10?"0":"") + localdate.getMinutes();
 
-        if ( $(this).prop('tagName') == 'TD' ) {
+        if ( $(this).closest('td').length ) {
             $(this).empty().append(formateddate);
         } else {
             //this is not a table row: prepend 'Submitted at: '
             $(this).empty().append('Submitted at: ' + formateddate);
         }
+        $(this).addClass('localDate');
     });
 };
 
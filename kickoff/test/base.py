@@ -4,6 +4,7 @@ from tempfile import mkstemp
 import unittest
 
 from kickoff import app, db
+from kickoff.cache import platformCache, suggestionCache
 from kickoff.log import cef_config
 from kickoff.model import FennecRelease, FirefoxRelease, ThunderbirdRelease
 
@@ -16,6 +17,8 @@ class TestBase(unittest.TestCase):
         app.config['CSRF_ENABLED'] = False
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///%s' % self.db_file
         app.config.update(cef_config(self.cef_file))
+        suggestionCache.clear()
+        platformCache.clear()
         with app.test_request_context():
             db.init_app(app)
             db.create_all()
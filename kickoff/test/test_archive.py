@@ -0,0 +1,158 @@
+from datetime import datetime
+import os
+import shutil
+from tempfile import mkdtemp
+
+import simplejson as json
+
+from kickoff import app, db
+from kickoff.archive import archiveReleases, getArchivable, \
+    getArchivedEvents, readEvents
+from kickoff.model import FirefoxRelease, ReleaseArchive, ReleaseEvents, \
+    ReleaseProgress
+from kickoff.test.views.base import ViewTest
+
+
+class TestArchive(ViewTest):
+    releaseName = 'Firefox-3.0-build1'
+
+    def setUp(self):
+        ViewTest.setUp(self)
+        self.directory = mkdtemp()
+        with app.test_request_context():
+            r = FirefoxRelease(partials='2.0build1', promptWaitTime=None,
+                               submitter='joe', version='3.0', buildNumber=1,
+                               branch='a', mozillaRevision='abc',
+                               l10nChangesets='af def', dashboardCheck=True,
+                               mozillaRelbranch=None,
+                               enUSPlatforms=json.dumps(['linux', 'win32']))
+            r.ready = True
+            r.complete = True
+            db.session.add(r)
+            # An old release that never completed.
+            release = FirefoxRelease.query.filter_by(name='Firefox-2-build1').one()
+            release.complete = False
+            release.enUSPlatforms = json.dumps(['linux'])
+            for name, event_name, platform, chunkNum, chunkTotal, group in (
+                    (self.releaseName, 'tag', None, 1, 1, 'tag'),
+                    (self.releaseName, 'linux_build', 'linux', 1, 1, 'build'),
+                    (self.releaseName, 'linux_repack_1/2', 'linux', 1, 2, 'repack'),
+                    ('Firefox-2-build1', 'tag', None, 1, 1, 'tag')):
+                db.session.add(ReleaseEvents(name, datetime(2005, 1, 1, 1, 1, 1),
+                                             '%s_%s' % (name, event_name),
+                                             platform, 0, chunkNum, chunkTotal,
+                                             group))
+            db.session.commit()
+            ReleaseProgress.rebuild()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        ViewTest.tearDown(self)
+
+    def testGetArchivable(self):
+        with app.test_request_context():
+            self.assertEquals(getArchivable(30), [self.releaseName])
+            self.assertEquals(getArchivable(100 * 365), [])
+
+    def testArchive(self):
+        with app.test_request_context():
+            expected = ReleaseEvents.getStatus(self.releaseName)
+            self.assertEquals(archiveReleases(30, self.directory), 1)
+            self.assertEquals(ReleaseEvents.query.filter_by(name=self.releaseName).count(), 0)
+            self.assertEquals(ReleaseProgress.query.filter_by(name=self.releaseName).count(), 0)
+            archive = ReleaseArchive.query.get(self.releaseName)
+            self.assertEquals(archive.events, 3)
+            events = readEvents(os.path.join(self.directory, archive.filename))
+            self.assertEquals(sorted(e.event_name for e in events),
+                              ['Firefox-3.0-build1_linux_build',
+                               'Firefox-3.0-build1_linux_repack_1/2',
+                               'Firefox-3.0-build1_tag'])
+            self.assertEquals(ReleaseEvents.getStatus(self.releaseName), expected)
+            self.assertEquals(dict(ReleaseEvents.getStatuses())[self.releaseName],
+                              expected)
+            # Releases that aren't complete are left alone.
+            self.assertEquals(ReleaseEvents.query.filter_by(name='Firefox-2-build1').count(), 1)
+
+    def testLateEventsAreAdded(self):
+        with app.test_request_context():
+            archiveReleases(30, self.directory)
+            db.session.add(ReleaseEvents(self.releaseName, datetime(2005, 1, 2),
+                                         'Firefox-3.0-build1_linux_repack_2/2',
+                                         'linux', 0, 2, 2, 'repack'))
+            db.session.commit()
+            archiveReleases(30, self.directory)
+            self.assertEquals(ReleaseArchive.query.get(self.releaseName).events, 4)
+            self.assertEquals(len(getArchivedEvents(self.releaseName, self.directory)), 4)
+            status = ReleaseEvents.getStatus(self.releaseName)
+            self.assertEquals(status['repack']['platforms'],
+                              {'linux': 1.00, 'win32': 0.00})
+
+    def postEvent(self, event_name, platform, chunkNum, chunkTotal, group):
+        data = {
+            'sent': '2005-01-02 01:01:01',
+            'event_name': '%s_%s' % (self.releaseName, event_name),
+            'results': 0,
+            'platform': platform,
+            'chunkNum': chunkNum,
+            'chunkTotal': chunkTotal,
+            'group': group,
+        }
+        ret = self.post('/releases/%s/status' % self.releaseName, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        return json.loads(ret.data)['status']
+
+    def testLateEventsRestoreTheArchive(self):
+        with app.test_request_context():
+            archiveReleases(30, self.directory)
+        app.config['EVENT_ARCHIVE_DIR'] = self.directory
+        try:
+            self.assertEquals(self.postEvent('linux_repack_2/2', 'linux', 2, 2,
+                                             'repack'), 'added')
+            # A retry of an event that was archived.
+            self.assertEquals(self.postEvent('tag', None, 1, 1, 'tag'),
+                              'duplicate')
+        finally:
+            del app.config['EVENT_ARCHIVE_DIR']
+        with app.test_request_context():
+            self.assertEquals(ReleaseArchive.query.get(self.releaseName), None)
+            self.assertEquals(ReleaseEvents.query.filter_by(name=self.releaseName).count(), 4)
+            status = ReleaseEvents.getStatus(self.releaseName)
+            self.assertEquals(status['tag'], {'progress': 1.00})
+            self.assertEquals(status['build']['platforms'],
+                              {'linux': 1.00, 'win32': 0.00})
+            self.assertEquals(status['repack']['platforms'],
+                              {'linux': 1.00, 'win32': 0.00})
+            archiveReleases(30, self.directory)
+            self.assertEquals(ReleaseArchive.query.get(self.releaseName).events, 4)
+            self.assertEquals(ReleaseEvents.getStatus(self.releaseName), status)
+
+    def testMissingArchiveFile(self):
+        url = '/releases/%s/status' % self.releaseName
+        with app.test_request_context():
+            archiveReleases(30, self.directory)
+            archive = ReleaseArchive.query.get(self.releaseName)
+            os.remove(os.path.join(self.directory, archive.filename))
+        app.config['EVENT_ARCHIVE_DIR'] = self.directory
+        try:
+            ret = self.get(url, query_string={'events': 1})
+        finally:
+            del app.config['EVENT_ARCHIVE_DIR']
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(ret.data)['events'], [])
+
+    def testStatusAPI(self):
+        url = '/releases/%s/status' % self.releaseName
+        expected = json.loads(self.get(url, query_string={'events': 1}).data)
+        with app.test_request_context():
+            archiveReleases(30, self.directory)
+        app.config['EVENT_ARCHIVE_DIR'] = self.directory
+        try:
+            ret = self.get(url, query_string={'events': 1})
+        finally:
+            del app.config['EVENT_ARCHIVE_DIR']
+        self.assertEquals(ret.status_code, 200, ret.data)
+        got = json.loads(ret.data)
+        self.assertEquals(got['status'], expected['status'])
+        key = lambda e: e['event_name']
+        self.assertEquals(sorted(got['events'], key=key),
+                          sorted(expected['events'], key=key))
@@ -0,0 +1,60 @@
+import unittest
+
+from kickoff.cache import Cache
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def testComputesOnce(self):
+        cache = Cache()
+        self.assertEquals(cache.get('firefox', self.compute), 1)
+        self.assertEquals(cache.get('firefox', self.compute), 1)
+        self.assertEquals(cache.get('fennec', self.compute), 2)
+
+    def testInvalidate(self):
+        cache = Cache()
+        cache.get('firefox', self.compute)
+        cache.get('fennec', self.compute)
+        cache.invalidate('firefox')
+        self.assertFalse('firefox' in cache)
+        self.assertEquals(cache.get('firefox', self.compute), 3)
+        self.assertEquals(cache.get('fennec', self.compute), 2)
+
+    def testMaxAge(self):
+        cache = Cache()
+        cache.get('firefox', self.compute)
+        self.assertEquals(cache.get('firefox', self.compute, maxAge=60), 1)
+        self.assertEquals(cache.get('firefox', self.compute, maxAge=-1), 2)
+
+    def testInvalidatedWhileComputing(self):
+        cache = Cache()
+
+        def compute():
+            cache.invalidate('firefox')
+            return self.compute()
+        self.assertEquals(cache.get('firefox', compute), 1)
+        self.assertFalse('firefox' in cache)
+
+    def testMaxSizeEvictsLeastRecentlyUsed(self):
+        cache = Cache(maxSize=2)
+        cache.get('firefox', self.compute)
+        cache.get('fennec', self.compute)
+        cache.get('firefox', self.compute)
+        cache.get('thunderbird', self.compute)
+        self.assertEquals(len(cache), 2)
+        self.assertTrue('firefox' in cache)
+        self.assertFalse('fennec' in cache)
+
+    def testStats(self):
+        cache = Cache(maxSize=2)
+        cache.get('firefox', self.compute)
+        cache.get('firefox', self.compute)
+        cache.get('fennec', self.compute)
+        self.assertEquals(cache.stats(), {'size': 2, 'maxSize': 2,
+                                          'hits': 1, 'misses': 2})
@@ -1,7 +1,16 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
+import mock
+import re
+import unittest
 
-from kickoff import app
-from kickoff.model import FennecRelease
+from sqlalchemy import event
+
+from kickoff import app, db
+from kickoff.cache import platformCache, suggestionCache
+from kickoff.model import FennecRelease, FirefoxRelease, L10nBlob, \
+    ReleaseEvents, ReleaseIndex, ReleaseL10n, ReleaseProgress, \
+    ResourceVersion, getReleases, getReleasesByName, getReleaseTable, \
+    parseL10nChangesets, parseReleaseName
 from kickoff.test.base import TestBase
 
 
@@ -10,3 +19,449 @@ class TestRelease(TestBase):
         with app.test_request_context():
             got = [r.name for r in FennecRelease.getRecent(age=timedelta(days=1))]
             self.assertEquals(['Fennec-1-build1', 'Fennec-4-build4'], got)
+
+    def testGetMaxBuildNumbers(self):
+        with app.test_request_context():
+            got = FennecRelease.getMaxBuildNumbers(['1', '4', '5'])
+            self.assertEquals(got, {'1': 1, '4': 5})
+            for version in got:
+                self.assertEquals(FennecRelease.getMaxBuildNumber(version),
+                                  got[version])
+            self.assertEquals(FennecRelease.getMaxBuildNumbers([]), {})
+
+
+class TestCacheInvalidation(TestBase):
+    def testSuggestionsAreInvalidatedOnCommit(self):
+        with app.test_request_context():
+            suggestionCache.get('firefox', lambda: 'old')
+            release = FirefoxRelease.query.filter_by(name='Firefox-2-build1').one()
+            release.branch = 'b'
+            db.session.flush()
+            self.assertTrue('firefox' in suggestionCache)
+            db.session.rollback()
+            self.assertTrue('firefox' in suggestionCache)
+            release.branch = 'c'
+            db.session.commit()
+            self.assertFalse('firefox' in suggestionCache)
+
+    def testPlatformsAreInvalidatedOnCommit(self):
+        with app.test_request_context():
+            self.assertEquals(ReleaseEvents.getEnUSPlatforms('Firefox-2-build1'), [])
+            release = FirefoxRelease.query.filter_by(name='Firefox-2-build1').one()
+            release.enUSPlatforms = '["linux"]'
+            db.session.flush()
+            self.assertEquals(ReleaseEvents.getEnUSPlatforms('Firefox-2-build1'), [])
+            db.session.commit()
+            self.assertEquals(ReleaseEvents.getEnUSPlatforms('Firefox-2-build1'),
+                              ['linux'])
+
+
+class TestReleaseName(unittest.TestCase):
+    def testParse(self):
+        parsed = parseReleaseName('Firefox-3.0b2-build10')
+        self.assertEquals(parsed, ('firefox', '3.0b2', 10))
+        self.assertEquals(str(parsed), 'Firefox-3.0b2-build10')
+        self.assertEquals(parseReleaseName('Thunderbird-31.0esr-build1').version,
+                          '31.0esr')
+
+    def testParseInvalid(self):
+        for name in ('Firefox-3.0-build', 'Firefox-3-build1', 'firefox',
+                     'Firefox-3.0-build1 ', 'Firefox-3.0-build1\n', ''):
+            self.assertEquals(parseReleaseName(name), None, name)
+
+    def testGetReleaseTable(self):
+        self.assertEquals(getReleaseTable('Firefox-3.0-build1'), FirefoxRelease)
+        self.assertEquals(getReleaseTable('fennec'), FennecRelease)
+        # Names that don't parse still go by their product.
+        self.assertEquals(getReleaseTable('Fennec-1-build1'), FennecRelease)
+        self.assertRaises(ValueError, getReleaseTable, 'Seamonkey-2.0-build1')
+
+
+class TestReleaseIndex(TestBase):
+    def testGetNames(self):
+        with app.test_request_context():
+            self.assertEquals(ReleaseIndex.getNames(ready=True, complete=False),
+                              ['Fennec-1-build1'])
+            self.assertEquals(ReleaseIndex.getNames(complete=True),
+                              ['Firefox-2-build1', 'Thunderbird-2-build2'])
+
+    def testDashboardOrder(self):
+        with app.test_request_context():
+            got = [r.name for r in getReleases(dashboardOrder=True)]
+            self.assertEquals(got, ['Fennec-4-build4', 'Fennec-4-build5',
+                                    'Thunderbird-4.0-build1', 'Fennec-1-build1',
+                                    'Firefox-2-build1', 'Thunderbird-2-build2'])
+
+    def testGetReleasesDefersHeavyColumns(self):
+        with app.test_request_context():
+            releases = getReleases(ready=True, complete=False)
+            self.assertEquals([r.name for r in releases], ['Fennec-1-build1'])
+            self.assertFalse('l10nChangesets' in releases[0].__dict__)
+            self.assertFalse('comment' in releases[0].__dict__)
+            self.assertTrue('submitter' in releases[0].__dict__)
+            # They're still loaded when they're needed.
+            self.assertEquals(releases[0].l10nChangesets, 'af de')
+
+    def testGetReleasesByNameIncludes(self):
+        with app.test_request_context():
+            releases = getReleasesByName(['Thunderbird-2-build2', 'Fennec-1-build1',
+                                          'Firefox-9-build1'], include=('comment',))
+            self.assertEquals([r.name for r in releases],
+                              ['Thunderbird-2-build2', 'Fennec-1-build1'])
+            self.assertTrue('comment' in releases[0].__dict__)
+            self.assertFalse('l10nChangesets' in releases[0].__dict__)
+
+    def testFollowsUpdates(self):
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            r.ready = True
+            r.version = '4.0'
+            r.name = 'Fennec-4.0-build4'
+            db.session.commit()
+            row = ReleaseIndex.query.get('Fennec-4.0-build4')
+            self.assertEquals(row.ready, True)
+            self.assertEquals(row.product, 'fennec')
+            self.assertEquals(ReleaseIndex.query.get('Fennec-4-build4'), None)
+
+    def testFollowsDeletes(self):
+        with app.test_request_context():
+            db.session.delete(FennecRelease.query.filter_by(name='Fennec-4-build4').first())
+            db.session.commit()
+            self.assertEquals(ReleaseIndex.query.get('Fennec-4-build4'), None)
+            self.assertEquals(ReleaseIndex.query.count(), 5)
+
+
+class TestReleaseL10n(TestBase):
+    def testParsePlain(self):
+        got = list(parseL10nChangesets('af abc\n\nde  def \nbad\n'))
+        self.assertEquals(got, [('af', 'abc', None), ('de', 'def', None)])
+
+    def testParseJSON(self):
+        got = sorted(parseL10nChangesets(
+            '{"af": {"revision": "abc", "platforms": ["android"]}, "de": "def"}'))
+        self.assertEquals(got, [('af', 'abc', ['android']), ('de', 'def', None)])
+
+    def testStoredOnInsert(self):
+        with app.test_request_context():
+            rows = ReleaseL10n.getLocales('Fennec-4-build5')
+            self.assertEquals([(r.locale, r.revision) for r in rows], [('lk', 'mn')])
+
+    def testFollowsEdits(self):
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            r.l10nChangesets = 'af abc\nde def'
+            db.session.commit()
+            rows = ReleaseL10n.getLocales('Fennec-4-build4', ['de'])
+            self.assertEquals([(r.locale, r.revision) for r in rows], [('de', 'def')])
+            self.assertEquals(len(ReleaseL10n.getLocales('Fennec-4-build4')), 2)
+
+    def testFollowsRenames(self):
+        with app.test_request_context():
+            r = FirefoxRelease.query.filter_by(name='Firefox-2-build1').first()
+            r.version = '2.0'
+            r.name = 'Firefox-2.0-build1'
+            db.session.commit()
+            self.assertEquals(ReleaseL10n.getLocales('Firefox-2-build1'), [])
+            rows = ReleaseL10n.getLocales('Firefox-2.0-build1')
+            self.assertEquals([(r.locale, r.revision) for r in rows], [('ja', 'zu')])
+
+    def testFollowsDeletes(self):
+        with app.test_request_context():
+            db.session.delete(FirefoxRelease.query.filter_by(name='Firefox-2-build1').first())
+            db.session.commit()
+            self.assertEquals(ReleaseL10n.getLocales('Firefox-2-build1'), [])
+
+
+class TestL10nBlob(TestBase):
+    def testSharedBetweenReleases(self):
+        with app.test_request_context():
+            old = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            r = FennecRelease(submitter='joe', version='4', buildNumber=6,
+                              branch='a', mozillaRevision='abc',
+                              l10nChangesets='gh ij', dashboardCheck=True,
+                              mozillaRelbranch=None)
+            db.session.add(r)
+            db.session.commit()
+            self.assertEquals(r.l10nHash, old.l10nHash)
+            self.assertEquals(L10nBlob.query.filter_by(hash=r.l10nHash).count(), 1)
+            self.assertEquals(L10nBlob.query.count(), 6)
+
+    def testStoreSkipsStoredChangesets(self):
+        with app.test_request_context():
+            connection = db.session.connection()
+            hash_ = L10nBlob.store(connection, u'kl mn')
+            self.assertEquals(L10nBlob.store(connection, u'kl mn'), hash_)
+            db.session.commit()
+            self.assertEquals(L10nBlob.query.filter_by(hash=hash_).count(), 1)
+            self.assertEquals(L10nBlob.load(hash_), u'kl mn')
+
+    def testLargeChangesetsAreCompressed(self):
+        changesets = u''.join(u'locale%d abcdef\n' % n
+                              for n in range(200))
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            r.l10nChangesets = changesets
+            db.session.commit()
+            blob = L10nBlob.query.get(r.l10nHash)
+            self.assertTrue(blob.compressed)
+            self.assertTrue(len(blob.data) < len(changesets))
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            self.assertEquals(r.l10nChangesets, changesets)
+
+    def testSmallChangesetsAreNot(self):
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            blob = L10nBlob.query.get(r.l10nHash)
+            self.assertFalse(blob.compressed)
+            self.assertEquals(blob.data, 'gh ij')
+
+
+class TestResourceVersion(TestBase):
+    def testBumpCreatesMissingStamps(self):
+        with app.test_request_context():
+            connection = db.session.connection()
+            ResourceVersion.bump(connection, 'a')
+            ResourceVersion.bump(connection, 'a', 'b', 'b')
+            db.session.commit()
+            versions = dict((r.resource, r.version) for r in
+                            ResourceVersion.getMany(['a', 'b']))
+            self.assertEquals(versions, {'a': 2, 'b': 1})
+
+
+class TestReleaseEvents(TestBase):
+    def makeEvent(self, results=0):
+        return ReleaseEvents('Fennec-1-build1', datetime(2005, 1, 1, 1, 1, 1),
+                             'Fennec-1-build1_tag', None, results, 1, 1, 'tag')
+
+    def testInsertIgnore(self):
+        with app.test_request_context():
+            self.assertTrue(ReleaseEvents.insertIgnore(self.makeEvent()))
+            self.assertFalse(ReleaseEvents.insertIgnore(self.makeEvent(results=2)))
+            db.session.commit()
+            events = ReleaseEvents.query.filter_by(name='Fennec-1-build1').all()
+            self.assertEquals([e.results for e in events], [0])
+            stamp = ResourceVersion.query.get(ResourceVersion.statusKey('Fennec-1-build1'))
+            self.assertEquals(stamp.version, 1)
+
+    def testInsertMany(self):
+        with app.test_request_context():
+            ReleaseEvents.insertIgnore(self.makeEvent())
+            events = [self.makeEvent()]
+            for n in range(1, 4):
+                event = self.makeEvent()
+                event.event_name = 'Fennec-1-build1_build%d' % n
+                events.append(event)
+            events.append(events[1])
+            self.assertEquals(ReleaseEvents.insertMany(events), events[1:4])
+            db.session.commit()
+            self.assertEquals(ReleaseEvents.query.filter_by(name='Fennec-1-build1').count(), 4)
+            stamp = ResourceVersion.query.get(ResourceVersion.statusKey('Fennec-1-build1'))
+            self.assertEquals(stamp.version, 2)
+
+    def testInsertManyRecordedMeanwhile(self):
+        with app.test_request_context():
+            ReleaseEvents.insertIgnore(self.makeEvent())
+            other = self.makeEvent()
+            other.event_name = 'Fennec-1-build1_build1'
+            # As if another process recorded the tag after we looked.
+            with mock.patch.object(ReleaseEvents, 'getExisting',
+                                   return_value=set()):
+                self.assertEquals(ReleaseEvents.insertMany([self.makeEvent(), other]),
+                                  [other])
+            db.session.commit()
+            self.assertEquals(ReleaseEvents.query.filter_by(name='Fennec-1-build1').count(), 2)
+
+    def testGetEnUSPlatformsIsCached(self):
+        with app.test_request_context():
+            release = FirefoxRelease.query.filter_by(name='Firefox-2-build1').one()
+            release.enUSPlatforms = '["linux"]'
+            db.session.commit()
+            self.assertEquals(ReleaseEvents.getEnUSPlatforms('Firefox-2-build1'),
+                              ['linux'])
+            # Changes that bypass the mapper aren't noticed...
+            db.session.execute(FirefoxRelease.__table__.update()
+                               .values(enUSPlatforms='["win32"]'))
+            self.assertEquals(ReleaseEvents.getEnUSPlatforms('Firefox-2-build1'),
+                              ['linux'])
+            # ...but ones that go through it are.
+            release.enUSPlatforms = '["macosx64"]'
+            db.session.commit()
+            self.assertEquals(ReleaseEvents.getEnUSPlatforms('Firefox-2-build1'),
+                              ['macosx64'])
+
+    def testStatusChangesKeepPlatformsCached(self):
+        with app.test_request_context():
+            release = FirefoxRelease.query.filter_by(name='Firefox-2-build1').one()
+            release.enUSPlatforms = '["linux"]'
+            db.session.commit()
+            ReleaseEvents.getEnUSPlatforms('Firefox-2-build1')
+            release.status = 'Started'
+            db.session.commit()
+            self.assertTrue('Firefox-2-build1' in platformCache)
+
+
+class TestReleaseProgress(TestBase):
+    name = 'Firefox-2-build1'
+
+    def addEvents(self):
+        sent = datetime(2005, 1, 1, 1, 1, 1)
+        events = [
+            ('tag', None, 'tag', 1, 1),
+            ('linux_build', 'linux', 'build', 1, 1),
+            ('win32_build', 'win32', 'build', 1, 1),
+            ('linux_repack_1/3', 'linux', 'repack', 1, 3),
+            ('linux_repack_2/3', 'linux', 'repack', 2, 3),
+            ('win32_repack_1/4', 'win32', 'repack', 1, 4),
+            ('win32_repack_complete', 'win32', 'repack', 0, 0),
+            ('win32_repack_2/4', 'win32', 'repack', 2, 4),
+            # More chunks than the total never count for more than 1.
+            ('linux_update_verify_1/2', 'linux', 'update_verify', 1, 2),
+            ('linux_update_verify_2/2', 'linux', 'update_verify', 2, 2),
+            ('linux_update_verify_3/2', 'linux', 'update_verify', 3, 2),
+            ('win32_update_verify_1/10', 'win32', 'update_verify', 1, 10),
+            ('unknown', 'linux', None, 1, 1),
+        ]
+        for event_name, platform, group, chunkNum, chunkTotal in events:
+            db.session.add(ReleaseEvents(self.name, sent,
+                                         '%s_%s' % (self.name, event_name),
+                                         platform, 0, chunkNum, chunkTotal,
+                                         group))
+        db.session.commit()
+
+    def getProgress(self, rows):
+        return dict(((r.group, r.platform), (r.events, r.progress))
+                    for r in rows)
+
+    def testTotalsMatchAppliedEvents(self):
+        with app.test_request_context():
+            self.addEvents()
+            events = ReleaseEvents.query.filter_by(name=self.name)
+            applied = {}
+            for event in events:
+                key = ReleaseProgress.getKey(event)
+                if key not in applied:
+                    applied[key] = ReleaseProgress(self.name, *key)
+                applied[key].apply(event)
+            expected = self.getProgress(applied.values())
+            self.assertEquals(expected[('repack', 'linux')], (2, 2.00/3))
+            self.assertEquals(expected[('repack', 'win32')], (3, 1.00))
+            self.assertEquals(expected[('update_verify', 'linux')], (3, 1.00))
+            self.assertEquals(expected[('', '')], (1, 1.00))
+            self.assertEquals(self.getProgress(ReleaseProgress.fold(self.name, events)),
+                              expected)
+            self.assertEquals(self.getProgress(ReleaseProgress.aggregate(self.name, events)),
+                              expected)
+            ReleaseProgress.rebuild([self.name])
+            self.assertEquals(self.getProgress(ReleaseProgress.query.filter_by(name=self.name)),
+                              expected)
+
+
+    def testRecordedMatchesRebuilt(self):
+        with app.test_request_context():
+            self.addEvents()
+            sent = datetime(2005, 1, 1, 1, 1, 1)
+            for event_name, platform, group, chunkNum, chunkTotal in [
+                    ('macosx64_repack_1/4', 'macosx64', 'repack', 1, 4),
+                    ('macosx64_repack_Complete', 'macosx64', 'repack', 0, 0),
+                    ('win32_update_verify_2/0', 'win32', 'update_verify', 2, 0)]:
+                db.session.add(ReleaseEvents(self.name, sent,
+                                             '%s_%s' % (self.name, event_name),
+                                             platform, 0, chunkNum, chunkTotal,
+                                             group))
+            db.session.commit()
+            events = ReleaseEvents.query.filter_by(name=self.name) \
+                .order_by(ReleaseEvents.event_name).all()
+            # Some events arrive on their own, and the rest in a batch.
+            for event in events[:5]:
+                ReleaseProgress.record(event)
+            ReleaseProgress.recordMany(events[5:])
+            db.session.commit()
+            recorded = self.getProgress(ReleaseProgress.query.filter_by(name=self.name))
+            ReleaseProgress.rebuild([self.name])
+            self.assertEquals(recorded,
+                              self.getProgress(ReleaseProgress.query.filter_by(name=self.name)))
+            self.assertEquals(recorded[('repack', 'win32')], (3, 1.00))
+            self.assertEquals(recorded[('repack', 'macosx64')], (2, 1.00))
+            self.assertEquals(recorded[('update_verify', 'win32')], (2, 0.10))
+
+
+class TestQueryPlans(TestBase):
+    """Checks that every status step finds its rows through an index,
+       rather than scanning tables whose size grows with every release."""
+    releaseName = 'Firefox-2-build1'
+    tables = ('release_events', 'release_progress', 'firefox_release')
+    statements = None
+
+    @classmethod
+    def recordStatement(cls, conn, cursor, statement, parameters, context,
+                        executemany):
+        # Batched statements are only ever inserts.
+        if cls.statements is not None and not executemany:
+            cls.statements.append((statement, parameters))
+
+    def setUp(self):
+        TestBase.setUp(self)
+        with app.test_request_context():
+            # SQLAlchemy 0.7 can't remove engine listeners, so only add ours
+            # once per engine.
+            if not getattr(db.engine, '_recordingStatements', False):
+                event.listen(db.engine, 'before_cursor_execute',
+                             TestQueryPlans.recordStatement)
+                db.engine._recordingStatements = True
+            release = FirefoxRelease.query.filter_by(name=self.releaseName).one()
+            release.enUSPlatforms = '["linux"]'
+            sent = datetime(2005, 1, 1, 1, 1, 1)
+            for event_name, platform, group in (('tag', None, 'tag'),
+                                                ('linux_build', 'linux', 'build'),
+                                                ('linux_repack_1/1', 'linux', 'repack')):
+                db.session.add(ReleaseEvents(self.releaseName, sent,
+                                             '%s_%s' % (self.releaseName, event_name),
+                                             platform, 0, 1, 1, group))
+            db.session.commit()
+            ReleaseProgress.rebuild()
+
+    def tearDown(self):
+        TestQueryPlans.statements = None
+        TestBase.tearDown(self)
+
+    def assertIndexed(self, func):
+        TestQueryPlans.statements = []
+        func(self.releaseName)
+        statements, TestQueryPlans.statements = TestQueryPlans.statements, None
+        self.assertTrue(statements)
+        for statement, parameters in statements:
+            cursor = db.session.connection().connection.cursor()
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            for row in cursor.fetchall():
+                detail = row[-1]
+                for table in self.tables:
+                    if table not in detail:
+                        continue
+                    # The search has to narrow rows down by every column
+                    # the query compares, not just a prefix of them.
+                    self.assertTrue(detail.startswith('SEARCH'),
+                                    '%s: %s' % (detail, statement))
+                    for column in re.findall(r'%s\."?(\w+)"? = \?' % table,
+                                             statement):
+                        self.assertTrue('%s=?' % column in detail,
+                                        '%s: %s' % (detail, statement))
+
+    def testStatusSteps(self):
+        with app.test_request_context():
+            for func in (ReleaseEvents.tagStatus, ReleaseEvents.buildStatus,
+                         ReleaseEvents.repackStatus, ReleaseEvents.updateStatus,
+                         ReleaseEvents.releasetestStatus,
+                         ReleaseEvents.readyForReleaseStatus,
+                         ReleaseEvents.postreleaseStatus):
+                platformCache.clear()
+                self.assertIndexed(func)
+
+    def testGetStatus(self):
+        with app.test_request_context():
+            platformCache.clear()
+            self.assertIndexed(ReleaseEvents.getStatus)
+
+    def testRebuild(self):
+        with app.test_request_context():
+            self.assertIndexed(lambda name: ReleaseProgress.rebuild([name]))
@@ -0,0 +1,30 @@
+import threading
+import time
+import unittest
+
+from kickoff.pubsub import Broker
+
+
+class TestBroker(unittest.TestCase):
+    def testWaitTimesOut(self):
+        broker = Broker()
+        start = time.time()
+        self.assertEquals(broker.wait('Firefox-2-build1', 0, 0.05), 0)
+        self.assertTrue(time.time() - start >= 0.05)
+
+    def testWaitReturnsImmediatelyIfAlreadyChanged(self):
+        broker = Broker()
+        broker.publish('Firefox-2-build1')
+        self.assertEquals(broker.wait('Firefox-2-build1', 0, 10), 1)
+
+    def testPublishWakesWaiters(self):
+        broker = Broker()
+        got = []
+        waiter = threading.Thread(
+            target=lambda: got.append(broker.wait('Firefox-2-build1', 0, 10)))
+        waiter.start()
+        # Changes to other releases don't count.
+        broker.publish('Fennec-1-build1')
+        broker.publish('Firefox-2-build1')
+        waiter.join(5)
+        self.assertEquals(got, [1])
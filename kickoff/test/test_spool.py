@@ -0,0 +1,107 @@
+from datetime import datetime
+import os
+from tempfile import mkstemp
+import time
+
+import simplejson as json
+
+from kickoff import app, db
+from kickoff.model import FirefoxRelease, ReleaseEvents, ReleaseProgress
+from kickoff.spool import EventSpool, Flusher
+from kickoff.test.base import TestBase
+
+
+class TestEventSpool(TestBase):
+    releaseName = 'Firefox-3.0-build1'
+
+    def setUp(self):
+        TestBase.setUp(self)
+        self.spool_fd, self.spool_file = mkstemp()
+        self.spool = EventSpool(self.spool_file)
+        with app.test_request_context():
+            r = FirefoxRelease(partials='2.0build1', promptWaitTime=None,
+                               submitter='joe', version='3.0', buildNumber=1,
+                               branch='a', mozillaRevision='abc',
+                               l10nChangesets='af def', dashboardCheck=True,
+                               mozillaRelbranch=None,
+                               enUSPlatforms=json.dumps(['linux']))
+            db.session.add(r)
+            db.session.add(self.makeEvent('tag', None, 'tag'))
+            db.session.commit()
+            ReleaseProgress.rebuild()
+
+    def tearDown(self):
+        self.spool.close()
+        os.close(self.spool_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.spool_file + suffix):
+                os.remove(self.spool_file + suffix)
+        TestBase.tearDown(self)
+
+    def makeEvent(self, event_name, platform, group, chunkNum=1, chunkTotal=1):
+        return ReleaseEvents(self.releaseName, datetime(2005, 1, 1, 1, 1, 1),
+                             '%s_%s' % (self.releaseName, event_name),
+                             platform, 0, chunkNum, chunkTotal, group)
+
+    def testAppendIgnoresDuplicates(self):
+        self.assertTrue(self.spool.append(self.makeEvent('build', 'linux', 'build')))
+        self.assertFalse(self.spool.append(self.makeEvent('build', 'linux', 'build')))
+        self.assertEquals(len(self.spool), 1)
+
+    def testGetPending(self):
+        with app.test_request_context():
+            self.spool.append(self.makeEvent('repack_1/2', 'linux', 'repack', 1, 2))
+            # Already recorded, e.g. by a flush that is still finishing up.
+            self.spool.append(self.makeEvent('tag', None, 'tag'))
+            pending = self.spool.getPending(self.releaseName)
+            self.assertEquals([e.event_name for e in pending],
+                              ['Firefox-3.0-build1_repack_1/2'])
+            self.assertEquals(pending[0].sent, '2005-01-01T01:01:01+00:00')
+            self.assertEquals(pending[0].chunkTotal, 2)
+            self.assertEquals(self.spool.getPending('Fennec-1-build1'), [])
+
+    def testFlush(self):
+        with app.test_request_context():
+            self.spool.append(self.makeEvent('repack_1/2', 'linux', 'repack', 1, 2))
+            self.spool.append(self.makeEvent('repack_2/2', 'linux', 'repack', 2, 2))
+            self.spool.append(self.makeEvent('tag', None, 'tag'))
+            self.assertEquals(self.spool.flushAll(batchSize=2), 3)
+            self.assertEquals(len(self.spool), 0)
+            self.assertEquals(
+                ReleaseEvents.query.filter_by(name=self.releaseName).count(), 3)
+            row = ReleaseProgress.query.get((self.releaseName, 'repack', 'linux'))
+            self.assertEquals(row.events, 2)
+            self.assertAlmostEquals(row.progress, 1.0)
+
+    def testFlushMovesFailedEventsAside(self):
+        with app.test_request_context():
+            self.spool.append(self.makeEvent('repack_1/2', 'linux', 'repack', 1, 2))
+            self.spool._execute('INSERT INTO events (name, event_name, data) '
+                                'VALUES (?, ?, ?)', self.releaseName,
+                                'Firefox-3.0-build1_bad', '{"name": ')
+            self.spool.append(self.makeEvent('repack_2/2', 'linux', 'repack', 2, 2))
+            self.assertEquals(self.spool.flush(), 3)
+            self.assertEquals(len(self.spool), 0)
+            failed = self.spool.getFailed()
+            self.assertEquals([data for data, _ in failed], ['{"name": '])
+            row = ReleaseProgress.query.get((self.releaseName, 'repack', 'linux'))
+            self.assertEquals(row.events, 2)
+            self.assertAlmostEquals(row.progress, 1.0)
+            # Nothing is left to hold up later flushes.
+            self.spool.append(self.makeEvent('update', None, 'update'))
+            self.assertEquals(self.spool.flush(), 1)
+
+    def testFlusher(self):
+        self.spool.append(self.makeEvent('build', 'linux', 'build'))
+        flusher = Flusher(app, self.spool, 0.01)
+        flusher.start()
+        try:
+            deadline = time.time() + 5
+            while len(self.spool) and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            flusher.stop()
+        self.assertEquals(len(self.spool), 0)
+        with app.test_request_context():
+            status = ReleaseEvents.getStatus(self.releaseName)
+            self.assertEquals(status['build']['platforms'], {'linux': 1.00})
@@ -0,0 +1,85 @@
+import mock
+import re
+
+from kickoff import app
+from kickoff.metrics import metrics
+from kickoff.model import ReleaseEvents
+from kickoff.test.views.base import ViewTest
+
+
+class TestMetrics(ViewTest):
+    def setUp(self):
+        ViewTest.setUp(self)
+        app.config['METRICS'] = True
+        metrics.reset()
+
+    def tearDown(self):
+        for option in ('METRICS', 'METRICS_TOKEN', 'SERVER_TIMING'):
+            app.config.pop(option, None)
+        metrics.reset()
+        ViewTest.tearDown(self)
+
+    def getMetrics(self, **kwargs):
+        ret = self.get('/__metrics', **kwargs)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        samples = {}
+        for line in ret.data.splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def testRecordsRequests(self):
+        self.assertEquals(self.get('/releases.html').status_code, 200)
+        self.get('/releases/Fennec-1-build1')
+        self.get('/releases/Fennec-1-build1')
+        samples = self.getMetrics()
+        self.assertEquals(samples['kickoff_request_duration_seconds_count{endpoint="release_api"}'], 2)
+        self.assertEquals(samples['kickoff_request_duration_seconds_bucket{endpoint="release_api",le="+Inf"}'], 2)
+        self.assertTrue(samples['kickoff_sql_statements_sum{endpoint="release_api"}'] >= 2)
+        self.assertTrue(samples['kickoff_sql_duration_seconds_total{endpoint="release_api"}'] > 0)
+        self.assertTrue(samples['kickoff_template_render_seconds_total{endpoint="releases"}'] > 0)
+        self.assertEquals(samples['kickoff_template_render_seconds_total{endpoint="release_api"}'], 0)
+        self.assertTrue(samples['kickoff_response_size_bytes_sum{endpoint="releases"}'] > 0)
+        self.assertTrue('kickoff_cache_entries{cache="platforms"}' in samples)
+
+    def testRecordsErrors(self):
+        # As in production, where the failure becomes a 500 and the request
+        # is torn down right away.
+        with mock.patch.dict(app.config, PROPAGATE_EXCEPTIONS=False,
+                             PRESERVE_CONTEXT_ON_EXCEPTION=False):
+            with mock.patch.object(ReleaseEvents, 'getStatuses',
+                                   side_effect=Exception('boom')):
+                self.assertEquals(self.get('/releases/status').status_code, 500)
+        self.get('/releases/status')
+        samples = self.getMetrics()
+        self.assertEquals(samples['kickoff_request_duration_seconds_count{endpoint="statuses_api"}'], 2)
+        self.assertEquals(samples['kickoff_request_errors_total{endpoint="statuses_api"}'], 1)
+
+    def testServerTiming(self):
+        ret = self.get('/releases/Fennec-1-build1')
+        self.assertFalse('Server-Timing' in ret.headers)
+        app.config['SERVER_TIMING'] = True
+        ret = self.get('/releases/Fennec-1-build1')
+        self.assertTrue(re.match(r'db;dur=[\d.]+;desc="\d+ statements", '
+                                 r'tpl;dur=[\d.]+, total;dur=[\d.]+$',
+                                 ret.headers['Server-Timing']),
+                        ret.headers['Server-Timing'])
+
+    def testDisabled(self):
+        app.config['METRICS'] = False
+        app.config['SERVER_TIMING'] = True
+        ret = self.get('/releases/Fennec-1-build1')
+        self.assertFalse('Server-Timing' in ret.headers)
+        self.assertEquals(self.get('/__metrics').status_code, 404)
+
+    def testToken(self):
+        app.config['METRICS_TOKEN'] = 'sekrit'
+        self.assertEquals(self.get('/__metrics').status_code, 403)
+        self.assertEquals(self.get('/__metrics', query_string={'token': 'nope'}).status_code,
+                          403)
+        self.getMetrics(query_string={'token': 'sekrit'})
+
+    def testRequiresLogin(self):
+        ret = self.client.get('/__metrics')
+        self.assertEquals(ret.status_code, 401)
@@ -0,0 +1,93 @@
+import mock
+import os
+import shutil
+from tempfile import mkdtemp
+import threading
+import time
+import unittest
+
+from kickoff import app
+from kickoff.model import ReleaseEvents
+from kickoff.profiler import RequestProfile, Sampler, getSampler
+from kickoff.test.views.base import ViewTest
+
+
+class TestSampler(unittest.TestCase):
+    def testSamplesRequestThreads(self):
+        sampler = Sampler(0.001)
+        sampler.start()
+        profile = RequestProfile()
+        idle = RequestProfile()
+        done = threading.Event()
+
+        def busyLoop():
+            sampler.add(profile)
+            deadline = time.time() + 0.1
+            while time.time() < deadline:
+                pass
+            sampler.remove()
+            done.set()
+
+        thread = threading.Thread(target=busyLoop)
+        thread.start()
+        done.wait()
+        thread.join()
+        self.assertTrue(profile.samples)
+        self.assertTrue(all(s.endswith(':busyLoop') for s in profile.samples))
+        # Nothing is sampled once the thread's profile is removed.
+        count = sum(profile.samples.values())
+        time.sleep(0.01)
+        self.assertEquals(sum(profile.samples.values()), count)
+        self.assertFalse(idle.samples)
+
+
+class TestProfiler(ViewTest):
+    def setUp(self):
+        ViewTest.setUp(self)
+        self.directory = mkdtemp()
+        app.config['PROFILE_DIR'] = self.directory
+        app.config['PROFILE_SLOW_REQUESTS'] = 0
+
+    def tearDown(self):
+        for option in ('PROFILE_DIR', 'PROFILE_SLOW_REQUESTS', 'PROFILE_KEEP'):
+            app.config.pop(option, None)
+        shutil.rmtree(self.directory)
+        ViewTest.tearDown(self)
+
+    def testWritesSlowRequests(self):
+        self.assertEquals(self.get('/releases/Fennec-1-build1').status_code, 200)
+        profiles = os.listdir(self.directory)
+        self.assertEquals(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith('-release_api.profile'))
+        with open(os.path.join(self.directory, profiles[0])) as f:
+            text = f.read()
+        self.assertTrue('# GET http://localhost/releases/Fennec-1-build1\n' in text)
+        self.assertTrue('# status: 200\n' in text)
+        self.assertTrue(' s  SELECT ' in text, text)
+        self.assertTrue("Fennec-1-build1" in text.split('## Stacks')[0])
+
+    def testFailedRequests(self):
+        with mock.patch.dict(app.config, PROPAGATE_EXCEPTIONS=False,
+                             PRESERVE_CONTEXT_ON_EXCEPTION=False):
+            with mock.patch.object(ReleaseEvents, 'getStatuses',
+                                   side_effect=Exception('boom')):
+                self.assertEquals(self.get('/releases/status').status_code, 500)
+        self.assertEquals(getSampler(app)._profiles, {})
+        profiles = os.listdir(self.directory)
+        self.assertEquals(len(profiles), 1)
+        with open(os.path.join(self.directory, profiles[0])) as f:
+            self.assertTrue('# status: 500\n' in f.read())
+
+    def testSkipsFastRequests(self):
+        app.config['PROFILE_SLOW_REQUESTS'] = 60
+        self.get('/releases/Fennec-1-build1')
+        self.assertEquals(os.listdir(self.directory), [])
+
+    def testKeepsNewest(self):
+        app.config['PROFILE_KEEP'] = 2
+        for name in ('Fennec-1-build1', 'Fennec-4-build4', 'Firefox-2-build1'):
+            self.get('/releases/%s' % name)
+        profiles = sorted(os.listdir(self.directory))
+        self.assertEquals(len(profiles), 2)
+        with open(os.path.join(self.directory, profiles[-1])) as f:
+            self.assertTrue('Firefox-2-build1' in f.readline())
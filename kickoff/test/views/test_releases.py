@@ -1,4 +1,6 @@
+from cStringIO import StringIO
 import datetime
+from gzip import GzipFile
 import mock
 import random
 import string
@@ -7,8 +9,8 @@ import pytz
 
 import simplejson as json
 
-from kickoff import app
-from kickoff.model import FennecRelease, ThunderbirdRelease
+from kickoff import app, db
+from kickoff.model import FennecRelease, ThunderbirdRelease, ResourceVersion
 from kickoff.test.views.base import ViewTest
 
 
@@ -32,6 +34,25 @@ class TestRequestsAPI(ViewTest):
         self.assertEquals(json.loads(ret.data), expected)
 
 
+    def testGetReleasesNotModified(self):
+        ret = self.get('/releases')
+        self.assertEquals(ret.status_code, 200)
+        etag = ret.headers['ETag']
+        ret = self.get('/releases', headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 304)
+        self.assertEquals(ret.data, '')
+
+    def testGetReleasesModified(self):
+        etag = self.get('/releases').headers['ETag']
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            r.ready = True
+            db.session.commit()
+        ret = self.get('/releases', headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 200)
+        self.assertNotEquals(ret.headers['ETag'], etag)
+
+
 class TestReleaseAPI(ViewTest):
     def testGetRelease(self):
         ret = self.get('/releases/Thunderbird-2-build2')
@@ -81,6 +102,30 @@ class TestReleaseAPI(ViewTest):
         self.assertEquals(ret.status_code, 200)
         self.assertEquals(json.loads(ret.data), expected)
 
+    def testGetReleaseNotModified(self):
+        ret = self.get('/releases/Firefox-2-build1')
+        self.assertEquals(ret.status_code, 200)
+        self.assertTrue(ret.headers['Last-Modified'])
+        etag = ret.headers['ETag']
+        ret = self.get('/releases/Firefox-2-build1', headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 304)
+        # Other releases have their own version.
+        ret = self.get('/releases/Fennec-1-build1', headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 200)
+
+    def testGetReleaseModified(self):
+        etag = self.get('/releases/Fennec-1-build1').headers['ETag']
+        ret = self.post('/releases/Fennec-1-build1', data={'status': 'omg!'})
+        self.assertEquals(ret.status_code, 200)
+        ret = self.get('/releases/Fennec-1-build1', headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(json.loads(ret.data)['status'], 'omg!')
+
+    def testGetL10nNotModified(self):
+        etag = self.get('/releases/Firefox-2-build1/l10n').headers['ETag']
+        ret = self.get('/releases/Firefox-2-build1/l10n', headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 304)
+
     def testMarkAsComplete(self):
         ret = self.post('/releases/Fennec-1-build1', data={'complete': True})
         self.assertEquals(ret.status_code, 200, ret.data)
@@ -109,6 +154,95 @@ class TestReleaseAPI(ViewTest):
         self.assertEquals(ret.content_type, 'text/plain')
         self.assertEquals(ret.data, 'ja zu')
 
+    def testGetL10nGzip(self):
+        ret = self.get('/releases/Firefox-2-build1/l10n',
+                       headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(ret.headers['Content-Encoding'], 'gzip')
+        self.assertEquals(ret.headers['Vary'], 'Accept-Encoding')
+        self.assertEquals(GzipFile(fileobj=StringIO(ret.data)).read(), 'ja zu')
+        plain = self.get('/releases/Firefox-2-build1/l10n')
+        self.assertFalse('Content-Encoding' in plain.headers)
+        self.assertNotEquals(plain.headers['ETag'], ret.headers['ETag'])
+
+    def testGetL10nRange(self):
+        ret = self.get('/releases/Firefox-2-build1/l10n',
+                       headers={'Range': 'bytes=1-3'})
+        self.assertEquals(ret.status_code, 206)
+        self.assertEquals(ret.data, 'a z')
+        self.assertEquals(ret.headers['Content-Range'], 'bytes 1-3/5')
+        self.assertEquals(ret.headers['Content-Length'], '3')
+        ret = self.get('/releases/Firefox-2-build1/l10n',
+                       headers={'Range': 'bytes=-2'})
+        self.assertEquals(ret.status_code, 206)
+        self.assertEquals(ret.data, 'zu')
+
+    def testGetL10nUnsatisfiableRange(self):
+        ret = self.get('/releases/Firefox-2-build1/l10n',
+                       headers={'Range': 'bytes=10-20'})
+        self.assertEquals(ret.status_code, 416)
+        self.assertEquals(ret.headers['Content-Range'], 'bytes */5')
+
+    def testGetL10nStaleIfRange(self):
+        ret = self.get('/releases/Firefox-2-build1/l10n',
+                       headers={'Range': 'bytes=1-3', 'If-Range': '"abc"'})
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(ret.data, 'ja zu')
+        etag = ret.headers['ETag']
+        ret = self.get('/releases/Firefox-2-build1/l10n',
+                       headers={'Range': 'bytes=1-3', 'If-Range': etag})
+        self.assertEquals(ret.status_code, 206)
+
+    def testGetL10nChangedAfterEdit(self):
+        etag = self.get('/releases/Fennec-4-build4/l10n').headers['ETag']
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-4-build4').first()
+            r.l10nChangesets = 'af abc'
+            db.session.commit()
+        ret = self.get('/releases/Fennec-4-build4/l10n', headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(ret.data, 'af abc')
+
+    def testGetL10nLocales(self):
+        with app.test_request_context():
+            r = ThunderbirdRelease.query.filter_by(name='Thunderbird-2-build2').first()
+            r.l10nChangesets = 'af abc\nde def\nja ghi\n'
+            db.session.commit()
+        ret = self.get('/releases/Thunderbird-2-build2/l10n',
+                       query_string=[('locale', 'ja'), ('locale', 'af'), ('locale', 'zz')])
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(ret.content_type, 'text/plain')
+        self.assertEquals(ret.data, 'af abc\nja ghi\n')
+
+    def testGetL10nLocalesFennec(self):
+        with app.test_request_context():
+            r = FennecRelease.query.filter_by(name='Fennec-1-build1').first()
+            r.l10nChangesets = json.dumps({
+                'af': {'revision': 'abc', 'platforms': ['android']},
+                'de': 'def',
+            })
+            db.session.commit()
+        ret = self.get('/releases/Fennec-1-build1/l10n',
+                       query_string={'locale': ['af', 'de']})
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(json.loads(ret.data), {
+            'af': {'revision': 'abc', 'platforms': ['android']},
+            'de': 'def',
+        })
+
+    def testGetL10nJSON(self):
+        ret = self.get('/releases/Firefox-2-build1/l10n', query_string={'format': 'json'})
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(ret.mimetype, 'application/json')
+        self.assertEquals(json.loads(ret.data),
+                          {'changesets': {'ja': {'revision': 'zu'}}})
+
+    def testGetL10nNonExistentRelease(self):
+        ret = self.get('/releases/Firefox-9.0-build1/l10n', query_string={'format': 'json'})
+        self.assertEquals(ret.status_code, 404)
+        ret = self.get('/releases/Firefox-9.0-build1/l10n')
+        self.assertEquals(ret.status_code, 404)
+
     def testResetReady(self):
         data = {'status': 'error!', 'ready': False}
         ret = self.post('/releases/Fennec-1-build1', data=data)
@@ -124,7 +258,101 @@ class TestReleaseAPI(ViewTest):
         self.assertEquals(ret.status_code, 400)
 
 
+class TestReleasesTableAPI(ViewTest):
+    def getTable(self, **args):
+        ret = self.get('/releases/table', query_string=args)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        return json.loads(ret.data)
+
+    def testFirstPage(self):
+        got = self.getTable(complete=1, sEcho=3)
+        self.assertEquals(got['sEcho'], 3)
+        self.assertEquals(got['iTotalRecords'], 2)
+        self.assertEquals(got['iTotalDisplayRecords'], 2)
+        # Newest first by default.
+        self.assertEquals([row[0] for row in got['aaData']],
+                          ['Firefox-2-build1', 'Thunderbird-2-build2'])
+        firefox = got['aaData'][0]
+        self.assertEquals(firefox[6], '<span class="irrelevant">N/A</span>')
+        self.assertEquals(firefox[8], 'Yes')
+        self.assertEquals(firefox[9],
+                          '<a href="/releases/Firefox-2-build1/l10n">Link</a>')
+        self.assertEquals(firefox[10], '0 1')
+
+    def testReviewedHasStatus(self):
+        got = self.getTable(complete=0)
+        self.assertEquals(len(got['aaData']), 1)
+        self.assertEquals(got['aaData'][0][:2], ['', 'Fennec-1-build1'])
+
+    def testPaging(self):
+        got = self.getTable(complete=1, iDisplayStart=1, iDisplayLength=1)
+        self.assertEquals(got['iTotalDisplayRecords'], 2)
+        self.assertEquals([row[0] for row in got['aaData']],
+                          ['Thunderbird-2-build2'])
+
+    def testSorting(self):
+        got = self.getTable(complete=1, iSortingCols=1, iSortCol_0=1,
+                            sSortDir_0='asc')
+        self.assertEquals([row[1] for row in got['aaData']], ['bob', 'joe'])
+        got = self.getTable(complete=1, iSortingCols=1, iSortCol_0=0,
+                            sSortDir_0='desc')
+        self.assertEquals([row[0] for row in got['aaData']],
+                          ['Thunderbird-2-build2', 'Firefox-2-build1'])
+
+    def testSortingByUnsortableColumn(self):
+        got = self.getTable(complete=1, iSortingCols=1, iSortCol_0=4,
+                            sSortDir_0='asc')
+        self.assertEquals([row[0] for row in got['aaData']],
+                          ['Firefox-2-build1', 'Thunderbird-2-build2'])
+
+    def testSearch(self):
+        got = self.getTable(complete=1, sSearch='thunder')
+        self.assertEquals(got['iTotalRecords'], 2)
+        self.assertEquals(got['iTotalDisplayRecords'], 1)
+        self.assertEquals([row[0] for row in got['aaData']],
+                          ['Thunderbird-2-build2'])
+
+    def testSearchIsLiteral(self):
+        got = self.getTable(complete=1, sSearch='%')
+        self.assertEquals(got['iTotalDisplayRecords'], 0)
+        self.assertEquals(got['aaData'], [])
+
+    def testEscapesValues(self):
+        with app.test_request_context():
+            r = ThunderbirdRelease.query.filter_by(name='Thunderbird-2-build2').first()
+            r.comment = '<b>hi</b>'
+            db.session.commit()
+        got = self.getTable(complete=1, sSearch='thunder')
+        self.assertEquals(got['aaData'][0][12], '&lt;b&gt;hi&lt;/b&gt;')
+
+    def testWithoutPartials(self):
+        with app.test_request_context():
+            r = ThunderbirdRelease.query.filter_by(name='Thunderbird-2-build2').first()
+            r.partials = None
+            db.session.commit()
+        got = self.getTable(complete=1, sSearch='thunder')
+        self.assertEquals(got['aaData'][0][10], '')
+
+    def testUnparseableArguments(self):
+        got = self.getTable(complete=1, iDisplayStart='a', iDisplayLength=-1)
+        self.assertEquals(len(got['aaData']), 2)
+
+
 class TestReleasesView(ViewTest):
+    def testFirstPageOnly(self):
+        app.config['RELEASES_PAGE_SIZE'] = 1
+        try:
+            ret = self.get('/releases.html')
+        finally:
+            del app.config['RELEASES_PAGE_SIZE']
+        self.assertEquals(ret.status_code, 200)
+        self.assertTrue('Firefox-2-build1' in ret.data)
+        self.assertFalse('Thunderbird-2-build2' in ret.data)
+        self.assertTrue('data-total="2"' in ret.data)
+        # Releases that aren't ready are all shown, for marking as ready.
+        for name in ('Fennec-4-build4', 'Fennec-4-build5', 'Thunderbird-4.0-build1'):
+            self.assertTrue(name in ret.data)
+
     def testMakeReady(self):
         data = 'readyReleases=Fennec-4-build4&readyReleases=Fennec-4-build5'
         ret = self.post('/releases.html', data=data, content_type='application/x-www-form-urlencoded')
@@ -180,6 +408,26 @@ class TestReleaseView(ViewTest):
             count = FennecRelease.query.filter_by(name='Fennec-4-build4').count()
             self.assertEquals(count, 0)
 
+    def testEditReleaseChangesOldVersion(self):
+        etag = self.get('/releases/Fennec-4-build4').headers['ETag']
+        data = '&'.join([
+            'fennec-version=1.0',
+            'fennec-buildNumber=4',
+            'fennec-branch=a',
+            'fennec-mozillaRevision=abc',
+            'fennec-dashboardCheck=y',
+            'fennec-l10nChangesets={"af":"de"}',
+            'fennec-product=fennec',
+            'fennec-mozillaRelbranch=',
+        ])
+        ret = self.post('/release.html', query_string={'name': 'Fennec-4-build4'}, data=data, content_type='application/x-www-form-urlencoded')
+        self.assertEquals(ret.status_code, 302, ret.data)
+        with app.test_request_context():
+            version = ResourceVersion.query.get(ResourceVersion.releaseKey('Fennec-4-build4'))
+            self.assertEquals(version.version, 2)
+            version = ResourceVersion.query.get(ResourceVersion.releaseKey('Fennec-1.0-build4'))
+            self.assertEquals(version.version, 1)
+
     def testEditReleaseAddRelbranch(self):
         data = '&'.join([
             'thunderbird-version=4.0',
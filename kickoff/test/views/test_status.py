@@ -0,0 +1,586 @@
+import datetime
+import mock
+import os
+from tempfile import mkstemp
+
+import simplejson as json
+
+from kickoff import app, db
+from kickoff.model import FirefoxRelease, ReleaseEvents, ReleaseProgress, \
+    ReleaseSnapshot
+from kickoff.spool import closeSpools, getSpool
+from kickoff.test.views.base import ViewTest
+from kickoff.views.status import freezeStatus
+
+
+class StatusTest(ViewTest):
+    releaseName = 'Firefox-3.0-build1'
+    platforms = ['linux', 'macosx64', 'win32']
+
+    def setUp(self):
+        ViewTest.setUp(self)
+        with app.test_request_context():
+            r = FirefoxRelease(partials='2.0build1', promptWaitTime=None,
+                               submitter='joe', version='3.0', buildNumber=1,
+                               branch='a', mozillaRevision='abc',
+                               l10nChangesets='af def', dashboardCheck=True,
+                               mozillaRelbranch=None,
+                               enUSPlatforms=json.dumps(self.platforms))
+            r.ready = True
+            db.session.add(r)
+            sent = datetime.datetime(2005, 1, 1, 1, 1, 1, 1)
+            events = [
+                ('Firefox-3.0-build1_tag', None, 1, 1, 'tag'),
+                ('Firefox-3.0-build1_linux_build', 'linux', 1, 1, 'build'),
+                ('Firefox-3.0-build1_win32_build', 'win32', 1, 1, 'build'),
+                ('Firefox-3.0-build1_linux_repack_1/2', 'linux', 1, 2, 'repack'),
+                ('Firefox-3.0-build1_linux_repack_2/2', 'linux', 2, 2, 'repack'),
+                ('Firefox-3.0-build1_win32_repack_1/4', 'win32', 1, 4, 'repack'),
+                ('Firefox-3.0-build1_macosx64_repack_complete', 'macosx64', 0, 0, 'repack'),
+                ('Firefox-3.0-build1_linux_update_verify_1/3', 'linux', 1, 3, 'update_verify'),
+            ]
+            for event_name, platform, chunkNum, chunkTotal, group in events:
+                db.session.add(ReleaseEvents(self.releaseName, sent, event_name,
+                                             platform, 0, chunkNum, chunkTotal,
+                                             group))
+            db.session.commit()
+            ReleaseProgress.rebuild()
+
+
+class TestStatusAPI(StatusTest):
+    def testGetStatus(self):
+        ret = self.get('/releases/%s/status' % self.releaseName)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        status = json.loads(ret.data)['status']
+        self.assertEquals(status['name'], self.releaseName)
+        self.assertEquals(status['tag'], {'progress': 1.00})
+        self.assertEquals(status['update'], {'progress': 0.00})
+        self.assertEquals(status['build']['platforms'],
+                          {'linux': 1.00, 'macosx64': 0.00, 'win32': 1.00})
+        self.assertEquals(status['repack']['platforms'],
+                          {'linux': 1.00, 'macosx64': 1.00, 'win32': 0.25})
+        self.assertAlmostEquals(status['repack']['progress'], 0.75)
+        self.assertEquals(status['readyforrelease']['platforms'],
+                          {'linux': 0.33, 'macosx64': 0.00, 'win32': 0.00})
+
+    def testGetStatusWithEvents(self):
+        ret = self.get('/releases/%s/status' % self.releaseName,
+                       query_string={'events': 1})
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(len(json.loads(ret.data)['events']), 8)
+
+    def testGetStatusNoEvents(self):
+        ret = self.get('/releases/Fennec-1-build1/status')
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(ret.data)['status'], None)
+
+    def testGetStatusNotModified(self):
+        url = '/releases/%s/status' % self.releaseName
+        etag = self.get(url).headers['ETag']
+        ret = self.get(url, headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 304)
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_update',
+            'results': 0,
+            'chunkNum': 1,
+            'chunkTotal': 1,
+            'group': 'update',
+        }
+        ret = self.post(url, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        ret = self.get(url, headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 200)
+        self.assertNotEquals(ret.headers['ETag'], etag)
+
+    def testGetStatusModifiedByRebuild(self):
+        url = '/releases/%s/status' % self.releaseName
+        with app.test_request_context():
+            ReleaseProgress.query.delete()
+            db.session.commit()
+        etag = self.get(url).headers['ETag']
+        with app.test_request_context():
+            ReleaseProgress.rebuild([self.releaseName])
+        ret = self.get(url, headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 200)
+        self.assertNotEquals(json.loads(ret.data)['status'], None)
+
+    def testPostEvent(self):
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_postrelease',
+            'results': 0,
+            'chunkNum': 1,
+            'chunkTotal': 1,
+            'group': 'postrelease',
+        }
+        ret = self.post('/releases/%s/status' % self.releaseName, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        ret = self.get('/releases/%s/status' % self.releaseName)
+        self.assertEquals(json.loads(ret.data)['status']['postrelease'],
+                          {'progress': 1.00})
+
+    def testPostUpdatesProgress(self):
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_win32_repack_2/4',
+            'results': 0,
+            'platform': 'win32',
+            'chunkNum': 2,
+            'chunkTotal': 4,
+            'group': 'repack',
+        }
+        ret = self.post('/releases/%s/status' % self.releaseName, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        with app.test_request_context():
+            row = ReleaseProgress.query.get((self.releaseName, 'repack', 'win32'))
+            self.assertEquals(row.events, 2)
+            self.assertAlmostEquals(row.progress, 0.5)
+
+    def testPostEventWithoutChunkTotal(self):
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_win32_repack_2',
+            'results': 0,
+            'platform': 'win32',
+            'chunkNum': 2,
+            'chunkTotal': 0,
+            'group': 'repack',
+        }
+        ret = self.post('/releases/%s/status' % self.releaseName, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(ret.data), {'status': 'added'})
+        with app.test_request_context():
+            row = ReleaseProgress.query.get((self.releaseName, 'repack', 'win32'))
+            self.assertEquals(row.events, 2)
+            self.assertAlmostEquals(row.progress, 0.25)
+            status = ReleaseEvents.getStatus(self.releaseName)
+            self.assertEquals(status['repack']['platforms']['win32'], 0.25)
+
+    def testPostDuplicateEvent(self):
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_tag',
+            'results': 0,
+            'chunkNum': 1,
+            'chunkTotal': 1,
+            'group': 'tag',
+        }
+        ret = self.post('/releases/%s/status' % self.releaseName, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(ret.data), {'status': 'duplicate'})
+        with app.test_request_context():
+            row = ReleaseProgress.query.get((self.releaseName, 'tag', ''))
+            self.assertEquals(row.events, 1)
+
+    def testPostRetriedEvent(self):
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_win32_repack_2/4',
+            'results': 0,
+            'platform': 'win32',
+            'chunkNum': 2,
+            'chunkTotal': 4,
+            'group': 'repack',
+        }
+        url = '/releases/%s/status' % self.releaseName
+        ret = self.post(url, data=data)
+        self.assertEquals(json.loads(ret.data), {'status': 'added'})
+        etag = self.get(url).headers['ETag']
+        ret = self.post(url, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(ret.data), {'status': 'duplicate'})
+        # Nothing changed, so the status is still the same version.
+        ret = self.get(url, headers={'If-None-Match': etag})
+        self.assertEquals(ret.status_code, 304)
+        with app.test_request_context():
+            row = ReleaseProgress.query.get((self.releaseName, 'repack', 'win32'))
+            self.assertEquals(row.events, 2)
+            self.assertAlmostEquals(row.progress, 0.5)
+
+
+class TestStatusSnapshot(StatusTest):
+    def complete(self):
+        ret = self.post('/releases/%s' % self.releaseName,
+                        data={'complete': True})
+        self.assertEquals(ret.status_code, 200, ret.data)
+
+    def testTakenOnComplete(self):
+        url = '/releases/%s/status' % self.releaseName
+        expected = json.loads(self.get(url).data)
+        self.complete()
+        with app.test_request_context():
+            snapshot = ReleaseSnapshot.query.get(self.releaseName)
+            self.assertEquals(json.loads(snapshot.body), expected)
+            # Make sure what's served is the snapshot itself.
+            snapshot.body = json.dumps({'status': 'frozen'})
+            db.session.commit()
+        ret = self.get(url)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(ret.mimetype, 'application/json')
+        self.assertEquals(json.loads(ret.data), {'status': 'frozen'})
+        self.assertEquals(self.get(url, headers={'If-None-Match': ret.headers['ETag']}).status_code,
+                          304)
+        # Events are never part of the snapshot.
+        ret = self.get(url, query_string={'events': 1})
+        self.assertEquals(json.loads(ret.data)['status'], expected['status'])
+
+    def testNotTakenForIncompleteReleases(self):
+        self.post('/releases/%s' % self.releaseName, data={'status': 'omg!'})
+        with app.test_request_context():
+            self.assertEquals(ReleaseSnapshot.query.get(self.releaseName), None)
+
+    def testNotTakenBeforeRebuild(self):
+        url = '/releases/%s/status' % self.releaseName
+        expected = json.loads(self.get(url).data)
+        with app.test_request_context():
+            ReleaseProgress.query.delete()
+            db.session.commit()
+        self.complete()
+        with app.test_request_context():
+            self.assertEquals(ReleaseSnapshot.query.get(self.releaseName), None)
+            ReleaseProgress.rebuild([self.releaseName])
+            self.assertTrue(freezeStatus(self.releaseName))
+            db.session.commit()
+        self.assertEquals(json.loads(self.get(url).data), expected)
+
+    def testLateEventsMakeItStale(self):
+        url = '/releases/%s/status' % self.releaseName
+        self.complete()
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_postrelease',
+            'results': 0,
+            'chunkNum': 1,
+            'chunkTotal': 1,
+            'group': 'postrelease',
+        }
+        ret = self.post(url, data=data)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(self.get(url).data)['status']['postrelease'],
+                          {'progress': 1.00})
+        # Later changes to the release take it again.
+        self.post('/releases/%s' % self.releaseName, data={'status': 'shipped'})
+        with app.test_request_context():
+            snapshot = ReleaseSnapshot.query.get(self.releaseName)
+            self.assertEquals(json.loads(snapshot.body)['status']['postrelease'],
+                              {'progress': 1.00})
+
+
+class TestStatusesAPI(StatusTest):
+    def testGetStatuses(self):
+        ret = self.get('/releases/status', query_string={'ready': 1, 'complete': 0})
+        self.assertEquals(ret.status_code, 200, ret.data)
+        releases = json.loads(ret.data)['releases']
+        self.assertEquals([r['name'] for r in releases],
+                          [self.releaseName, 'Fennec-1-build1'])
+        single = self.get('/releases/%s/status' % self.releaseName)
+        self.assertEquals(releases[0]['status'],
+                          json.loads(single.data)['status'])
+        self.assertEquals(releases[1]['status'], None)
+
+    def testGetStatusesWithoutPlatforms(self):
+        with app.test_request_context():
+            event = ReleaseEvents('Fennec-1-build1',
+                                  datetime.datetime(2005, 1, 1, 1, 1, 1),
+                                  'Fennec-1-build1_tag', None, 0, 1, 1, 'tag')
+            ReleaseEvents.insertIgnore(event)
+            ReleaseProgress.record(event)
+            db.session.commit()
+        ret = self.get('/releases/status', query_string={'ready': 1, 'complete': 0})
+        self.assertEquals(ret.status_code, 200, ret.data)
+        status = json.loads(ret.data)['releases'][1]['status']
+        self.assertEquals(status['tag'], {'progress': 1.00})
+        self.assertEquals(status['build'], {'platforms': {}, 'progress': 0.00})
+        self.assertEquals(status['repack'], {'platforms': {}, 'progress': 0.00})
+        single = self.get('/releases/Fennec-1-build1/status')
+        self.assertEquals(single.status_code, 200, single.data)
+        self.assertEquals(json.loads(single.data)['status'], status)
+
+    def testGetAllStatuses(self):
+        ret = self.get('/releases/status')
+        self.assertEquals(ret.status_code, 200, ret.data)
+        names = [r['name'] for r in json.loads(ret.data)['releases']]
+        self.assertEquals(len(names), 7)
+        self.assertTrue(self.releaseName in names)
+
+
+class TestSpooledStatusAPI(StatusTest):
+    def setUp(self):
+        StatusTest.setUp(self)
+        self.spool_fd, self.spool_file = mkstemp()
+        app.config['EVENT_SPOOL'] = self.spool_file
+        app.config['EVENT_SPOOL_INTERVAL'] = 0
+
+    def tearDown(self):
+        closeSpools()
+        del app.config['EVENT_SPOOL']
+        del app.config['EVENT_SPOOL_INTERVAL']
+        os.close(self.spool_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.spool_file + suffix):
+                os.remove(self.spool_file + suffix)
+        StatusTest.tearDown(self)
+
+    def postRepack(self):
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_win32_repack_2/4',
+            'results': 0,
+            'platform': 'win32',
+            'chunkNum': 2,
+            'chunkTotal': 4,
+            'group': 'repack',
+        }
+        return self.post('/releases/%s/status' % self.releaseName, data=data)
+
+    def testPostIsSpooled(self):
+        ret = self.postRepack()
+        self.assertEquals(ret.status_code, 200, ret.data)
+        with app.test_request_context():
+            self.assertEquals(ReleaseEvents.query.filter_by(
+                name=self.releaseName, group='repack').count(), 4)
+            self.assertEquals(len(getSpool(app)), 1)
+
+    def testGetIncludesSpooledEvents(self):
+        url = '/releases/%s/status' % self.releaseName
+        etag = self.get(url).headers['ETag']
+        self.postRepack()
+        ret = self.get(url, headers={'If-None-Match': etag},
+                       query_string={'events': 1})
+        self.assertEquals(ret.status_code, 200, ret.data)
+        data = json.loads(ret.data)
+        self.assertEquals(data['status']['repack']['platforms']['win32'], 0.5)
+        self.assertEquals(len(data['events']), 9)
+
+    def testGetStatusesIncludesSpooledEvents(self):
+        self.postRepack()
+        ret = self.get('/releases/status', query_string={'ready': 1})
+        status = json.loads(ret.data)['releases'][0]['status']
+        self.assertEquals(status['repack']['platforms']['win32'], 0.5)
+
+    def testFlushedStatusMatches(self):
+        self.postRepack()
+        url = '/releases/%s/status' % self.releaseName
+        spooled = json.loads(self.get(url).data)
+        with app.test_request_context():
+            self.assertEquals(getSpool(app).flushAll(), 1)
+        ret = self.get(url)
+        self.assertTrue(ret.headers.get('ETag'))
+        self.assertEquals(json.loads(ret.data), spooled)
+
+    def testPostDuplicateEvent(self):
+        self.assertEquals(json.loads(self.postRepack().data),
+                          {'status': 'added'})
+        ret = self.postRepack()
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(ret.data), {'status': 'duplicate'})
+        data = {
+            'sent': '2005-01-01 01:01:01',
+            'event_name': 'Firefox-3.0-build1_tag',
+            'results': 0,
+            'chunkNum': 1,
+            'chunkTotal': 1,
+            'group': 'tag',
+        }
+        ret = self.post('/releases/%s/status' % self.releaseName, data=data)
+        self.assertEquals(json.loads(ret.data), {'status': 'duplicate'})
+        with app.test_request_context():
+            self.assertEquals(len(getSpool(app)), 1)
+
+
+class TestGetStatus(StatusTest):
+    def testMatchesPerStepStatus(self):
+        with app.test_request_context():
+            got = ReleaseEvents.getStatus(self.releaseName)
+            name = self.releaseName
+            expected = {
+                'name': name,
+                'tag': ReleaseEvents.tagStatus(name),
+                'build': ReleaseEvents.buildStatus(name),
+                'repack': ReleaseEvents.repackStatus(name),
+                'update': ReleaseEvents.updateStatus(name),
+                'releasetest': ReleaseEvents.releasetestStatus(name),
+                'readyforrelease': ReleaseEvents.readyForReleaseStatus(name),
+                'postrelease': ReleaseEvents.postreleaseStatus(name),
+            }
+            self.assertEquals(got, expected)
+
+    def testGetStatusesMatches(self):
+        with app.test_request_context():
+            statuses = dict(ReleaseEvents.getStatuses())
+            self.assertEquals(statuses[self.releaseName],
+                              ReleaseEvents.getStatus(self.releaseName))
+            self.assertEquals(statuses['Fennec-1-build1'], None)
+
+    def testRebuildMatchesRecorded(self):
+        with app.test_request_context():
+            expected = ReleaseEvents.getStatus(self.releaseName)
+            ReleaseProgress.query.delete()
+            db.session.commit()
+            self.assertEquals(ReleaseEvents.getStatus(self.releaseName), None)
+            self.assertEquals(ReleaseProgress.rebuild([self.releaseName]), 1)
+            self.assertEquals(ReleaseEvents.getStatus(self.releaseName), expected)
+
+
+class TestEventsAPI(StatusTest):
+    def makeEvent(self, event_name, **kwargs):
+        event = {
+            'name': self.releaseName,
+            'sent': '2005-01-01 01:01:01',
+            'event_name': event_name,
+            'results': 0,
+            'chunkNum': 1,
+            'chunkTotal': 1,
+        }
+        event.update(kwargs)
+        return event
+
+    def testPostJSON(self):
+        events = [
+            self.makeEvent('Firefox-3.0-build1_win32_repack_2/4',
+                           platform='win32', chunkNum=2, chunkTotal=4,
+                           group='repack'),
+            self.makeEvent('Firefox-3.0-build1_update', group='update'),
+            # Already recorded
+            self.makeEvent('Firefox-3.0-build1_tag', group='tag'),
+            # Repeated within the batch
+            self.makeEvent('Firefox-3.0-build1_update', group='update'),
+            self.makeEvent('Firefox-3.0-build1_bad', name='not a release'),
+            self.makeEvent('Firefox-3.0-build1_bad', sent='yesterday'),
+        ]
+        ret = self.post('/releases/events', data=json.dumps(events),
+                        content_type='application/json')
+        self.assertEquals(ret.status_code, 200, ret.data)
+        report = json.loads(ret.data)
+        self.assertEquals([r['status'] for r in report['results']],
+                          ['added', 'added', 'duplicate', 'duplicate',
+                           'invalid', 'invalid'])
+        self.assertEquals(report['added'], 2)
+        self.assertEquals(report['duplicate'], 2)
+        self.assertEquals(report['invalid'], 2)
+        self.assertTrue('releaseName' in report['results'][4]['errors'])
+        self.assertTrue('sent' in report['results'][5]['errors'])
+        with app.test_request_context():
+            status = ReleaseEvents.getStatus(self.releaseName)
+            self.assertEquals(status['update'], {'progress': 1.00})
+            self.assertEquals(status['repack']['platforms']['win32'], 0.5)
+
+    def testPostMixedBatch(self):
+        events = [
+            self.makeEvent('Firefox-3.0-build1_win32_repack_2/4',
+                           platform='win32', chunkNum=2, chunkTotal=4,
+                           group='repack'),
+            # Without a chunk total it counts, but makes no progress.
+            self.makeEvent('Firefox-3.0-build1_win32_repack_3',
+                           platform='win32', chunkNum=3, chunkTotal=0,
+                           group='repack'),
+            self.makeEvent('Firefox-3.0-build1_bad', chunkTotal='many'),
+            self.makeEvent('Firefox-3.0-build1_update', group='update'),
+        ]
+        ret = self.post('/releases/events', data=json.dumps(events),
+                        content_type='application/json')
+        self.assertEquals(ret.status_code, 200, ret.data)
+        report = json.loads(ret.data)
+        self.assertEquals([r['status'] for r in report['results']],
+                          ['added', 'added', 'invalid', 'added'])
+        self.assertTrue('chunkTotal' in report['results'][2]['errors'])
+        with app.test_request_context():
+            row = ReleaseProgress.query.get((self.releaseName, 'repack', 'win32'))
+            self.assertEquals(row.events, 3)
+            self.assertAlmostEquals(row.progress, 0.5)
+            status = ReleaseEvents.getStatus(self.releaseName)
+            self.assertEquals(status['update'], {'progress': 1.00})
+
+    def testPostOverlappingBatch(self):
+        events = [
+            self.makeEvent('Firefox-3.0-build1_update', group='update'),
+            self.makeEvent('Firefox-3.0-build1_tag', group='tag'),
+        ]
+        # As if an overlapping batch recorded the tag after we looked.
+        with mock.patch.object(ReleaseEvents, 'getExisting',
+                               return_value=set()):
+            ret = self.post('/releases/events', data=json.dumps(events),
+                            content_type='application/json')
+        self.assertEquals(ret.status_code, 200, ret.data)
+        report = json.loads(ret.data)
+        self.assertEquals([r['status'] for r in report['results']],
+                          ['added', 'duplicate'])
+        with app.test_request_context():
+            row = ReleaseProgress.query.get((self.releaseName, 'tag', ''))
+            self.assertEquals(row.events, 1)
+
+    def testPostNDJSON(self):
+        events = [
+            self.makeEvent('Firefox-3.0-build1_update', group='update'),
+            self.makeEvent('Fennec-4.0-build1_tag', name='Fennec-4.0-build1',
+                           group='tag'),
+        ]
+        data = '\n'.join(json.dumps(e) for e in events) + '\n'
+        ret = self.post('/releases/events', data=data,
+                        content_type='application/x-ndjson')
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(json.loads(ret.data)['added'], 2)
+        with app.test_request_context():
+            self.assertEquals(
+                ReleaseEvents.query.filter_by(name='Fennec-4.0-build1').count(), 1)
+
+    def testPostUnparseable(self):
+        ret = self.post('/releases/events', data='{"name": ',
+                        content_type='application/json')
+        self.assertEquals(ret.status_code, 400, ret.data)
+
+    def testPostNotAnArray(self):
+        ret = self.post('/releases/events', data='{}',
+                        content_type='application/json')
+        self.assertEquals(ret.status_code, 400, ret.data)
+
+
+class TestStatusStreamAPI(StatusTest):
+    def setUp(self):
+        StatusTest.setUp(self)
+        app.config['STATUS_STREAM_KEEPALIVE'] = 1
+        app.config['STATUS_STREAM_MAX_AGE'] = 0
+
+    def tearDown(self):
+        del app.config['STATUS_STREAM_KEEPALIVE']
+        del app.config['STATUS_STREAM_MAX_AGE']
+        StatusTest.tearDown(self)
+
+    def parseEvents(self, chunks):
+        events = []
+        for chunk in chunks:
+            lines = dict(l.split(': ', 1) for l in chunk.strip().split('\n'))
+            if 'event' in lines:
+                events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    def testInitialEvents(self):
+        ret = self.get('/releases/%s/status/stream' % self.releaseName)
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(ret.mimetype, 'text/event-stream')
+        events = dict(self.parseEvents(ret.data.split('\n\n')[:-1]))
+        self.assertEquals(events['status']['tag'], {'progress': 1.00})
+        self.assertEquals(events['release'],
+                          {'ready': True, 'complete': False, 'status': ''})
+
+    def testOnlyChangesAreSent(self):
+        app.config['STATUS_STREAM_MAX_AGE'] = 10
+        ret = self.client.get('/releases/%s/status/stream' % self.releaseName,
+                              environ_base=self.auth, buffered=False)
+        chunks = iter(ret.response)
+        # The retry hint, and the full status and release.
+        self.assertEquals(len(self.parseEvents([next(chunks) for _ in range(3)])), 2)
+
+        ret = self.post('/releases/%s' % self.releaseName, data={'status': 'omg!'})
+        self.assertEquals(ret.status_code, 200, ret.data)
+        self.assertEquals(self.parseEvents([next(chunks)]),
+                          [('release', {'status': 'omg!'})])
+
+    def testNonExistentRelease(self):
+        ret = self.get('/releases/Firefox-9.0-build1/status/stream')
+        self.assertEquals(ret.status_code, 404)
+
+    def testUnknownProduct(self):
+        ret = self.get('/releases/Seamonkey-2.0-build1/status/stream')
+        self.assertEquals(ret.status_code, 404)
@@ -1,6 +1,11 @@
+import mock
+
+import simplejson as json
+
 from kickoff import app
-from kickoff.model import FirefoxRelease
+from kickoff.model import FennecRelease, FirefoxRelease
 from kickoff.test.views.base import ViewTest
+from kickoff.views.forms import FirefoxReleaseForm
 
 class TestSubmitRelease(ViewTest):
     def testSubmit(self):
@@ -88,3 +93,39 @@ class TestSubmitRelease(ViewTest):
             self.assertEquals(got.complete, False)
             self.assertEquals(got.status, '')
             self.assertEquals(got.mozillaRelbranch, 'FOO')
+
+
+class TestSuggestions(ViewTest):
+    def testSubmitPageIsCached(self):
+        self.assertEquals(self.get('/submit_release.html').status_code, 200)
+        with mock.patch.multiple(FennecRelease, getRecent=mock.DEFAULT,
+                                 getMaxBuildNumbers=mock.DEFAULT) as fennec:
+            with mock.patch.multiple(FirefoxRelease, getRecent=mock.DEFAULT,
+                                     getMaxBuildNumbers=mock.DEFAULT) as firefox:
+                ret = self.get('/submit_release.html')
+        self.assertEquals(ret.status_code, 200)
+        for patched in (fennec, firefox):
+            self.assertFalse(patched['getRecent'].called)
+            self.assertFalse(patched['getMaxBuildNumbers'].called)
+
+    def testSuggestionsFollowSubmissions(self):
+        with app.test_request_context():
+            form = FirefoxReleaseForm()
+            self.assertFalse('9.0' in json.loads(form.buildNumber.suggestions))
+        data = [
+            'firefox-version=9.0',
+            'firefox-buildNumber=1',
+            'firefox-branch=z',
+            'firefox-mozillaRevision=abc',
+            'firefox-partials=1.0build1',
+            'firefox-l10nChangesets=af%20def',
+            'firefox-product=firefox',
+        ]
+        ret = self.post('/submit_release.html', data='&'.join(data), content_type='application/x-www-form-urlencoded')
+        self.assertEquals(ret.status_code, 302, ret.data)
+        with app.test_request_context():
+            form = FirefoxReleaseForm()
+            self.assertEquals(json.loads(form.buildNumber.suggestions)['9.0'], 2)
+            self.assertTrue('z' in json.loads(form.branch.suggestions))
+            self.assertEquals(json.loads(form.partials.suggestions)['z'],
+                              ['9.0build1'])
@@ -0,0 +1,104 @@
+from calendar import timegm
+from hashlib import md5
+
+from flask import request, Response
+from werkzeug.http import is_resource_modified, parse_if_range_header, \
+    parse_range_header
+
+from kickoff.model import ResourceVersion
+
+
+class Validators(object):
+    """The ETag and Last-Modified of a response, derived from the version
+       stamps of the resources it is built from. Looking them up costs a
+       single query, so views should check them before doing anything else.
+       If a resource has never been stamped the response can't be
+       validated, and is simply served without validators."""
+
+    def __init__(self, *resources):
+        self.etag = None
+        self.lastModified = None
+        versions = ResourceVersion.getMany(resources)
+        if len(versions) == len(resources):
+            versions.sort(key=lambda v: v.resource)
+            # The update times are part of the tag in case the stamps ever
+            # start over, e.g. after restoring a backup.
+            tag = ' '.join('%s:%d:%d' % (v.resource, v.version,
+                                         timegm(v._updatedAt.utctimetuple()))
+                           for v in versions)
+            self.etag = md5(tag.encode('utf-8')).hexdigest()
+            self.lastModified = max(v.updatedAt for v in versions)
+
+    def notModified(self):
+        """Returns a 304 response if the client already has the current
+           version, otherwise None."""
+        if self.etag and not is_resource_modified(request.environ,
+                                                  etag=self.etag,
+                                                  last_modified=self.lastModified):
+            return self.apply(Response(status=304))
+        return None
+
+    def apply(self, response):
+        if self.etag:
+            response.set_etag(self.etag)
+            response.last_modified = self.lastModified
+        return response
+
+
+# Bodies served by serveBody() are sent in chunks of this many bytes.
+CHUNK_SIZE = 16 * 1024
+
+
+def requestedRange(length, etag):
+    """Returns the (start, stop) of the single byte range the request asks
+       for, None if it should get the whole body, or False if the range it
+       asks for can't be satisfied."""
+    ifRange = parse_if_range_header(request.environ.get('HTTP_IF_RANGE'))
+    # A stale If-Range means the client wants the whole, new, body.
+    if ifRange.date is not None or (ifRange.etag and ifRange.etag != etag):
+        return None
+    try:
+        rng = parse_range_header(request.environ.get('HTTP_RANGE'))
+    except ValueError:
+        rng = None
+    # Multiple ranges are allowed to be answered with the whole body.
+    if rng is None or rng.units != 'bytes' or len(rng.ranges) != 1:
+        return None
+    return rng.range_for_length(length) or False
+
+
+def serveBody(body, etag, contentType, contentEncoding=None):
+    """Returns a response that streams 'body', a byte string, in chunks.
+       It honours If-None-Match against 'etag', which must change whenever
+       'body' does, and single byte Range requests."""
+    if not is_resource_modified(request.environ, etag=etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    start, stop = 0, len(body)
+    status = 200
+    span = requestedRange(len(body), etag)
+    if span is False:
+        response = Response(status=416)
+        response.headers['Content-Range'] = 'bytes */%d' % len(body)
+        return response
+    elif span:
+        start, stop = span
+        status = 206
+
+    def generate():
+        for offset in xrange(start, stop, CHUNK_SIZE):
+            yield body[offset:min(offset + CHUNK_SIZE, stop)]
+
+    response = Response(generate(), status=status, content_type=contentType,
+                        direct_passthrough=True)
+    response.headers['Content-Length'] = str(stop - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if contentEncoding:
+        response.headers['Content-Encoding'] = contentEncoding
+    if status == 206:
+        response.headers['Content-Range'] = 'bytes %d-%d/%d' % (
+            start, stop - 1, len(body))
+    response.set_etag(etag)
+    return response
@@ -1,11 +1,19 @@
-from flask import Response
+from flask import request, Response
 from flask.views import MethodView
 from flask.ext.wtf import Form
+from werkzeug.datastructures import MultiDict
 
 def get_csrf_headers():
     form = Form()
     return {'X-CSRF-Token': form.csrf_token._value()}
 
+def validate_csrf_header():
+    """Checks the token from the X-CSRF-Token header, for API endpoints whose
+       request body isn't a form."""
+    token = request.headers.get('X-CSRF-Token', '')
+    form = Form(formdata=MultiDict([('csrf_token', token)]))
+    return form.validate()
+
 class CSRFView(MethodView):
     """A simple view that allows an API client to get a CSRF token easily."""
     def get(self):
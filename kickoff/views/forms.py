@@ -1,11 +1,11 @@
 import logging
-import re
 
 import simplejson as json
 from ast import literal_eval
 from collections import defaultdict
 from distutils.version import LooseVersion
 
+from flask import current_app
 from flask.ext.wtf import SelectMultipleField, ListWidget, CheckboxInput, \
     Form, BooleanField, StringField, Length, TextAreaField, DataRequired, \
     IntegerField, HiddenField, Regexp, TextInput, DateTimeField, InputRequired
@@ -13,13 +13,14 @@ from flask.ext.wtf import SelectMultipleField, ListWidget, CheckboxInput, \
 from mozilla.build.versions import ANY_VERSION_REGEX, getPossibleNextVersions
 from mozilla.release.l10n import parsePlainL10nChangesets
 
-from kickoff.model import Release, getReleaseTable
+from kickoff.cache import suggestionCache
+from kickoff.model import Release, getProduct, getReleaseTable, \
+    parseReleaseName
 
 log = logging.getLogger(__name__)
 
 
 PARTIAL_VERSIONS_REGEX = ('^(%sbuild\d+)(,%sbuild\d)*$' % (ANY_VERSION_REGEX, ANY_VERSION_REGEX))
-NAME_REGEX = re.compile('\w{0,100}-%s-build\d+' % ANY_VERSION_REGEX)
 
 # From http://wtforms.simplecodes.com/docs/1.0.2/specific_problems.html#specialty-field-tricks
 class MultiCheckboxField(SelectMultipleField):
@@ -188,9 +189,21 @@ class ReleaseForm(Form):
         return valid
 
     def addSuggestions(self):
+        # Suggestions only change when releases do, so they're computed once
+        # per product and then served from the cache until a release of that
+        # product is added, edited or deleted.
         table = getReleaseTable(self.product.data)
-        recentReleases = table.getRecent()
-
+        maxAge = current_app.config.get('SUGGESTION_CACHE_MAX_AGE', 300)
+        suggestions = suggestionCache.get(
+            table.product, lambda: self.getSuggestions(table, table.getRecent()),
+            maxAge)
+        for field, value in suggestions.items():
+            getattr(self, field).suggestions = value
+
+    @classmethod
+    def getSuggestions(cls, table, recentReleases):
+        """Returns the JSON suggestions for this form's fields, by field
+           name, based on 'recentReleases' of 'table'."""
         # Before we make any suggestions we need to do some preprocessing of
         # the data to get it into useful structures. Specifically, we need a
         # set containing all of the recent versions, and a dict that associates
@@ -206,22 +219,6 @@ class ReleaseForm(Form):
         suggestedVersions = set()
         buildNumbers = {}
 
-        # This wrapper method is used to centralize the build number suggestion
-        # logic in one place, because there's more than one spot below that
-        # adds a version suggestion.
-        def addVersionSuggestion(version):
-            suggestedVersions.add(version)
-            # We want the UI to be able to automatically set build number
-            # to the next available one for whatever version is entered.
-            # To make this work we need to tell it what the next available
-            # one is for all existing versions. We don't need to add versions
-            # that are on build1, because it uses that as the default.
-            maxBuildNumber = table.getMaxBuildNumber(version)
-            if maxBuildNumber:
-                buildNumbers[version] = maxBuildNumber + 1
-            else:
-                buildNumbers[version] = 1
-
         # Every version we see will have its potential next versions
         # suggested, except if we already have that version.
         # Note that we don't look through the entire table for every
@@ -232,17 +229,27 @@ class ReleaseForm(Form):
         for version in recentVersions:
             for v in getPossibleNextVersions(version):
                 if v not in recentVersions:
-                    addVersionSuggestion(v)
+                    suggestedVersions.add(v)
 
         # Additional, we need to suggest the most recent version for each
         # branch, because we may want a build2 (or higher) of it.
         for branchVersions in recentBranches.values():
-            addVersionSuggestion(str(max(branchVersions)))
-
-        # Finally, attach the suggestions to their fields.
-        self.branch.suggestions = json.dumps(list(recentBranches.keys()))
-        self.version.suggestions = json.dumps(list(suggestedVersions))
-        self.buildNumber.suggestions = json.dumps(buildNumbers)
+            suggestedVersions.add(str(max(branchVersions)))
+
+        # We want the UI to be able to automatically set build number
+        # to the next available one for whatever version is entered.
+        # To make this work we need to tell it what the next available
+        # one is for all suggested versions, which are looked up all at once.
+        maxBuildNumbers = table.getMaxBuildNumbers(suggestedVersions)
+        for version in suggestedVersions:
+            buildNumbers[version] = maxBuildNumbers.get(version, 0) + 1
+
+        # Finally, serialize the suggestions for their fields.
+        return {
+            'branch': json.dumps(list(recentBranches.keys())),
+            'version': json.dumps(list(suggestedVersions)),
+            'buildNumber': json.dumps(buildNumbers),
+        }
 
 class FennecReleaseForm(ReleaseForm):
     product = HiddenField('product')
@@ -272,10 +279,9 @@ class DesktopReleaseForm(ReleaseForm):
     promptWaitTime = NullableIntegerField('Update prompt wait time:')
     l10nChangesets = PlainChangesetsField('L10n Changesets:', validators=[DataRequired('L10n Changesets are required.')])
 
-    def addSuggestions(self):
-        ReleaseForm.addSuggestions(self)
-        table = getReleaseTable(self.product.data)
-        recentReleases = table.getRecent()
+    @classmethod
+    def getSuggestions(cls, table, recentReleases):
+        suggestions = ReleaseForm.getSuggestions(table, recentReleases)
         seenVersions = []
         partials = {}
         # The UI will suggest any versions which are on the same branch as
@@ -286,7 +292,8 @@ class DesktopReleaseForm(ReleaseForm):
             if release.version not in seenVersions:
                 partials[release.branch].append('%sbuild%d' % (release.version, release.buildNumber))
                 seenVersions.append(release.version)
-        self.partials.suggestions = json.dumps(partials)
+        suggestions['partials'] = json.dumps(partials)
+        return suggestions
 
 
 class FirefoxReleaseForm(DesktopReleaseForm):
@@ -344,17 +351,20 @@ class ThunderbirdReleaseForm(DesktopReleaseForm):
         self.commRelbranch.data = row.commRelbranch
 
 
+# The release form of each product.
+RELEASE_FORMS = {
+    'fennec': FennecReleaseForm,
+    'firefox': FirefoxReleaseForm,
+    'thunderbird': ThunderbirdReleaseForm,
+}
+
+
 def getReleaseForm(release):
     """Helper method to figure out which form is needed for a release, based
        on its name."""
-    release = release.lower()
-    if release.startswith('fennec'):
-        return FennecReleaseForm
-    elif release.startswith('firefox'):
-        return FirefoxReleaseForm
-    elif release.startswith('thunderbird'):
-        return ThunderbirdReleaseForm
-    else:
+    try:
+        return RELEASE_FORMS[getProduct(release)]
+    except KeyError:
         raise ValueError("Can't find release table for release %s" % release)
 
 
@@ -376,18 +386,10 @@ class ReleaseEventsAPIForm(Form):
             if 'releaseName' not in self.errors:
                 self.errors['releaseName'] = []
             self.errors['releaseName'].append('Release name too short or too long. Must be greater than 0 and less than 100.')
-        match = NAME_REGEX.match(releaseName)
-        if not match:
+        if not parseReleaseName(releaseName):
             valid = False
             if 'releaseName' not in self.errors:
                 self.errors['releaseName'] = []
             self.errors['releaseName'].append('Incorrect release name format.')
-        else:
-            start, end = match.span()
-            if not releaseName[start:end] == releaseName:
-                valid = False
-                if 'releaseName' not in self.errors:
-                    self.errors['releaseName'] = []
-                self.errors['releaseName'].append('Incorrect release name format.')
 
         return valid
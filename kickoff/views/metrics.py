@@ -0,0 +1,24 @@
+from hmac import compare_digest
+
+from flask import abort, current_app, request, Response
+from flask.views import MethodView
+
+from kickoff.log import cef_event, CEF_WARN
+from kickoff.metrics import metrics
+
+
+class MetricsAPI(MethodView):
+    """Serves the metrics recorded by this process in the Prometheus text
+       format. It's only there when METRICS is set, and wants the
+       METRICS_TOKEN, if there is one, as its 'token' parameter."""
+
+    def get(self):
+        if not current_app.config.get('METRICS'):
+            abort(404)
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and not compare_digest(str(request.args.get('token', '')),
+                                        str(token)):
+            cef_event('Metrics Token Rejected', CEF_WARN)
+            return Response(status=403)
+        return Response(metrics.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -1,35 +1,104 @@
+from cStringIO import StringIO
+from gzip import GzipFile
 import logging
 
 import pytz
 
-from flask import request, jsonify, render_template, Response, redirect, make_response, abort
+import simplejson as json
+
+from flask import request, jsonify, render_template, Response, redirect, make_response, abort, current_app, url_for
 from flask.views import MethodView
+from jinja2 import Markup, escape
 
 from kickoff import db
+from kickoff.cache import l10nBodyCache
 from kickoff.log import cef_event, CEF_WARN, CEF_INFO
-from kickoff.model import getReleaseTable, getReleases
+from kickoff.model import getReleaseTable, getReleases, getReleaseNames, \
+    getReleasesByName, L10nBlob, ReleaseIndex, ReleaseL10n, ResourceVersion
+from kickoff.pubsub import broker
+from kickoff.views.conditional import Validators, serveBody
 from kickoff.views.forms import ReleasesForm, ReleaseAPIForm, getReleaseForm
+from kickoff.views.status import freezeStatus
 
 log = logging.getLogger(__name__)
 
-def sortedReleases():
-    def cmpReleases(x, y):
-        # Not ready releases should come before ready ones.
-        # Incomplete releases should come before completed ones.
-        # After that, sort by submission time
-        # Newer releases should be at the top.
-        if x.ready:
-            if not y.ready:
-                return 1
-        elif y.ready:
-            return -1
-        if x.complete:
-            if not y.complete:
-                return 1
-        elif y.complete:
-            return -1
-        return cmp(y._submittedAt, x._submittedAt)
-    return sorted(getReleases(), cmp=cmpReleases)
+
+# The columns of the Reviewed and Complete tables of the releases dashboard,
+# in display order. The Reviewed table has a status column before these.
+TABLE_COLUMNS = ('name', 'submitter', 'submittedAt', 'branch',
+                 'mozillaRevision', 'mozillaRelbranch', 'commRevision',
+                 'commRelbranch', 'dashboardCheck', 'l10nChangesets',
+                 'partials', 'promptWaitTime', 'comment')
+# Only columns that release_index has can be sorted by.
+SORTABLE_COLUMNS = {
+    'status': ReleaseIndex.status,
+    'name': ReleaseIndex.name,
+    'submitter': ReleaseIndex.submitter,
+    'submittedAt': ReleaseIndex._submittedAt,
+    'branch': ReleaseIndex.branch,
+}
+MAX_PAGE_SIZE = 100
+
+
+def tableColumns(complete):
+    if complete:
+        return TABLE_COLUMNS
+    return ('status',) + TABLE_COLUMNS
+
+
+def pageSize():
+    return current_app.config.get('RELEASES_PAGE_SIZE', 10)
+
+
+def tableCell(release, column):
+    """Returns the HTML contents of one cell of a dashboard table."""
+    notApplicable = Markup('<span class="irrelevant">N/A</span>')
+    if column == 'submittedAt':
+        return Markup('<span class="submittedAt">%s</span>') % release.submittedAt
+    if column in ('commRevision', 'commRelbranch'):
+        if release.product != 'thunderbird':
+            return notApplicable
+    elif column == 'dashboardCheck':
+        return release.dashboardCheck and 'Yes' or 'No'
+    elif column == 'l10nChangesets':
+        url = url_for('release_l10n_api', releaseName=release.name)
+        return Markup('<a href="%s">Link</a>') % url
+    elif column == 'partials':
+        if release.product == 'fennec':
+            return notApplicable
+        return escape((release.partials or '').replace(',', ' '))
+    elif column == 'promptWaitTime':
+        if release.product == 'fennec':
+            return notApplicable
+        if not release.promptWaitTime:
+            return 'Default'
+    return escape(getattr(release, column))
+
+
+def tablePage(complete, search='', orderBy=None, start=0, length=None):
+    """Returns one page of the Reviewed or Complete table as a dict of the
+       total number of releases in the table, the number that match
+       'search', and the page's rows of cell contents."""
+    if orderBy is None:
+        orderBy = [ReleaseIndex._submittedAt.desc()]
+    if length is None:
+        length = pageSize()
+    # Break ties so that paging is stable.
+    orderBy = list(orderBy) + [ReleaseIndex.name]
+    total, matching, names = ReleaseIndex.getPage(True, complete, search,
+                                                  orderBy, start, length)
+    columns = tableColumns(complete)
+    rows = [[tableCell(r, c) for c in columns]
+            for r in getReleasesByName(names, include=('comment',))]
+    return {'total': total, 'matching': matching, 'rows': rows}
+
+
+def renderReleases(form, errors=None, status=200):
+    return make_response(render_template(
+        'releases.html', errors=errors, form=form,
+        submitted=getReleases(ready=False, dashboardOrder=True),
+        reviewed=tablePage(False), complete=tablePage(True),
+        pageSize=pageSize()), status)
 
 
 class ReleasesAPI(MethodView):
@@ -48,14 +117,54 @@ class ReleasesAPI(MethodView):
         except ValueError:
             cef_event('User Input Failed', CEF_INFO, ready=ready, complete=complete)
             return Response(status=400, response="Got unparseable value for ready or complete")
-        releases = [r.name for r in getReleases(ready, complete)]
-        return jsonify({'releases': releases})
+        validators = Validators(ResourceVersion.releasesKey())
+        notModified = validators.notModified()
+        if notModified:
+            return notModified
+        releases = getReleaseNames(ready, complete)
+        return validators.apply(jsonify({'releases': releases}))
+
+
+class ReleasesTableAPI(MethodView):
+    """Serves pages of the Reviewed and Complete tables of the releases
+       dashboard, using the server-side processing protocol of DataTables:
+       http://datatables.net/usage/server-side"""
+    def get(self):
+        # Unparseable values fall back to the defaults.
+        complete = bool(request.args.get('complete', 0, type=int))
+        echo = request.args.get('sEcho', 0, type=int)
+        start = max(request.args.get('iDisplayStart', 0, type=int), 0)
+        length = request.args.get('iDisplayLength', pageSize(), type=int)
+        sortingCols = request.args.get('iSortingCols', 0, type=int)
+        # DataTables asks for a length of -1 to show everything.
+        if length < 1 or length > MAX_PAGE_SIZE:
+            length = MAX_PAGE_SIZE
+        columns = tableColumns(complete)
+        orderBy = []
+        for i in range(sortingCols):
+            col = request.args.get('iSortCol_%d' % i, type=int)
+            if col is None or not 0 <= col < len(columns) or \
+                    columns[col] not in SORTABLE_COLUMNS:
+                continue
+            column = SORTABLE_COLUMNS[columns[col]]
+            if request.args.get('sSortDir_%d' % i) == 'desc':
+                column = column.desc()
+            orderBy.append(column)
+        page = tablePage(complete, request.args.get('sSearch', ''),
+                         orderBy or None, start, length)
+        return jsonify({'sEcho': echo, 'iTotalRecords': page['total'],
+                        'iTotalDisplayRecords': page['matching'],
+                        'aaData': page['rows']})
 
 
 class ReleaseAPI(MethodView):
     def get(self, releaseName):
+        validators = Validators(ResourceVersion.releaseKey(releaseName))
+        notModified = validators.notModified()
+        if notModified:
+            return notModified
         table = getReleaseTable(releaseName)
-        return jsonify(table.query.filter_by(name=releaseName).first().toDict())
+        return validators.apply(jsonify(table.fullQuery().filter_by(name=releaseName).first().toDict()))
 
     def post(self, releaseName):
         table = getReleaseTable(releaseName)
@@ -80,14 +189,79 @@ class ReleaseAPI(MethodView):
 
         db.session.add(release)
         db.session.commit()
+        # Once a release is complete its status is frozen, and taken again
+        # whenever the release changes, since that makes the old one stale.
+        if release.complete:
+            freezeStatus(releaseName)
+            db.session.commit()
+        broker.publish(releaseName)
         return Response(status=200)
 
 
+def l10nBody(hash_, encoding=None):
+    """Returns the l10n changesets stored as 'hash_' as a byte string,
+       gzipped if 'encoding' is 'gzip'."""
+    def compute():
+        body = L10nBlob.load(hash_).encode('utf-8')
+        if encoding == 'gzip':
+            buf = StringIO()
+            # A fixed mtime keeps the body the same for the same changesets.
+            f = GzipFile(fileobj=buf, mode='wb', mtime=0)
+            f.write(body)
+            f.close()
+            body = buf.getvalue()
+        return body
+    return l10nBodyCache.get((hash_, encoding), compute)
+
+
 class ReleaseL10nAPI(MethodView):
+    """Returns the l10n changesets of a release as they were submitted.
+       Passing one or more 'locale' arguments returns only those locales,
+       in the same format. Passing 'format=json' returns them as a JSON
+       object of locales instead, whatever the release's format is."""
     def get(self, releaseName):
+        locales = request.args.getlist('locale')
+        asJSON = request.args.get('format') == 'json'
         table = getReleaseTable(releaseName)
-        l10n = table.query.filter_by(name=releaseName).first().l10nChangesets
-        return Response(status=200, response=l10n, content_type='text/plain')
+        if not locales and not asJSON:
+            # Many repack jobs fetch these at once when a release starts.
+            # The bodies are cached by content, gzipped for the clients
+            # that accept it, and can be fetched in parts.
+            release = table.query.with_entities(table.l10nHash) \
+                .filter_by(name=releaseName).first()
+            if not release:
+                abort(404)
+            encoding = None
+            if request.accept_encodings['gzip']:
+                encoding = 'gzip'
+            etag = release.l10nHash
+            if encoding:
+                etag += '-' + encoding
+            response = serveBody(l10nBody(release.l10nHash, encoding), etag,
+                                 'text/plain', encoding)
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+        validators = Validators(ResourceVersion.releaseKey(releaseName))
+        notModified = validators.notModified()
+        if notModified:
+            return notModified
+        if not ReleaseIndex.query.get(releaseName):
+            abort(404)
+        rows = ReleaseL10n.getLocales(releaseName, locales)
+        if asJSON:
+            return validators.apply(jsonify({'changesets': dict((r.locale, r.toDict()) for r in rows)}))
+        if table.product == 'fennec':
+            changesets = {}
+            for r in rows:
+                if r.platforms is None:
+                    changesets[r.locale] = r.revision
+                else:
+                    changesets[r.locale] = r.toDict()
+            l10n = json.dumps(changesets, sort_keys=True, indent=4)
+        else:
+            l10n = ''.join('%s %s\n' % (r.locale, r.revision) for r in rows)
+        return validators.apply(Response(status=200, response=l10n, content_type='text/plain'))
 
 
 class Releases(MethodView):
@@ -99,16 +273,16 @@ class Releases(MethodView):
         # http://stackoverflow.com/questions/8463421/how-to-render-my-select-field-with-wtforms
         #form.readyReleases.choices = [(r.name, r.name) for r in getReleases(ready=False)]
         form = ReleasesForm()
-        return render_template('releases.html', releases=sortedReleases(), form=form)
+        return renderReleases(form)
 
     def post(self):
         form = ReleasesForm()
-        form.readyReleases.choices = [(r.name, r.name) for r in getReleases(ready=False)]
+        form.readyReleases.choices = [(r, r) for r in getReleaseNames(ready=False)]
         # Don't include completed or ready releases, because they aren't allowed to be deleted
-        form.deleteReleases.choices = [(r.name, r.name) for r in getReleases(complete=False, ready=False)]
+        form.deleteReleases.choices = [(r, r) for r in getReleaseNames(complete=False, ready=False)]
         if not form.validate():
             cef_event('User Input Failed', CEF_WARN, **form.errors)
-            return make_response(render_template('releases.html', errors=form.errors, releases=sortedReleases(), form=form), 400)
+            return renderReleases(form, errors=form.errors, status=400)
 
         for release in form.deleteReleases.data:
             log.debug('%s is being deleted' % release)
@@ -124,14 +298,16 @@ class Releases(MethodView):
             r.comment = form.comment.data
             db.session.add(r)
         db.session.commit()
-        return render_template('releases.html', releases=sortedReleases(), form=form)
+        for release in form.readyReleases.data:
+            broker.publish(release)
+        return renderReleases(form)
 
 
 class Release(MethodView):
     def get(self):
         name = request.args.get('name')
         form = getReleaseForm(name)()
-        release = getReleaseTable(name).query.filter_by(name=name).first()
+        release = getReleaseTable(name).fullQuery().filter_by(name=name).first()
         if not release:
             abort(404)
         # If this release is already ready or complete, edits aren't allowed.
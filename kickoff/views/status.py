@@ -1,14 +1,23 @@
+from collections import Counter
 import logging
 import pytz
 import json
+import time
 
 from flask import request, jsonify, render_template, Response, redirect, \
-    make_response, abort
+    make_response, abort, current_app, stream_with_context
 from flask.views import MethodView
+from werkzeug.datastructures import MultiDict
 
 from kickoff import db
+from kickoff.archive import getArchivedEvents, restoreReleases
 from kickoff.log import cef_event, CEF_WARN, CEF_INFO, CEF_ALERT
-from kickoff.model import ReleaseEvents
+from kickoff.views.csrf import validate_csrf_header
+from kickoff.model import ReleaseEvents, ReleaseProgress, ReleaseSnapshot, \
+    ResourceVersion, getReleaseTable
+from kickoff.pubsub import broker
+from kickoff.spool import getSpool
+from kickoff.views.conditional import Validators
 from kickoff.views.forms import ReleaseEventsAPIForm
 
 log = logging.getLogger(__name__)
@@ -20,18 +29,92 @@ def sortedEvents():
     return sorted(ReleaseEvents.getEvents(), cmp=cmpEvents)
 
 
+def parseEvents():
+    """Returns the events in the request body, which is either a JSON array
+       (when sent as application/json) or one JSON object per line."""
+    if request.mimetype == 'application/json':
+        events = json.loads(request.data)
+        if not isinstance(events, list):
+            raise ValueError('Expected a JSON array of events')
+        return events
+    # Werkzeug's LimitedStream never stops iterating, so we have to watch
+    # for the empty read at the end ourselves.
+    lines = iter(request.stream.readline, '')
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def eventFormData(event):
+    """Converts a decoded JSON event into the formdata that
+       ReleaseEventsAPIForm expects."""
+    formdata = MultiDict()
+    for field, value in event.items():
+        if value is not None:
+            formdata[field] = unicode(value)
+    return formdata
+
+
+def getPending(releaseName):
+    """Returns the events of 'releaseName' that are still in the event
+       spool, if there is one."""
+    spool = getSpool(current_app)
+    if spool is None:
+        return []
+    return spool.getPending(releaseName)
+
+
+def statusValidators(releaseName):
+    # Status depends on the release's platforms as well as its events.
+    return Validators(ResourceVersion.statusKey(releaseName),
+                      ResourceVersion.releaseKey(releaseName))
+
+
+def freezeStatus(releaseName):
+    """Takes a snapshot of the status of 'releaseName', which StatusAPI
+       serves as is until the release or its events change again. Returns
+       whether one was taken. The caller is expected to commit."""
+    # Its progress hasn't been rebuilt yet, so the status would be wrong.
+    if ReleaseProgress.isMissing(releaseName):
+        return False
+    etag = statusValidators(releaseName).etag
+    # Without validators there's nothing to tell a stale snapshot by.
+    if not etag:
+        return False
+    ReleaseSnapshot.take(releaseName, etag)
+    return True
+
+
 class StatusAPI(MethodView):
 
     def get(self, releaseName):
-        status = {'status': {}}
-        status['status'] = ReleaseEvents.getStatus(releaseName)
+        pending = getPending(releaseName)
         events = request.args.get('events', type=bool)
+        # The version stamps don't know about spooled events, so responses
+        # that include some can't be validated.
+        validators = None
+        if not pending:
+            validators = statusValidators(releaseName)
+            notModified = validators.notModified()
+            if notModified:
+                return notModified
+            if validators.etag and not events:
+                body = ReleaseSnapshot.getBody(releaseName, validators.etag)
+                if body is not None:
+                    return validators.apply(
+                        Response(body, mimetype='application/json'))
+        status = {'status': {}}
+        status['status'] = ReleaseEvents.getStatus(releaseName, pending)
         if events:
             status['events'] = []
-            rows = ReleaseEvents.query.filter_by(name=releaseName)
-            for row in rows:
+            rows = ReleaseEvents.query.filter_by(name=releaseName).all()
+            archiveDir = current_app.config.get('EVENT_ARCHIVE_DIR')
+            if archiveDir:
+                rows = getArchivedEvents(releaseName, archiveDir) + rows
+            for row in rows + pending:
                 status['events'].append(row.toDict())
-        return jsonify(status)
+        response = jsonify(status)
+        if validators:
+            response = validators.apply(response)
+        return response
 
     def post(self, releaseName):
         form = ReleaseEventsAPIForm()
@@ -50,21 +133,196 @@ class StatusAPI(MethodView):
             cef_event('User Input Failed', CEF_ALERT)
             return Response(status=400, response=e)
 
-        # Check if this ReleaseEvent already exists in the ReleaseEvents table
-        if db.session.query(ReleaseEvents).\
-                      filter(ReleaseEvents.name==releaseEventsUpdate.name,
-                             ReleaseEvents.event_name==releaseEventsUpdate.event_name).first():
-            msg = 'ReleaseEvents ({}, {}) already exists'.\
-                   format(releaseEventsUpdate.name, releaseEventsUpdate.event_name)
-            log.error('{}'.format(msg))
-            cef_event('User Input Failed', CEF_INFO,
-                      ReleaseName=releaseEventsUpdate.name)
-            return Response(status=400, response=msg)
-
-        # Add a new ReleaseEvents row to the ReleaseEvents table with new data
-        db.session.add(releaseEventsUpdate)
+        # Retries of events that are already recorded, or are waiting in the
+        # spool to be, are acknowledged without recording them again.
+        spool = getSpool(current_app)
+        key = (releaseEventsUpdate.name, releaseEventsUpdate.event_name)
+        if spool is not None:
+            # The spool holds each event only once, so of concurrent retries
+            # only the one that actually appends it reports it as added.
+            added = not ReleaseEvents.getExisting([key]) and \
+                spool.append(releaseEventsUpdate)
+        else:
+            # Add a new ReleaseEvents row to the ReleaseEvents table with new
+            # data, and update the release's progress in the same transaction.
+            restoreReleases([releaseName],
+                            current_app.config.get('EVENT_ARCHIVE_DIR'))
+            added = ReleaseEvents.insertIgnore(releaseEventsUpdate)
+            if added:
+                ReleaseProgress.record(releaseEventsUpdate)
+            db.session.commit()
+
+        if not added:
+            log.debug('({}, {}) - already recorded'.
+                      format(releaseEventsUpdate.name, releaseEventsUpdate.event_name))
+            return jsonify({'status': 'duplicate'})
+
+        broker.publish(releaseName)
+        if spool is not None:
+            # The flusher records it, and its progress, later on.
+            log.debug('({}, {}) - added to the event spool'.
+                      format(releaseEventsUpdate.name, releaseEventsUpdate.event_name))
+        else:
+            log.debug('({}, {}) - added to the ReleaseEvents table in the database'.
+                      format(releaseEventsUpdate.name, releaseEventsUpdate.event_name))
+        return jsonify({'status': 'added'})
+
+
+class StatusesAPI(MethodView):
+    """Serves the status of many releases at once, optionally filtered by
+       ready and complete like ReleasesAPI. Releases are listed in the
+       same order as on the releases dashboard, with a null status for
+       those that have no events yet."""
+
+    def get(self):
+        ready = request.args.get('ready', type=int)
+        complete = request.args.get('complete', type=int)
+        if ready is not None:
+            ready = bool(ready)
+        if complete is not None:
+            complete = bool(complete)
+        spool = getSpool(current_app)
+        pending = None
+        if spool is not None:
+            pending = spool.getAllPending()
+        statuses = ReleaseEvents.getStatuses(ready, complete, pending)
+        return jsonify({'releases': [{'name': name, 'status': status}
+                                     for name, status in statuses]})
+
+
+class EventsAPI(MethodView):
+    """Records events for any number of releases in a single transaction.
+       Each event is a JSON object with the same fields as a post to
+       StatusAPI, plus the name of its release. The response reports what
+       happened to each event, in the order they were sent."""
+
+    def post(self):
+        if not validate_csrf_header():
+            cef_event('User Input Failed', CEF_WARN)
+            return Response(status=400, response='Missing or invalid CSRF token')
+        try:
+            items = parseEvents()
+        except ValueError as e:
+            cef_event('User Input Failed', CEF_INFO)
+            return Response(status=400, response='Unparseable events: %s' % e)
+
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            result = {'index': index}
+            results.append(result)
+            if not isinstance(item, dict):
+                result['status'] = 'invalid'
+                result['errors'] = {'event': ['Expected a JSON object']}
+                continue
+            releaseName = unicode(item.get('name') or '')
+            form = ReleaseEventsAPIForm(formdata=eventFormData(item),
+                                        csrf_enabled=False)
+            result['name'] = releaseName
+            result['event_name'] = form.event_name.data
+            if not form.validate(releaseName):
+                result['status'] = 'invalid'
+                result['errors'] = form.errors
+                continue
+            valid.append((result, ReleaseEvents.createFromForm(releaseName, form)))
+
+        # Duplicates are dropped rather than failing the whole batch, whether
+        # they were recorded earlier, appear twice in this one or are being
+        # recorded by an overlapping batch.
+        restoreReleases(set(event.name for _, event in valid),
+                        current_app.config.get('EVENT_ARCHIVE_DIR'))
+        added = ReleaseEvents.insertMany([event for _, event in valid])
+        inserted = set(added)
+        for result, event in valid:
+            if event in inserted:
+                result['status'] = 'added'
+            else:
+                result['status'] = 'duplicate'
+
+        ReleaseProgress.recordMany(added)
         db.session.commit()
-        log.debug('({}, {}) - added to the ReleaseEvents table in the database'.
-                  format(releaseEventsUpdate.name, releaseEventsUpdate.event_name))
+        for name in set(event.name for event in added):
+            broker.publish(name)
+
+        counts = Counter(r['status'] for r in results)
+        log.debug('Recorded %d of %d events', counts['added'], len(results))
+        if counts['invalid']:
+            cef_event('User Input Failed', CEF_INFO, InvalidEvents=counts['invalid'])
+        return jsonify({'results': results, 'added': counts['added'],
+                        'duplicate': counts['duplicate'],
+                        'invalid': counts['invalid']})
+
+
+def serverSentEvent(event, data):
+    return 'event: %s\ndata: %s\n\n' % (event, json.dumps(data))
+
+
+def changedKeys(old, new):
+    return dict((k, v) for k, v in new.items() if old.get(k) != v)
+
+
+class StatusStreamAPI(MethodView):
+    """Streams changes to a release as server-sent events. The first events
+       carry everything; after that only the parts that changed are sent,
+       either as a 'status' event (the steps from StatusAPI) or a 'release'
+       event (ready, complete and status from ReleaseAPI).
+
+       The stream is woken up as soon as this process records a change. In
+       case the change was made by another process, it also checks in every
+       STATUS_STREAM_KEEPALIVE seconds, sending a comment line if nothing
+       changed. After STATUS_STREAM_MAX_AGE seconds the stream is closed and
+       clients are expected to reconnect, as browsers do on their own."""
+
+    def get(self, releaseName):
+        try:
+            table = getReleaseTable(releaseName)
+        except ValueError:
+            # Not a product we know of.
+            abort(404)
+        if not table.query.filter_by(name=releaseName).first():
+            abort(404)
+        keepalive = current_app.config.get('STATUS_STREAM_KEEPALIVE', 15)
+        maxAge = current_app.config.get('STATUS_STREAM_MAX_AGE', 300)
+
+        def snapshot():
+            release = table.query.filter_by(name=releaseName).first()
+            current = {
+                'status': ReleaseEvents.getStatus(
+                    releaseName, getPending(releaseName)) or {},
+                'release': {},
+            }
+            if release:
+                current['release'] = {'ready': release.ready,
+                                      'complete': release.complete,
+                                      'status': release.status}
+            # Don't sit on a connection, or on a stale transaction, while
+            # waiting for the next change.
+            db.session.close()
+            return current
+
+        def stream():
+            deadline = time.time() + maxAge
+            version = broker.version(releaseName)
+            last = {'status': {}, 'release': {}}
+            yield 'retry: %d\n\n' % (keepalive * 1000)
+            while True:
+                current = snapshot()
+                changed = False
+                for kind in ('status', 'release'):
+                    delta = changedKeys(last[kind], current[kind])
+                    if delta:
+                        yield serverSentEvent(kind, delta)
+                        changed = True
+                if not changed:
+                    yield ': keepalive\n\n'
+                last = current
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return
+                version = broker.wait(releaseName, version,
+                                      min(keepalive, remaining))
 
-        return Response(status=200)
+        return Response(stream_with_context(stream()),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
@@ -0,0 +1,27 @@
+# Upgrade/downgrade the database with the release_progress table, which
+# holds the per-group, per-platform progress of each release.
+# Once upgraded, run "python kickoff-admin.py rebuild-progress" to backfill
+# it from the existing release_events.
+
+from sqlalchemy import Column, Float, Integer, String, MetaData, Table
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class ReleaseProgress(Base):
+    __tablename__ = 'release_progress'
+    name = Column(String(100), nullable=False, primary_key=True)
+    group = Column(String(100), nullable=False, primary_key=True)
+    platform = Column(String(100), nullable=False, primary_key=True)
+    progress = Column(Float(precision=53), default=0.00, nullable=False)
+    events = Column(Integer(), default=0, nullable=False)
+
+
+def upgrade(migrate_engine):
+    Base.metadata.create_all(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    Table('release_progress', metadata, autoload=True).drop()
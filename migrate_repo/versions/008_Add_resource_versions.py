@@ -0,0 +1,45 @@
+# Upgrade/downgrade the database with the resource_versions table, which
+# holds the version stamps used for conditional requests. Every existing
+# release and every release with events gets a stamp, so that they can be
+# validated right away.
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String, MetaData, Table, \
+    select
+from sqlalchemy.ext.declarative import declarative_base
+
+import pytz
+
+Base = declarative_base()
+
+
+class ResourceVersion(Base):
+    __tablename__ = 'resource_versions'
+    resource = Column(String(150), primary_key=True)
+    version = Column(Integer(), nullable=False, default=1)
+    updatedAt = Column(DateTime(pytz.utc), nullable=False,
+                       default=datetime.utcnow)
+
+
+def upgrade(migrate_engine):
+    Base.metadata.create_all(migrate_engine)
+    metadata = MetaData(bind=migrate_engine)
+    resources = ['releases']
+    for name in ('fennec_release', 'firefox_release', 'thunderbird_release'):
+        table = Table(name, metadata, autoload=True)
+        for row in migrate_engine.execute(select([table.c.name])):
+            resources.append('release:%s' % row.name)
+    events = Table('release_events', metadata, autoload=True)
+    for row in migrate_engine.execute(select([events.c.name]).distinct()):
+        resources.append('status:%s' % row.name)
+
+    now = datetime.utcnow()
+    migrate_engine.execute(ResourceVersion.__table__.insert(),
+                           [{'resource': r, 'version': 1, 'updatedAt': now}
+                            for r in resources])
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    Table('resource_versions', metadata, autoload=True).drop()
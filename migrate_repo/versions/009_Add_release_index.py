@@ -0,0 +1,43 @@
+# Upgrade/downgrade the database with the release_index table, which holds
+# the columns that releases of every product are listed and sorted by.
+
+from sqlalchemy import Boolean, Column, DateTime, Index, String, MetaData, \
+    Table, select
+from sqlalchemy.ext.declarative import declarative_base
+
+import pytz
+
+Base = declarative_base()
+
+
+class ReleaseIndex(Base):
+    __tablename__ = 'release_index'
+    name = Column(String(100), primary_key=True)
+    product = Column(String(50), nullable=False)
+    ready = Column(Boolean(), nullable=False, default=False)
+    complete = Column(Boolean(), nullable=False, default=False)
+    submittedAt = Column(DateTime(pytz.utc), nullable=False)
+    __table_args__ = (
+        Index('release_index_ready_complete_submittedAt',
+              'ready', 'complete', 'submittedAt'),
+        Index('release_index_product_submittedAt', 'product', 'submittedAt'),
+    )
+
+
+def upgrade(migrate_engine):
+    Base.metadata.create_all(migrate_engine)
+    metadata = MetaData(bind=migrate_engine)
+    for product in ('fennec', 'firefox', 'thunderbird'):
+        table = Table('%s_release' % product, metadata, autoload=True)
+        query = select([table.c.name, table.c.ready, table.c.complete,
+                        table.c.submittedAt])
+        rows = [{'name': r.name, 'product': product, 'ready': r.ready,
+                 'complete': r.complete, 'submittedAt': r.submittedAt}
+                for r in migrate_engine.execute(query)]
+        if rows:
+            migrate_engine.execute(ReleaseIndex.__table__.insert(), rows)
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    Table('release_index', metadata, autoload=True).drop()
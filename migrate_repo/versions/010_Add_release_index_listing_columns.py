@@ -0,0 +1,30 @@
+# Upgrade/downgrade the database with the submitter, branch and status
+# columns of release_index, which the releases dashboard sorts and searches.
+
+from sqlalchemy import Column, String, MetaData, Table, select
+
+
+def upgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    index = Table('release_index', metadata, autoload=True)
+    Column('submitter', String(250), nullable=False,
+           server_default='').create(index)
+    Column('branch', String(50), nullable=False,
+           server_default='').create(index)
+    Column('status', String(250), default='').create(index)
+    for product in ('fennec', 'firefox', 'thunderbird'):
+        table = Table('%s_release' % product, metadata, autoload=True)
+        query = select([table.c.name, table.c.submitter, table.c.branch,
+                        table.c.status])
+        for r in migrate_engine.execute(query):
+            migrate_engine.execute(
+                index.update().where(index.c.name == r.name).values(
+                    submitter=r.submitter, branch=r.branch, status=r.status))
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    index = Table('release_index', metadata, autoload=True)
+    index.c.status.drop()
+    index.c.branch.drop()
+    index.c.submitter.drop()
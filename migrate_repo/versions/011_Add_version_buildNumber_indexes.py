@@ -0,0 +1,24 @@
+# Upgrade/downgrade the database with (version, buildNumber) indexes on the
+# release tables, which back the build number suggestions.
+
+from sqlalchemy import Index, MetaData, Table
+
+PRODUCTS = ('fennec', 'firefox', 'thunderbird')
+
+
+def getIndexes(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    for product in PRODUCTS:
+        table = Table('%s_release' % product, metadata, autoload=True)
+        yield Index('%s_release_version_buildNumber' % product,
+                    table.c.version, table.c.buildNumber)
+
+
+def upgrade(migrate_engine):
+    for index in getIndexes(migrate_engine):
+        index.create()
+
+
+def downgrade(migrate_engine):
+    for index in getIndexes(migrate_engine):
+        index.drop()
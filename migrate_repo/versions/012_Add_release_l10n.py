@@ -0,0 +1,61 @@
+# Upgrade/downgrade the database with the release_l10n table, which holds
+# the l10n changesets of releases one locale per row.
+
+import json
+
+from sqlalchemy import Column, String, MetaData, Table, select
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class ReleaseL10n(Base):
+    __tablename__ = 'release_l10n'
+    name = Column(String(100), primary_key=True)
+    locale = Column(String(100), primary_key=True)
+    revision = Column(String(100), nullable=False)
+    platforms = Column(String(500), nullable=True)
+
+
+def parseL10nChangesets(changesets):
+    # A copy of kickoff.model.parseL10nChangesets, so that this migration
+    # keeps working however that changes.
+    try:
+        parsed = json.loads(changesets)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, dict):
+        for locale, value in parsed.iteritems():
+            platforms = None
+            if isinstance(value, dict):
+                platforms = value.get('platforms')
+                value = value.get('revision')
+            if isinstance(value, basestring):
+                yield locale, value, platforms
+    else:
+        for line in changesets.splitlines():
+            fields = line.split()
+            if len(fields) == 2:
+                yield fields[0], fields[1], None
+
+
+def upgrade(migrate_engine):
+    Base.metadata.create_all(migrate_engine)
+    metadata = MetaData(bind=migrate_engine)
+    for product in ('fennec', 'firefox', 'thunderbird'):
+        table = Table('%s_release' % product, metadata, autoload=True)
+        query = select([table.c.name, table.c.l10nChangesets])
+        for r in migrate_engine.execute(query):
+            rows = []
+            for locale, revision, platforms in parseL10nChangesets(r.l10nChangesets):
+                if platforms is not None:
+                    platforms = json.dumps(platforms)
+                rows.append({'name': r.name, 'locale': locale,
+                             'revision': revision, 'platforms': platforms})
+            if rows:
+                migrate_engine.execute(ReleaseL10n.__table__.insert(), rows)
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    Table('release_l10n', metadata, autoload=True).drop()
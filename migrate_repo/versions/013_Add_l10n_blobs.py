@@ -0,0 +1,77 @@
+# Upgrade/downgrade the database between storing l10n changesets in every
+# release row and storing them once per distinct content in l10n_blobs,
+# which the release tables reference by hash.
+
+import hashlib
+import zlib
+
+from sqlalchemy import Boolean, Column, ForeignKey, LargeBinary, String, \
+    Text, MetaData, Table, select
+from migrate import ForeignKeyConstraint
+
+PRODUCTS = ('fennec', 'firefox', 'thunderbird')
+# Keep in sync with L10nBlob.COMPRESS_THRESHOLD.
+COMPRESS_THRESHOLD = 1024
+
+
+def getBlobValues(changesets):
+    data = changesets.encode('utf-8')
+    compressed = len(data) >= COMPRESS_THRESHOLD
+    if compressed:
+        data = zlib.compress(data)
+    return {'hash': hashlib.sha1(changesets.encode('utf-8')).hexdigest(),
+            'compressed': compressed, 'data': data}
+
+
+def getForeignKey(product, table, blobs):
+    return ForeignKeyConstraint([table.c.l10nHash], [blobs.c.hash],
+                                name='%s_release_l10nHash_fkey' % product)
+
+
+def upgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    blobs = Table('l10n_blobs', metadata,
+                  Column('hash', String(40), primary_key=True),
+                  Column('compressed', Boolean(), nullable=False,
+                         default=False),
+                  Column('data', LargeBinary(), nullable=False))
+    blobs.create()
+    stored = set()
+    for product in PRODUCTS:
+        table = Table('%s_release' % product, metadata, autoload=True)
+        Column('l10nHash', String(40), nullable=True).create(table)
+        query = select([table.c.name, table.c.l10nChangesets])
+        for r in migrate_engine.execute(query).fetchall():
+            values = getBlobValues(r.l10nChangesets)
+            if values['hash'] not in stored:
+                migrate_engine.execute(blobs.insert(), values)
+                stored.add(values['hash'])
+            migrate_engine.execute(
+                table.update().where(table.c.name == r.name)
+                .values(l10nHash=values['hash']))
+        table.c.l10nChangesets.drop()
+        table.c.l10nHash.alter(nullable=False)
+        getForeignKey(product, table, blobs).create()
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    blobs = Table('l10n_blobs', metadata, autoload=True)
+    for product in PRODUCTS:
+        table = Table('%s_release' % product, metadata, autoload=True)
+        Column('l10nChangesets', Text(), nullable=True).create(table)
+        query = select([table.c.name, blobs.c.compressed, blobs.c.data],
+                       table.c.l10nHash == blobs.c.hash)
+        for r in migrate_engine.execute(query).fetchall():
+            data = r.data
+            if r.compressed:
+                data = zlib.decompress(data)
+            migrate_engine.execute(
+                table.update().where(table.c.name == r.name)
+                .values(l10nChangesets=data.decode('utf-8')))
+        # SQLite can't drop constraints, but drops them with the column.
+        if migrate_engine.name != 'sqlite':
+            getForeignKey(product, table, blobs).drop()
+        table.c.l10nHash.drop()
+        table.c.l10nChangesets.alter(nullable=False)
+    blobs.drop()
@@ -0,0 +1,19 @@
+# Upgrade/downgrade the database with a (name, group, platform) index on
+# release_events, which backs the per-step status queries.
+
+from sqlalchemy import Index, MetaData, Table
+
+
+def getIndex(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    table = Table('release_events', metadata, autoload=True)
+    return Index('release_events_name_group_platform',
+                 table.c.name, table.c.group, table.c.platform)
+
+
+def upgrade(migrate_engine):
+    getIndex(migrate_engine).create()
+
+
+def downgrade(migrate_engine):
+    getIndex(migrate_engine).drop()
@@ -0,0 +1,28 @@
+# Upgrade/downgrade the database with the release_archives table, which
+# holds the final status of releases whose events have been archived.
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, \
+    Text
+from sqlalchemy.ext.declarative import declarative_base
+
+import pytz
+
+Base = declarative_base()
+
+
+class ReleaseArchive(Base):
+    __tablename__ = 'release_archives'
+    name = Column(String(100), primary_key=True)
+    archivedAt = Column(DateTime(pytz.utc), nullable=False)
+    status = Column(Text(), nullable=False)
+    events = Column(Integer(), nullable=False)
+    filename = Column(String(200), nullable=False)
+
+
+def upgrade(migrate_engine):
+    Base.metadata.create_all(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    Table('release_archives', metadata, autoload=True).drop()
@@ -0,0 +1,23 @@
+# Upgrade/downgrade the database with the release_snapshots table, which
+# holds the frozen status of complete releases.
+
+from sqlalchemy import Column, MetaData, String, Table, Text
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class ReleaseSnapshot(Base):
+    __tablename__ = 'release_snapshots'
+    name = Column(String(100), primary_key=True)
+    etag = Column(String(32), nullable=False)
+    body = Column(Text(), nullable=False)
+
+
+def upgrade(migrate_engine):
+    Base.metadata.create_all(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    metadata = MetaData(bind=migrate_engine)
+    Table('release_snapshots', metadata, autoload=True).drop()